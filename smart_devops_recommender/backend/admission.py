@@ -0,0 +1,152 @@
+import os
+import heapq
+import asyncio
+import itertools
+from metrics import registry, Counter, Gauge
+
+# Admission control for request handlers that wait on OpenAI. Every request takes a slot in its
+# lane (chat, typeahead, batch) before doing upstream work. A lane has its own concurrency limit
+# and a bounded queue, and all lanes share ADMISSION_CAPACITY slots that are handed to queued
+# requests in priority order, so keystroke-driven typeahead can't starve user-initiated chat.
+# A request that finds its lane's queue full, or waits longer than the lane's queue timeout, is
+# shed with Overloaded instead of joining an ever-growing backlog.
+
+ADMISSION_CAPACITY = int(os.getenv('ADMISSION_CAPACITY', '64'))
+
+# name: (priority, lower runs first; concurrency limit; max queued; max seconds queued)
+LANES = {
+    "chat": (0, int(os.getenv('ADMISSION_CHAT_LIMIT', '32')), int(os.getenv('ADMISSION_CHAT_QUEUE', '256')),
+             float(os.getenv('ADMISSION_CHAT_QUEUE_TIMEOUT', '10'))),
+    # Stays below the capacity so some slots are always left for chat
+    "typeahead": (1, int(os.getenv('ADMISSION_TYPEAHEAD_LIMIT', '48')),
+                  int(os.getenv('ADMISSION_TYPEAHEAD_QUEUE', '16')),
+                  float(os.getenv('ADMISSION_TYPEAHEAD_QUEUE_TIMEOUT', '0.2'))),
+    "batch": (2, int(os.getenv('ADMISSION_BATCH_LIMIT', '4')), int(os.getenv('ADMISSION_BATCH_QUEUE', '8')),
+              float(os.getenv('ADMISSION_BATCH_QUEUE_TIMEOUT', '30')))
+}
+
+admission_rejected = registry.register(
+    Counter("backend_admission_rejected_total", "Requests shed by admission control", ("lane", "reason")))
+admission_active = registry.register(Gauge("backend_admission_active", "Requests holding a slot", ("lane",)))
+admission_queued = registry.register(Gauge("backend_admission_queued", "Requests waiting for a slot", ("lane",)))
+
+
+class Overloaded(Exception):
+    def __init__(self, lane, reason):
+        super().__init__(f"{lane} lane is overloaded ({reason})")
+        self.lane = lane
+        self.reason = reason
+
+
+class Lane:
+    def __init__(self, name, priority, limit, max_queue, queue_timeout):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+
+    def report(self):
+        admission_active.set(self.active, lane=self.name)
+        admission_queued.set(self.queued, lane=self.name)
+
+
+class Ticket:
+    """A held slot. release() is idempotent so streaming handlers can call it from several exits."""
+
+    def __init__(self, controller, lane):
+        self.controller = controller
+        self.lane = lane
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller.release(self.lane)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+
+class AdmissionController:
+    def __init__(self, capacity=ADMISSION_CAPACITY, lanes=LANES):
+        self.capacity = capacity
+        self.active = 0
+        self.lanes = {name: Lane(name, *config) for name, config in lanes.items()}
+        self.waiters = []  # heap of (priority, sequence, future, lane)
+        self.sequence = itertools.count()
+
+    @property
+    def busy(self):
+        # Whether any request is waiting for a slot, background work should wait its turn
+        return any(lane.queued for lane in self.lanes.values())
+
+    def _has_room(self, lane):
+        return self.active < self.capacity and lane.active < lane.limit
+
+    def _grant(self, lane):
+        self.active += 1
+        lane.active += 1
+        lane.report()
+
+    async def acquire(self, name):
+        # Use as `async with await admission.acquire("chat"):`, or keep the Ticket and release it later
+        lane = self.lanes[name]
+        # Take a free slot only if no waiter of the same or higher priority could have used it
+        ahead = any(priority <= lane.priority and not future.done() and other.active < other.limit
+                    for priority, _, future, other in self.waiters)
+        if self._has_room(lane) and not ahead:
+            self._grant(lane)
+            return Ticket(self, lane)
+
+        if lane.queued >= lane.max_queue:
+            admission_rejected.inc(lane=name, reason="queue_full")
+            raise Overloaded(name, "queue full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (lane.priority, next(self.sequence), future, lane))
+        lane.queued += 1
+        lane.report()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), lane.queue_timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                admission_rejected.inc(lane=name, reason="queue_timeout")
+                raise Overloaded(name, "queue timeout")
+        except asyncio.CancelledError:
+            if not future.cancel():
+                # The slot was granted as the caller went away, hand it on
+                self.release(lane)
+            raise
+        finally:
+            lane.queued -= 1
+            lane.report()
+        return Ticket(self, lane)
+
+    def release(self, lane):
+        self.active -= 1
+        lane.active -= 1
+        lane.report()
+        self._wake()
+
+    def _wake(self):
+        # Hand free slots to the highest priority waiters whose lane has room
+        skipped = []
+        while self.waiters and self.active < self.capacity:
+            entry = heapq.heappop(self.waiters)
+            future, lane = entry[2], entry[3]
+            if future.done():
+                continue
+            if lane.active >= lane.limit:
+                skipped.append(entry)
+                continue
+            self._grant(lane)
+            future.set_result(None)
+        for entry in skipped:
+            heapq.heappush(self.waiters, entry)
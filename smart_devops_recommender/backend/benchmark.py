@@ -0,0 +1,203 @@
+import os
+import sys
+import gzip
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+import httpx
+import numpy as np
+from load_test import run_level, DEFAULT_WEIGHTS
+from fake_upstreams import generate_corpus
+
+# Offline benchmark: runs the backend against the local OpenAI/Weaviate stand-ins from
+# fake_upstreams.py, so no API key or Weaviate container is needed.
+#
+#   python benchmark.py --corpus-sizes 1000,100000 --concurrency 1,8,32 --output bench.json
+#
+# For each corpus size it reports p50/p95/p99 latency and throughput of /recommender and
+# /chat at every concurrency level, app cold start time, full vs compact /recommender payload size and
+# serialization time, and ingestion records/sec, as one JSON document.
+# Extra environment variables (LOCAL_INDEX_ENABLED, SEMANTIC_CACHE_ENABLED, ...) are passed
+# through to the backend, so the same run can compare configurations.
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_process(args, env, url, timeout):
+    process = subprocess.Popen([sys.executable, *args], cwd=BACKEND_DIR, env=env)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(args)} exited with {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{' '.join(args)} did not become ready in {timeout}s")
+
+
+def typeahead_prefixes(count, seed):
+    # Queries look like chat-ui traffic: prefixes of stored questions cut at multiples of 5 chars
+    rng = np.random.default_rng(seed)
+    prefixes = []
+    for record in generate_corpus(count, seed):
+        prompt = record["prompt"]
+        cut = max(5, 5 * int(rng.integers(1, len(prompt) // 5 + 1)))
+        prefixes.append(prompt[:cut])
+    return prefixes
+
+
+async def bench_endpoint(url, make_payload, levels, requests, timeout):
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        await run_level(client, url, make_payload, 1, min(5, requests))
+        return [await run_level(client, url, make_payload, concurrency, requests) for concurrency in levels]
+
+
+def server_timing(response, name):
+    # Duration in ms of one entry of the Server-Timing header, 0 when it is missing
+    for entry in response.headers.get("server-timing", "").split(","):
+        entry_name, _, duration = entry.strip().partition(";dur=")
+        if entry_name == name and duration:
+            return float(duration)
+    return 0.0
+
+
+def measure_payloads(url, make_payload, samples, timeout):
+    # Body size (raw and gzipped) and server-side serialization time of full vs compact results
+    modes = {}
+    with httpx.Client(timeout=timeout) as client:
+        for mode, extra in (("full", {}), ("compact", {"compact": True})):
+            sizes, gzip_sizes, serialize_ms = [], [], []
+            for i in range(samples):
+                response = client.post(url, json={**make_payload(i), **extra})
+                response.raise_for_status()
+                sizes.append(len(response.content))
+                gzip_sizes.append(len(gzip.compress(response.content)))
+                serialize_ms.append(server_timing(response, "serialize"))
+            modes[mode] = {"bytes": float(np.mean(sizes)), "gzip_bytes": float(np.mean(gzip_sizes)),
+                           "serialize_ms": float(np.mean(serialize_ms))}
+    return modes
+
+
+def bench_ingest(weaviate_url, records, embed_batch_size, embed_concurrency):
+    # Imported lazily so utils picks up the stand-in OPENAI_BASE_URL set in main()
+    from client_setup import create_weaviate_client
+    from ingest import import_records
+    from schema import ensure_schema
+
+    client = create_weaviate_client(weaviate_url)
+    ensure_schema(client)
+    return import_records(client, generate_corpus(records, seed=1), embed_batch_size, embed_concurrency)
+
+
+def run_corpus(corpus_size, args, levels, openai_url):
+    weaviate_port, app_port = free_port(), free_port()
+    weaviate_url = f"http://127.0.0.1:{weaviate_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "OPENAI_API_KEY": "benchmark",
+        "WEAVIATE_URL": weaviate_url,
+        "EMBEDDING_CACHE_PATH": ""
+    })
+
+    processes = []
+    try:
+        seed_start = time.perf_counter()
+        processes.append(start_process(["fake_upstreams.py", "weaviate", "--port", str(weaviate_port),
+                                        "--dim", str(args.dim), "--corpus-size", str(corpus_size)],
+                                       env, f"{weaviate_url}/v1/.well-known/ready", args.startup_timeout))
+        seed_seconds = time.perf_counter() - seed_start
+        # Cold start: process spawn until the app (imports + lifespan) answers its first request
+        app_start = time.perf_counter()
+        processes.append(start_process(["-m", "uvicorn", "routes:app", "--port", str(app_port),
+                                        "--log-level", "warning"], env, f"{app_url}/docs", args.startup_timeout))
+        app_startup_seconds = time.perf_counter() - app_start
+
+        prefixes = typeahead_prefixes(max(args.requests, 1000), seed=2)
+        recommender_payload = lambda i: {"message": prefixes[i % len(prefixes)], "top_n": args.top_n,
+                                         "weights": DEFAULT_WEIGHTS, "distance_filter": args.distance_filter}
+        chat_payload = lambda i: {"message": prefixes[i % len(prefixes)]}
+
+        run = {"corpus_size": corpus_size, "seed_seconds": seed_seconds, "app_startup_seconds": app_startup_seconds}
+        run["recommender"] = asyncio.run(bench_endpoint(f"{app_url}/recommender", recommender_payload, levels,
+                                                        args.requests, args.timeout))
+        run["payload"] = measure_payloads(f"{app_url}/recommender", recommender_payload, min(args.requests, 100),
+                                          args.timeout)
+        run["chat"] = asyncio.run(bench_endpoint(f"{app_url}/chat", chat_payload, levels,
+                                                 args.chat_requests, args.timeout))
+
+        run["ingest"] = bench_ingest(weaviate_url, args.ingest_records, args.embed_batch_size, args.embed_concurrency)
+        return run
+    finally:
+        # Stop the backend before its upstreams so its shutdown flush can still reach Weaviate
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backend against local OpenAI/Weaviate stand-ins")
+    parser.add_argument("--corpus-sizes", default="1000", help="Comma separated corpus sizes, e.g. 1000,100000")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="/recommender requests per concurrency level")
+    parser.add_argument("--chat-requests", type=int, default=50, help="/chat requests per concurrency level")
+    parser.add_argument("--ingest-records", type=int, default=2000)
+    parser.add_argument("--embed-batch-size", type=int, default=128)
+    parser.add_argument("--embed-concurrency", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimension, lower it for very large corpora")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--distance-filter", type=float, default=0.8)
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0, help="Simulated embeddings API latency")
+    parser.add_argument("--completion-latency-ms", type=float, default=0.0, help="Simulated completion latency")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--startup-timeout", type=float, default=1800.0)
+    parser.add_argument("--output", default=None, help="Write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    # One OpenAI stand-in serves every run, and the in-process ingestion client is pointed at it
+    openai_port = free_port()
+    openai_url = f"http://127.0.0.1:{openai_port}"
+    os.environ.update({"OPENAI_BASE_URL": f"{openai_url}/v1", "OPENAI_API_KEY": "benchmark",
+                       "EMBEDDING_CACHE_PATH": ""})
+    openai_process = start_process(["fake_upstreams.py", "openai", "--port", str(openai_port), "--dim", str(args.dim),
+                                    "--embedding-latency-ms", str(args.embedding_latency_ms),
+                                    "--completion-latency-ms", str(args.completion_latency_ms)],
+                                   dict(os.environ), f"{openai_url}/docs", 60)
+    try:
+        results = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "config": vars(args),
+            "runs": [run_corpus(int(size), args, levels, openai_url) for size in args.corpus_sizes.split(",")]
+        }
+    finally:
+        openai_process.terminate()
+        openai_process.wait()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import os
+import time
+import asyncio
+from metrics import registry, Counter, Gauge
+
+# Circuit breakers around the OpenAI calls. A call that raises or runs past its timeout is a
+# failure; after CIRCUIT_FAILURE_THRESHOLD consecutive failures the breaker opens and calls fail
+# immediately with UpstreamUnavailable for CIRCUIT_RESET_SECONDS, after which a single probe call
+# is let through and closes it again on success. Callers catch UpstreamUnavailable and serve a
+# degraded answer (cached or lexical) instead of queueing behind a slow upstream.
+#
+# Only timeouts, connection errors, 429 and 5xx count as failures. Any other 4xx rejects the request's
+# own input (e.g. over the context length), so it is re-raised unchanged for the caller to report as a
+# client error: a few bad requests must not cut every user off.
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_SECONDS = float(os.getenv('CIRCUIT_RESET_SECONDS', '30'))
+
+CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+circuit_state = registry.register(Gauge("backend_circuit_state", "0 closed, 1 open, 2 half open", ("upstream",)))
+circuit_failures = registry.register(
+    Counter("backend_circuit_failures_total", "Failed or timed out upstream calls", ("upstream", "reason")))
+circuit_rejected = registry.register(
+    Counter("backend_circuit_rejected_total", "Calls failed fast by an open breaker", ("upstream",)))
+
+
+class UpstreamUnavailable(Exception):
+    def __init__(self, upstream, reason):
+        super().__init__(f"{upstream} is unavailable ({reason})")
+        self.upstream = upstream
+        self.reason = reason
+
+
+def is_client_error(e):
+    # A 4xx response other than 429, duck-typed on the OpenAI APIStatusError (status_code and the HTTP
+    # response it came with, which HTTPException doesn't have) so this module doesn't import openai
+    status = getattr(e, "status_code", None)
+    return (isinstance(status, int) and 400 <= status < 500 and status != 429 and
+            getattr(e, "response", None) is not None)
+
+
+def is_upstream_failure(e):
+    # openai is already loaded once a call has failed, only the error path imports it
+    from openai import APIConnectionError, APIStatusError
+
+    if isinstance(e, APIStatusError):
+        return not is_client_error(e)
+    # APITimeoutError is an APIConnectionError
+    return isinstance(e, (APIConnectionError, OSError))
+
+
+class CircuitBreaker:
+    def __init__(self, name, timeout, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.timeout = timeout  # Seconds, None for no limit
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        circuit_state.set(CLOSED, upstream=name)
+
+    @property
+    def available(self):
+        # Whether a call would be attempted right now
+        return self.state == CLOSED or (not self.probing and time.monotonic() - self.opened_at >= self.reset_seconds)
+
+    def _set_state(self, state):
+        self.state = state
+        circuit_state.set(state, upstream=self.name)
+
+    def ensure_available(self):
+        # Fail fast without calling, e.g. before queueing work that would only reach the upstream later
+        if not self.available:
+            circuit_rejected.inc(upstream=self.name)
+            raise UpstreamUnavailable(self.name, "circuit open")
+
+    def _before_call(self):
+        if self.state == CLOSED:
+            return False
+        self.ensure_available()
+        self._set_state(HALF_OPEN)
+        self.probing = True
+        return True
+
+    def _on_success(self):
+        self.failures = 0
+        self.probing = False
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def _on_failure(self, reason):
+        circuit_failures.inc(upstream=self.name, reason=reason)
+        self.failures += 1
+        self.probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    async def call(self, func, *args, **kwargs):
+        probe = self._before_call()
+        try:
+            result = await asyncio.wait_for(func(*args, **kwargs), self.timeout)
+        except asyncio.TimeoutError as e:
+            self._on_failure("timeout")
+            raise UpstreamUnavailable(self.name, "timeout") from e
+        except asyncio.CancelledError:
+            # The caller went away, that says nothing about the upstream
+            if probe:
+                self.probing = False
+            raise
+        except Exception as e:
+            if is_upstream_failure(e):
+                self._on_failure(type(e).__name__)
+                raise UpstreamUnavailable(self.name, str(e)) from e
+            if is_client_error(e):
+                # The upstream answered, it is healthy
+                self._on_success()
+            elif probe:
+                # Says nothing about the upstream either way, let the next call probe
+                self.probing = False
+            raise
+        self._on_success()
+        return result
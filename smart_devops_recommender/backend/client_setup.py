@@ -1,9 +1,97 @@
 import os
-import openai
-import weaviate
+import threading
 
-# Initialize the OpenAI client
-openai.api_key = os.getenv('OPENAI_KEY')  # Replace with your actual OpenAI API key
+# Shared upstream clients. Every module gets its Weaviate and OpenAI clients from here instead of
+# building its own at import time: each process keeps one pooled keep-alive client per upstream,
+# created on first use (routes.py does it in the FastAPI lifespan). The client libraries are
+# only imported when a client is actually built.
 
-# Initialize the Weaviate client
-client = weaviate.Client("http://localhost:8080")  # Replace with your Weaviate instance URL
+WEAVIATE_URL = os.getenv('WEAVIATE_URL', "http://localhost:8080")  # Replace with your Weaviate instance URL
+WEAVIATE_CONNECT_TIMEOUT = float(os.getenv('WEAVIATE_CONNECT_TIMEOUT', '5'))
+WEAVIATE_READ_TIMEOUT = float(os.getenv('WEAVIATE_READ_TIMEOUT', '60'))
+# Keep-alive connections kept per host, sized to the blocking executor so its threads don't reconnect
+WEAVIATE_POOL_SIZE = int(os.getenv('WEAVIATE_POOL_SIZE', os.getenv('BLOCKING_EXECUTOR_WORKERS', '32')))
+
+OPENAI_CONNECT_TIMEOUT = float(os.getenv('OPENAI_CONNECT_TIMEOUT', '5'))
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '60'))
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '2'))
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '100'))
+OPENAI_MAX_KEEPALIVE = int(os.getenv('OPENAI_MAX_KEEPALIVE', '32'))
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def openai_api_key():
+    # The SDK reads OPENAI_API_KEY, older scripts in this repo use OPENAI_KEY
+    return os.getenv('OPENAI_API_KEY') or os.getenv('OPENAI_KEY')
+
+
+def create_weaviate_client(url=None, additional_headers=None):
+    import weaviate
+    from weaviate.config import Config, ConnectionConfig
+
+    return weaviate.Client(
+        url or WEAVIATE_URL,
+        timeout_config=(WEAVIATE_CONNECT_TIMEOUT, WEAVIATE_READ_TIMEOUT),
+        additional_headers=additional_headers,
+        additional_config=Config(connection_config=ConnectionConfig(session_pool_connections=WEAVIATE_POOL_SIZE,
+                                                                    session_pool_maxsize=WEAVIATE_POOL_SIZE))
+    )
+
+
+def openai_client_options(http_client_class):
+    import httpx
+
+    limits = httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_KEEPALIVE)
+    return {
+        "api_key": openai_api_key(),
+        "max_retries": OPENAI_MAX_RETRIES,
+        "timeout": httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        "http_client": http_client_class(limits=limits)
+    }
+
+
+def create_openai_client():
+    from openai import OpenAI, DefaultHttpxClient
+    return OpenAI(**openai_client_options(DefaultHttpxClient))
+
+
+def create_async_openai_client():
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    return AsyncOpenAI(**openai_client_options(DefaultAsyncHttpxClient))
+
+
+def shared_client(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def get_weaviate_client():
+    return shared_client("weaviate", create_weaviate_client)
+
+
+def get_openai_client():
+    return shared_client("openai", create_openai_client)
+
+
+def get_async_openai_client():
+    return shared_client("async_openai", create_async_openai_client)
+
+
+async def close_clients():
+    # Release the pooled connections, called when the app shuts down
+    with _lock:
+        clients = dict(_clients)
+        _clients.clear()
+    if "async_openai" in clients:
+        await clients["async_openai"].close()
+    if "openai" in clients:
+        clients["openai"].close()
+    if "weaviate" in clients:
+        clients["weaviate"]._connection.close()
@@ -0,0 +1,193 @@
+import os
+import time
+import argparse
+from schema import CLASS_NAME, ensure_schema
+from client_setup import WEAVIATE_URL, create_weaviate_client
+from snapshot import snapshot_schema, scan_pages, page_to_batch, open_writer, is_ipc
+from migrate_object_ids import pick_answer
+from metrics import registry, Counter
+
+# Compaction and retention for DevOpsPrompts_v2, which otherwise grows by one object per /chat call.
+# The class is walked with a cursor one page at a time. For every object on the page:
+#  - near-duplicates within COMPACTION_DUPLICATE_DISTANCE (cosine) are merged into one object: the
+#    most retrieved answer is kept under its own id, retrievalCount becomes the sum over the group,
+#    and the other copies are deleted
+#  - objects older than COMPACTION_RETENTION_DAYS that were never retrieved are evicted. "Never
+#    retrieved" is an unset lastRetrievedUnix, since /chat creates objects with a retrievalCount of 1;
+#    objects from before that property existed also need a retrievalCount of at most 1
+# Removed objects are written to COMPACTION_ARCHIVE_DIR first when it is set, one snapshot.py file
+# per batch, so `python snapshot.py import <file>` restores them.
+#
+#   python compaction.py --dry-run
+#   python compaction.py --retention-days 90 --archive-dir archive
+#
+# The server runs one page every COMPACTION_INTERVAL seconds (0, the default, disables it) and skips
+# its turn while admission control has requests queued, so compaction only uses idle capacity.
+# Retrievals counted between reading a group and deleting its copies can be lost, like any update
+# racing a delete.
+
+COMPACTION_INTERVAL = float(os.getenv('COMPACTION_INTERVAL', '0'))
+COMPACTION_BATCH_SIZE = int(os.getenv('COMPACTION_BATCH_SIZE', '100'))
+COMPACTION_DUPLICATE_DISTANCE = float(os.getenv('COMPACTION_DUPLICATE_DISTANCE', '0.05'))
+COMPACTION_MAX_NEIGHBORS = int(os.getenv('COMPACTION_MAX_NEIGHBORS', '10'))
+COMPACTION_RETENTION_DAYS = float(os.getenv('COMPACTION_RETENTION_DAYS', '0'))  # 0 keeps everything
+COMPACTION_ARCHIVE_DIR = os.getenv('COMPACTION_ARCHIVE_DIR', '')
+COMPACTION_ARCHIVE_FORMAT = os.getenv('COMPACTION_ARCHIVE_FORMAT', 'parquet')  # or arrow
+
+compaction_objects = registry.register(
+    Counter("backend_compaction_objects_total", "Objects removed by compaction", ("action",)))
+
+FIELDS = ["prompt", "response", "retrievalCount", "responseLength", "lastRetrievedUnix"]
+ADDITIONAL = ["id", "vector", "creationTimeUnix", "lastUpdateTimeUnix"]
+
+
+def object_id(item):
+    return item["_additional"]["id"]
+
+
+def find_duplicates(client, class_name, item, distance, limit):
+    # Other objects within `distance` of the item's vector, closest first
+    result = client.query.get(class_name, FIELDS) \
+        .with_near_vector({"vector": item["_additional"]["vector"], "distance": distance}) \
+        .with_additional(ADDITIONAL) \
+        .with_limit(limit + 1) \
+        .do()
+    return [other for other in result['data']['Get'][class_name] or [] if object_id(other) != object_id(item)]
+
+
+def is_expired(item, cutoff):
+    return (item.get("lastRetrievedUnix") is None and (item["retrievalCount"] or 0) <= 1 and
+            int(item["_additional"]["creationTimeUnix"]) / 1000 < cutoff)
+
+
+class Compactor:
+    def __init__(self, client, class_name=CLASS_NAME, batch_size=COMPACTION_BATCH_SIZE,
+                 duplicate_distance=COMPACTION_DUPLICATE_DISTANCE, max_neighbors=COMPACTION_MAX_NEIGHBORS,
+                 retention_days=COMPACTION_RETENTION_DAYS, archive_dir=COMPACTION_ARCHIVE_DIR, dry_run=False):
+        self.client = client
+        self.class_name = class_name
+        self.batch_size = batch_size
+        self.duplicate_distance = duplicate_distance
+        self.max_neighbors = max_neighbors
+        self.retention_days = retention_days
+        self.archive_dir = archive_dir
+        self.dry_run = dry_run
+        self.pages = None
+        self.skipped = set()  # Dry run: ids that would already be gone, so later pages don't count them again
+
+    def step(self):
+        # Compact the next page of the class, starting a new pass after the last one. Returns the
+        # removed ids and the new retrievalCount of every object that absorbed duplicates.
+        if self.pages is None:
+            self.pages = scan_pages(self.client, self.class_name, self.batch_size)
+            self.skipped = set()
+        items = next(self.pages, None)
+        if items is None:
+            self.pages = None
+            return {"removed": [], "counts": {}, "merged": 0, "evicted": 0, "pass_done": True}
+        return {**self.compact(items), "pass_done": False}
+
+    def run_pass(self):
+        # A whole pass in bounded batches, for the CLI
+        totals = {"scanned": 0, "merged": 0, "evicted": 0}
+        self.pages = scan_pages(self.client, self.class_name, self.batch_size)
+        self.skipped = set()
+        for items in self.pages:
+            result = self.compact(items)
+            totals["scanned"] += len(items)
+            totals["merged"] += result["merged"]
+            totals["evicted"] += result["evicted"]
+            print(f"Scanned {totals['scanned']} objects, merged {totals['merged']} duplicates, "
+                  f"evicted {totals['evicted']} expired")
+        self.pages = None
+        return totals
+
+    def compact(self, items):
+        removed = {}  # id -> item, everything this batch deletes
+        counts = {}  # id of a kept object -> retrievalCount including what it absorbed
+        retrieved = {}  # id of a kept object -> latest lastRetrievedUnix in its group
+        merged = evicted = 0
+
+        def gone(item):
+            return object_id(item) in removed or object_id(item) in self.skipped
+
+        if self.retention_days > 0:
+            cutoff = time.time() - self.retention_days * 86400
+            for item in items:
+                if is_expired(item, cutoff):
+                    removed[object_id(item)] = item
+                    evicted += 1
+
+        for item in items:
+            if gone(item):
+                continue
+            duplicates = [other for other in find_duplicates(self.client, self.class_name, item,
+                                                             self.duplicate_distance, self.max_neighbors)
+                          if not gone(other)]
+            if not duplicates:
+                continue
+            group = [item] + duplicates
+            keep = pick_answer(group)
+            # An object that already absorbed duplicates on this page brings their counts along
+            counts[object_id(keep)] = sum(counts.pop(object_id(member), member["retrievalCount"] or 0)
+                                          for member in group)
+            times = [retrieved.pop(object_id(member), member.get("lastRetrievedUnix")) for member in group]
+            retrieved[object_id(keep)] = max((t for t in times if t is not None), default=None)
+            for member in group:
+                if member is not keep:
+                    removed[object_id(member)] = member
+                    merged += 1
+
+        if self.dry_run:
+            self.skipped.update(removed)
+            return {"removed": list(removed), "counts": counts, "merged": merged, "evicted": evicted}
+
+        if removed and self.archive_dir:
+            self.archive(list(removed.values()))
+        for uuid, count in counts.items():
+            update = {"retrievalCount": count}
+            if retrieved[uuid] is not None:
+                update["lastRetrievedUnix"] = retrieved[uuid]
+            self.client.data_object.update(data_object=update, class_name=self.class_name, uuid=uuid)
+        if removed:
+            self.client.batch.delete_objects(self.class_name, where={"path": ["id"], "operator": "ContainsAny",
+                                                                     "valueTextArray": list(removed)})
+        compaction_objects.inc(merged, action="merged")
+        compaction_objects.inc(evicted, action="evicted")
+        return {"removed": list(removed), "counts": counts, "merged": merged, "evicted": evicted}
+
+    def archive(self, items):
+        # Written before the delete, so an interrupted batch leaves a copy rather than a gap
+        os.makedirs(self.archive_dir, exist_ok=True)
+        extension = ".arrow" if COMPACTION_ARCHIVE_FORMAT == "arrow" else ".parquet"
+        path = os.path.join(self.archive_dir, f"compaction-{time.time_ns()}{extension}")
+        schema = snapshot_schema(len(items[0]["_additional"]["vector"]), {"class_name": self.class_name})
+        writer = open_writer(path, schema, is_ipc(path))
+        try:
+            writer.write_batch(page_to_batch(items, schema))
+        finally:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge near-duplicate prompts and evict expired ones")
+    parser.add_argument("--weaviate-url", default=WEAVIATE_URL)
+    parser.add_argument("--class-name", default=CLASS_NAME)
+    parser.add_argument("--batch-size", type=int, default=COMPACTION_BATCH_SIZE, help="Objects per page")
+    parser.add_argument("--duplicate-distance", type=float, default=COMPACTION_DUPLICATE_DISTANCE)
+    parser.add_argument("--retention-days", type=float, default=COMPACTION_RETENTION_DAYS,
+                        help="Evict never retrieved objects older than this, 0 keeps everything")
+    parser.add_argument("--archive-dir", default=COMPACTION_ARCHIVE_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args()
+
+    client = create_weaviate_client(args.weaviate_url)
+    ensure_schema(client)
+    compactor = Compactor(client, args.class_name, args.batch_size,
+                          args.duplicate_distance, retention_days=args.retention_days,
+                          archive_dir=args.archive_dir, dry_run=args.dry_run)
+    compactor.run_pass()
+
+
+if __name__ == '__main__':
+    main()
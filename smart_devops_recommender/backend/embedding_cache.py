@@ -0,0 +1,212 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+# Size of the in-process LRU tier (number of vectors kept in memory)
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '10000'))
+
+# Location of the persistent SQLite tier, set to an empty string to disable it
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', 'embedding_cache.sqlite3')
+
+# Bounds of the SQLite tier: the oldest rows beyond EMBEDDING_CACHE_MAX_ROWS (~6 KB each for ada-002) and
+# rows older than EMBEDDING_CACHE_MAX_AGE_DAYS are deleted, 0 disables either limit
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv('EMBEDDING_CACHE_MAX_ROWS', '100000'))
+EMBEDDING_CACHE_MAX_AGE_DAYS = float(os.getenv('EMBEDDING_CACHE_MAX_AGE_DAYS', '0'))
+
+# The SQLite tier is pruned on open and then once per this many written rows
+PRUNE_EVERY_ROWS = 1000
+
+# text-embedding-ada-002 list price, used to estimate the spend removed by cache hits
+EMBEDDING_PRICE_PER_1K_TOKENS = float(os.getenv('EMBEDDING_PRICE_PER_1K_TOKENS', '0.0001'))
+
+
+def normalize_text(text):
+    # Same text with different unicode forms or whitespace should share one cache entry
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text, model):
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(text):
+    # Rough OpenAI rule of thumb: one token is about four characters of English text
+    return max(1, len(text) // 4)
+
+
+class EmbeddingCache:
+    def __init__(self, max_size=EMBEDDING_CACHE_SIZE, path=EMBEDDING_CACHE_PATH,
+                 max_rows=EMBEDDING_CACHE_MAX_ROWS, max_age_days=EMBEDDING_CACHE_MAX_AGE_DAYS):
+        self.max_size = max_size
+        self.path = path
+        self.max_rows = max_rows
+        self.max_age_days = max_age_days
+        self.memory = OrderedDict()
+        # lock guards the memory tier and counters and is only held briefly, so get_memory can run on the
+        # event loop; db_lock serializes the SQLite tier, whose writes, commits and prunes can take a while
+        self.lock = threading.Lock()
+        self.db_lock = threading.Lock()
+        self.db = None
+        self.written_since_prune = 0
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, "
+                "vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS embeddings_created_at ON embeddings (created_at)")
+            self.db.commit()
+            self.prune()
+
+        # Hit/miss counters
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.miss_seconds = 0.0
+        self.saved_tokens = 0
+
+    def get_memory(self, text, model):
+        # Memory tier only, cheap enough to call on the event loop; get() also reads SQLite
+        key = cache_key(text, model)
+        with self.lock:
+            return self._memory_get(key, text)
+
+    def get(self, text, model):
+        key = cache_key(text, model)
+        with self.lock:
+            vector = self._memory_get(key, text)
+        if vector is not None or self.db is None:
+            return vector
+
+        with self.db_lock:
+            row = self.db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        # Vectors are stored as float32 blobs, promote to the memory tier on read
+        vector = array('f', row[0])
+        with self.lock:
+            self._remember(key, vector)
+            self.disk_hits += 1
+            self.saved_tokens += estimate_tokens(text)
+        return vector.tolist()
+
+    def put(self, text, model, vector, elapsed=0.0):
+        key = cache_key(text, model)
+        vector = array('f', vector)
+        with self.lock:
+            self.misses += 1
+            self.miss_seconds += elapsed
+            self._remember(key, vector)
+        if self.db is not None:
+            with self.db_lock:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, model, len(vector), vector.tobytes(), time.time())
+                )
+                self.db.commit()
+                self._written(1)
+
+    def put_many(self, texts, model, vectors, elapsed=0.0):
+        # Bulk variant used for multi-input embedding calls, one SQLite commit per batch
+        rows = []
+        with self.lock:
+            for text, vector in zip(texts, vectors):
+                key = cache_key(text, model)
+                self.misses += 1
+                vector = array('f', vector)
+                self._remember(key, vector)
+                rows.append((key, model, len(vector), vector.tobytes(), time.time()))
+            self.miss_seconds += elapsed
+        if self.db is not None:
+            with self.db_lock:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                self.db.commit()
+                self._written(len(rows))
+
+    def prune(self):
+        # Drop SQLite rows past the age and row limits, oldest first. Returns the number of rows deleted.
+        if self.db is None:
+            return 0
+        with self.db_lock:
+            return self._prune()
+
+    def _prune(self):
+        deleted = 0
+        if self.max_age_days > 0:
+            cutoff = time.time() - self.max_age_days * 86400
+            deleted += self.db.execute("DELETE FROM embeddings WHERE created_at < ?", (cutoff,)).rowcount
+        if self.max_rows > 0:
+            deleted += self.db.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (self.max_rows,)
+            ).rowcount
+        self.db.commit()
+        self.written_since_prune = 0
+        return deleted
+
+    def _written(self, rows):
+        self.written_since_prune += rows
+        if self.written_since_prune >= PRUNE_EVERY_ROWS:
+            self._prune()
+
+    def _memory_get(self, key, text):
+        vector = self.memory.get(key)
+        if vector is None:
+            return None
+        self.memory.move_to_end(key)
+        self.memory_hits += 1
+        self.saved_tokens += estimate_tokens(text)
+        return vector.tolist()
+
+    def _remember(self, key, vector):
+        # Kept as float32 arrays (~6 KB for ada-002) rather than lists of Python floats (~50 KB)
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    def stats(self):
+        disk_entries = None
+        if self.db is not None:
+            with self.db_lock:
+                disk_entries = self.db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        with self.lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            avg_miss_seconds = self.miss_seconds / self.misses if self.misses else 0.0
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "disk_entries": disk_entries,
+                "avg_miss_latency_seconds": avg_miss_seconds,
+                # Every hit avoided one API round trip of roughly the average miss latency
+                "estimated_seconds_saved": hits * avg_miss_seconds,
+                "estimated_tokens_saved": self.saved_tokens,
+                "estimated_cost_saved_usd": self.saved_tokens / 1000 * EMBEDDING_PRICE_PER_1K_TOKENS
+            }
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+        if self.db is not None:
+            with self.db_lock:
+                self.db.execute("DELETE FROM embeddings")
+                self.db.commit()
+
+
+embedding_cache = EmbeddingCache()
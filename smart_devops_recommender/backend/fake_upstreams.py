@@ -0,0 +1,544 @@
+import re
+import sys
+import json
+import time
+import uuid
+import zlib
+import base64
+import asyncio
+import argparse
+import threading
+import numpy as np
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Local stand-ins for OpenAI and Weaviate used by benchmark.py.
+#
+#   python fake_upstreams.py openai --port 8001
+#   python fake_upstreams.py weaviate --port 8081 --corpus-size 100000
+#
+# Embeddings are deterministic bag-of-words vectors (sum of one seeded random vector per
+# token), so texts sharing words are close in cosine distance, like real embeddings.
+# The Weaviate stand-in implements the REST/GraphQL subset used by routes.py, get.py,
+# insert_embeddings.py and ingest.py.
+
+VOCAB_SIZE = 4096
+
+DEVOPS_WORDS = [
+    "kubernetes", "docker", "terraform", "ansible", "jenkins", "gitlab", "github", "actions", "pipeline", "deploy",
+    "deployment", "cluster", "node", "pod", "container", "image", "registry", "helm", "chart", "monitoring",
+    "prometheus", "grafana", "logging", "elk", "secrets", "vault", "aws", "azure", "gcp", "cloud", "network",
+    "load", "balancer", "autoscaling", "rollback", "blue", "green", "canary", "release", "build", "test", "ci",
+    "cd", "infrastructure", "code", "configuration", "management", "backup", "restore", "database", "cache",
+    "latency", "availability", "incident", "alert", "runbook", "service", "mesh", "istio", "ingress", "dns",
+    "certificate", "tls", "firewall", "policy", "rbac", "namespace", "volume", "storage", "queue", "kafka"
+]
+QUESTION_STARTS = ["how do you", "what is", "why does", "how can i", "what are best practices for", "how to"]
+
+
+def tokenize(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+class Embedder:
+    def __init__(self, dim=1536, seed=0):
+        self.dim = dim
+        self.table = np.random.default_rng(seed).standard_normal((VOCAB_SIZE, dim)).astype(np.float32)
+
+    def token_ids(self, text):
+        return [zlib.crc32(token.encode()) % VOCAB_SIZE for token in tokenize(text)]
+
+    def embed(self, text):
+        ids = self.token_ids(text)
+        vector = self.table[ids].sum(axis=0) if ids else self.table[0]
+        return vector / (np.linalg.norm(vector) or 1)
+
+
+def generate_corpus(size, seed=0):
+    # Synthetic prompt/response pairs drawn from a DevOps vocabulary
+    rng = np.random.default_rng(seed)
+    words = np.array(DEVOPS_WORDS)
+    for _ in range(size):
+        start = QUESTION_STARTS[rng.integers(len(QUESTION_STARTS))]
+        prompt = f"{start} {' '.join(words[rng.integers(len(words), size=rng.integers(3, 7))])}?"
+        response = " ".join(words[rng.integers(len(words), size=rng.integers(20, 200))])
+        yield {"prompt": prompt, "response": response}
+
+
+def combined_text(record):
+    return f"Prompt: {record['prompt']} Response: {record['response']}"
+
+
+# OpenAI ---------------------------------------------------------------------------------------------------------------
+
+def create_openai_app(dim=1536, embedding_latency=0.0, completion_latency=0.0, token_latency=0.0):
+    app = FastAPI()
+    embedder = Embedder(dim)
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        await asyncio.sleep(embedding_latency)
+        data = []
+        for i, text in enumerate(inputs):
+            vector = embedder.embed(text)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.astype(np.float32).tobytes()).decode()
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = sum(len(tokenize(text)) for text in inputs)
+        return {"object": "list", "data": data, "model": body["model"],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        question = body["messages"][-1]["content"]
+        words = tokenize(question)
+        answer_tokens = ["<p>"] + [f"{words[i % len(words)] if words else 'devops'} " for i in range(60)] + ["</p>"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if body.get("stream"):
+            async def chunks():
+                await asyncio.sleep(completion_latency)
+                for token in answer_tokens:
+                    await asyncio.sleep(token_latency)
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                             "model": body["model"],
+                             "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                    yield f"data: {JSONResponse(chunk).body.decode()}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        await asyncio.sleep(completion_latency + token_latency * len(answer_tokens))
+        return {"id": completion_id, "object": "chat.completion", "created": created, "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(answer_tokens)},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(words), "completion_tokens": len(answer_tokens),
+                          "total_tokens": len(words) + len(answer_tokens)}}
+
+    return app
+
+
+# Weaviate -------------------------------------------------------------------------------------------------------------
+
+class GraphQLParser:
+    """Just enough GraphQL to read the Get queries built by weaviate-client v3."""
+
+    token_pattern = re.compile(r'\s*(?:("(?:[^"\\]|\\.)*")|([-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)|([A-Za-z_]\w*)|(.))')
+
+    def __init__(self, text):
+        self.tokens = []
+        for match in self.token_pattern.finditer(text):
+            string, number, name, punct = match.groups()
+            if string is not None:
+                self.tokens.append(("string", string))
+            elif number is not None:
+                self.tokens.append(("number", number))
+            elif name is not None:
+                self.tokens.append(("name", name))
+            elif punct is not None and punct.strip() and punct != ",":
+                self.tokens.append(("punct", punct))
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, expected=None):
+        token = self.peek()
+        if expected is not None and token[1] != expected:
+            raise ValueError(f"Expected {expected!r}, got {token[1]!r}")
+        self.pos += 1
+        return token
+
+    def selection_set(self):
+        self.take("{")
+        fields = []
+        while self.peek()[1] != "}":
+            _, name = self.take()
+            args = {}
+            if self.peek()[1] == "(":
+                self.take("(")
+                while self.peek()[1] != ")":
+                    _, key = self.take()
+                    self.take(":")
+                    args[key] = self.value()
+                self.take(")")
+            children = self.selection_set() if self.peek()[1] == "{" else None
+            fields.append((name, args, children))
+        self.take("}")
+        return fields
+
+    def value(self):
+        kind, text = self.take()
+        if kind == "string":
+            return json.loads(text)
+        if kind == "number":
+            return float(text) if any(c in text for c in ".eE") else int(text)
+        if kind == "name":
+            return {"true": True, "false": False, "null": None}.get(text, text)
+        if text == "[":
+            values = []
+            while self.peek()[1] != "]":
+                values.append(self.value())
+            self.take("]")
+            return values
+        if text == "{":
+            obj = {}
+            while self.peek()[1] != "}":
+                _, key = self.take()
+                self.take(":")
+                obj[key] = self.value()
+            self.take("}")
+            return obj
+        raise ValueError(f"Unexpected token {text!r}")
+
+
+class FakeWeaviateStore:
+    def __init__(self, dim=1536):
+        self.dim = dim
+        self.lock = threading.RLock()
+        self.classes = {}
+        self.vectors = np.zeros((1024, dim), dtype=np.float32)
+        self.alive = np.zeros(1024, dtype=bool)
+        self.class_codes = np.zeros(1024, dtype=np.int32)
+        self.ids = []
+        self.class_names = []
+        self.properties = []
+        self.created = []
+        self.updated = []
+        self.rows = {}
+        self.codes = {}
+        self.sorted_rows = None
+        self.sorted_ids = None
+
+    def ensure_class(self, class_name):
+        if class_name not in self.classes:
+            self.classes[class_name] = {"class": class_name, "properties": [], "vectorizer": "none"}
+        return self.codes.setdefault(class_name, len(self.codes) + 1)
+
+    def put(self, class_name, properties, vector, object_id=None, created=None, merge=False):
+        with self.lock:
+            code = self.ensure_class(class_name)
+            object_id = object_id or str(uuid.uuid4())
+            now = time.time()
+            row = self.rows.get(object_id)
+            if row is None:
+                row = len(self.ids)
+                if row >= len(self.vectors):
+                    self.vectors = np.resize(self.vectors, (len(self.vectors) * 2, self.dim))
+                    self.alive = np.resize(self.alive, len(self.vectors))
+                    self.class_codes = np.resize(self.class_codes, len(self.vectors))
+                self.ids.append(object_id)
+                self.class_names.append(class_name)
+                self.properties.append({})
+                self.created.append(created or now)
+                self.updated.append(now)
+                self.rows[object_id] = row
+                self.sorted_rows = None
+            if merge:
+                self.properties[row].update(properties)
+            else:
+                self.properties[row] = dict(properties)
+            if vector is not None:
+                vector = np.asarray(vector, dtype=np.float32)
+                self.vectors[row] = vector / (np.linalg.norm(vector) or 1)
+            self.alive[row] = True
+            self.class_codes[row] = code
+            self.updated[row] = now
+            return object_id
+
+    def delete(self, object_id):
+        with self.lock:
+            row = self.rows.pop(object_id, None)
+            if row is not None:
+                self.alive[row] = False
+            return row is not None
+
+    def delete_class(self, class_name):
+        with self.lock:
+            self.classes.pop(class_name, None)
+            for object_id in [i for i, row in list(self.rows.items()) if self.class_names[row] == class_name]:
+                self.delete(object_id)
+
+    def seed(self, embedder, size, class_name="DevOpsPrompts_v2", seed=0):
+        # Bulk-load a synthetic corpus straight into the store, spread over the last 90 days
+        rng = np.random.default_rng(seed)
+        now = time.time()
+        for i, record in enumerate(generate_corpus(size, seed)):
+            self.put(class_name, {
+                "prompt": record["prompt"],
+                "response": record["response"],
+                "retrievalCount": int(rng.integers(0, 50)),
+                "responseLength": len(record["response"])
+            }, embedder.embed(combined_text(record)), str(uuid.UUID(int=int(rng.integers(0, 2 ** 63)) << 64 | i)),
+                created=now - float(rng.uniform(0, 90 * 86400)))
+
+    def object_json(self, row, include_vector=False):
+        obj = {"class": self.class_names[row], "id": self.ids[row], "properties": self.properties[row],
+               "creationTimeUnix": int(self.created[row] * 1000),
+               "lastUpdateTimeUnix": int(self.updated[row] * 1000)}
+        if include_vector:
+            obj["vector"] = self.vectors[row].tolist()
+        return obj
+
+    def matches(self, row, where):
+        operator = where["operator"]
+        if operator == "And":
+            return all(self.matches(row, operand) for operand in where["operands"])
+        if operator == "Or":
+            return any(self.matches(row, operand) for operand in where["operands"])
+
+        path = where["path"][-1]
+        if path == "id":
+            actual = self.ids[row]
+        elif path == "_creationTimeUnix":
+            actual = int(self.created[row] * 1000)
+        elif path == "_lastUpdateTimeUnix":
+            actual = int(self.updated[row] * 1000)
+        else:
+            actual = self.properties[row].get(path)
+        expected = next(v for k, v in where.items() if k.startswith("value"))
+        if path.startswith("_") and isinstance(expected, str):
+            expected = int(expected)
+
+        if operator == "ContainsAny":
+            return actual in expected
+        if operator == "Equal":
+            return actual == expected
+        if operator == "NotEqual":
+            return actual != expected
+        if operator == "IsNull":
+            return (actual is None) == expected
+        if actual is None:
+            return False
+        if operator == "LessThan":
+            return actual < expected
+        if operator == "LessThanEqual":
+            return actual <= expected
+        if operator == "GreaterThan":
+            return actual > expected
+        if operator == "GreaterThanEqual":
+            return actual >= expected
+        raise ValueError(f"Unsupported operator {operator}")
+
+    def get(self, class_name, args, fields):
+        with self.lock:
+            size = len(self.ids)
+            mask = self.alive[:size] & (self.class_codes[:size] == self.codes.get(class_name, -1))
+            where = args.get("where")
+            if where is not None:
+                if where.get("operator") == "ContainsAny" and where["path"] == ["id"]:
+                    # Id lookups are common (counter flushes, hydration), avoid the full scan
+                    keep = np.zeros(size, dtype=bool)
+                    keep[[self.rows[i] for i in where["valueText"] if i in self.rows]] = True
+                    mask &= keep
+                else:
+                    mask &= np.array([self.matches(row, where) if mask[row] else False for row in range(size)],
+                                     dtype=bool)
+
+            rows = np.flatnonzero(mask)
+            distances = None
+            near_vector = args.get("nearVector")
+            if near_vector is not None:
+                query = np.asarray(near_vector["vector"], dtype=np.float32)
+                query /= np.linalg.norm(query) or 1
+                distances = 1 - self.vectors[rows] @ query
+                if "distance" in near_vector:
+                    keep = distances <= near_vector["distance"]
+                    rows, distances = rows[keep], distances[keep]
+                order = np.argsort(distances, kind="stable")
+                rows, distances = rows[order], distances[order]
+            else:
+                # Without a vector, results (and the `after` cursor) are ordered by id like Weaviate
+                if self.sorted_rows is None:
+                    self.sorted_rows = np.array(sorted(range(size), key=lambda r: self.ids[r]), dtype=np.int64)
+                    self.sorted_ids = np.array([self.ids[r] for r in self.sorted_rows])
+                sorted_rows = self.sorted_rows
+                if "after" in args and size:
+                    sorted_rows = sorted_rows[np.searchsorted(self.sorted_ids, args["after"], side="right"):]
+                rows = sorted_rows[mask[sorted_rows]]
+
+            offset = args.get("offset", 0)
+            limit = args.get("limit", 20)
+            rows = rows[offset:offset + limit]
+            if distances is not None:
+                distances = distances[offset:offset + limit]
+
+            results = []
+            for i, row in enumerate(rows):
+                item = {}
+                for name, _, children in fields:
+                    if name == "_additional":
+                        item["_additional"] = self.additional(row, children,
+                                                              None if distances is None else float(distances[i]))
+                    else:
+                        item[name] = self.properties[row].get(name)
+                results.append(item)
+            return results
+
+    def additional(self, row, fields, distance):
+        values = {}
+        for name, _, _ in fields:
+            if name == "id":
+                values["id"] = self.ids[row]
+            elif name == "distance":
+                values["distance"] = distance
+            elif name == "certainty":
+                values["certainty"] = None if distance is None else 1 - distance / 2
+            elif name == "vector":
+                values["vector"] = self.vectors[row].tolist()
+            elif name == "creationTimeUnix":
+                values["creationTimeUnix"] = str(int(self.created[row] * 1000))
+            elif name == "lastUpdateTimeUnix":
+                values["lastUpdateTimeUnix"] = str(int(self.updated[row] * 1000))
+        return values
+
+
+def create_weaviate_app(store):
+    app = FastAPI()
+
+    @app.get("/v1/.well-known/ready")
+    @app.get("/v1/.well-known/live")
+    async def ready():
+        return Response(status_code=200)
+
+    @app.get("/v1/meta")
+    async def meta():
+        return {"hostname": "http://[::]:8080", "modules": {}, "version": "1.24.0"}
+
+    @app.get("/v1/nodes")
+    async def nodes():
+        return {"nodes": [{"name": "fake", "status": "HEALTHY", "version": "1.24.0"}]}
+
+    @app.get("/v1/schema")
+    async def get_schema():
+        return {"classes": list(store.classes.values())}
+
+    @app.post("/v1/schema")
+    async def create_class(request: Request):
+        schema_class = await request.json()
+        store.classes[schema_class["class"]] = schema_class
+        return schema_class
+
+    @app.get("/v1/schema/{class_name}")
+    async def get_class(class_name: str):
+        if class_name not in store.classes:
+            return Response(status_code=404)
+        return store.classes[class_name]
+
+    @app.delete("/v1/schema/{class_name}")
+    async def delete_class(class_name: str):
+        store.delete_class(class_name)
+        return Response(status_code=200)
+
+    @app.post("/v1/schema/{class_name}/properties")
+    async def create_property(class_name: str, request: Request):
+        prop = await request.json()
+        store.ensure_class(class_name)
+        store.classes[class_name]["properties"].append(prop)
+        return prop
+
+    @app.get("/v1/schema/{class_name}/shards")
+    async def shards(class_name: str):
+        return [{"name": "fake", "status": "READY"}]
+
+    @app.post("/v1/objects")
+    async def create_object(request: Request):
+        obj = await request.json()
+        if obj.get("id") in store.rows:
+            return JSONResponse({"error": [{"message": f"id '{obj['id']}' already exists"}]}, status_code=422)
+        object_id = store.put(obj["class"], obj.get("properties", {}), obj.get("vector"), obj.get("id"))
+        return {**obj, "id": object_id}
+
+    @app.api_route("/v1/objects/{class_name}/{object_id}", methods=["GET", "HEAD", "PUT", "PATCH", "DELETE"])
+    async def object_by_id(class_name: str, object_id: str, request: Request):
+        row = store.rows.get(object_id)
+        if request.method == "PUT":
+            obj = await request.json()
+            store.put(class_name, obj.get("properties", {}), obj.get("vector"), object_id)
+            return {**obj, "id": object_id}
+        if row is None:
+            return Response(status_code=404)
+        if request.method == "PATCH":
+            obj = await request.json()
+            store.put(class_name, obj.get("properties", {}), obj.get("vector"), object_id, merge=True)
+            return Response(status_code=204)
+        if request.method == "DELETE":
+            store.delete(object_id)
+            return Response(status_code=204)
+        if request.method == "HEAD":
+            return Response(status_code=204)
+        return store.object_json(row, include_vector="vector" in request.query_params.get("include", ""))
+
+    @app.post("/v1/batch/objects")
+    async def batch_objects(request: Request):
+        body = await request.json()
+        results = []
+        for obj in body["objects"]:
+            object_id = store.put(obj["class"], obj.get("properties", {}), obj.get("vector"), obj.get("id"))
+            results.append({**obj, "id": object_id, "result": {}})
+        return results
+
+    @app.delete("/v1/batch/objects")
+    async def batch_delete(request: Request):
+        body = await request.json()
+        match = body["match"]
+        with store.lock:
+            ids = [store.ids[row] for row in store.rows.values()
+                   if store.class_names[row] == match["class"] and store.matches(row, match["where"])]
+            if not body.get("dryRun"):
+                for object_id in ids:
+                    store.delete(object_id)
+        return {**body, "results": {"matches": len(ids), "limit": 10000, "successful": len(ids), "failed": 0}}
+
+    @app.post("/v1/graphql")
+    async def graphql(request: Request):
+        body = await request.json()
+        try:
+            document = GraphQLParser(body["query"]).selection_set()
+            data = {}
+            for operation, _, classes in document:
+                if operation != "Get":
+                    raise ValueError(f"Unsupported operation {operation}")
+                data["Get"] = {name: store.get(name, args, children) for name, args, children in classes}
+            return {"data": data}
+        except Exception as e:
+            return {"data": None, "errors": [{"message": str(e)}]}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a local OpenAI or Weaviate stand-in")
+    parser.add_argument("service", choices=["openai", "weaviate"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--corpus-size", type=int, default=0, help="Synthetic objects to pre-load (weaviate)")
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0)
+    parser.add_argument("--completion-latency-ms", type=float, default=0.0)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.service == "openai":
+        app = create_openai_app(args.dim, args.embedding_latency_ms / 1000, args.completion_latency_ms / 1000,
+                                args.token_latency_ms / 1000)
+    else:
+        store = FakeWeaviateStore(args.dim)
+        start = time.perf_counter()
+        store.seed(Embedder(args.dim), args.corpus_size)
+        print(f"Seeded {args.corpus_size} objects in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        app = create_weaviate_app(store)
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == '__main__':
+    main()
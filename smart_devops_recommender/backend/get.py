@@ -1,9 +1,11 @@
 import polars as pl
 from utils import generate_embedding
-from client_setup import client
+from client_setup import get_weaviate_client
 from polars_udfs import expanded_config
 expanded_config()
 
+client = get_weaviate_client()
+
 # Define the query text
 query_text = "How do you set up a CI/CD pipeline?"
 
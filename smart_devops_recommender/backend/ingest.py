@@ -0,0 +1,250 @@
+import os
+import csv
+import json
+import time
+import argparse
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import generate_embeddings
+from schema import CLASS_NAME, ensure_schema, object_uuid
+from client_setup import WEAVIATE_URL, create_weaviate_client
+
+# Bulk ingestion of prompt/response pairs into DevOpsPrompts_v2
+#
+#   python ingest.py prompts.jsonl
+#   python ingest.py prompts.parquet --embed-batch-size 256 --embed-concurrency 8
+#
+# Records need "prompt" and "response" fields, "retrievalCount" is optional. Re-importing a prompt that
+# is already stored replaces its response but keeps its retrieval counters, see stored_counters.
+# Progress is checkpointed after every chunk that Weaviate has acknowledged, so re-running
+# the same command after a crash resumes from the last committed record. Records Weaviate rejects
+# are appended to a reject file with their error (default: <source>.rejects.jsonl); fix and
+# import that file to retry them.
+
+# Inputs per embeddings API call, and how many of those calls run at once
+EMBED_BATCH_SIZE = int(os.getenv('INGEST_EMBED_BATCH_SIZE', '128'))
+EMBED_CONCURRENCY = int(os.getenv('INGEST_EMBED_CONCURRENCY', '4'))
+
+# Weaviate batch importer settings
+WEAVIATE_BATCH_SIZE = int(os.getenv('INGEST_WEAVIATE_BATCH_SIZE', '200'))
+WEAVIATE_BATCH_WORKERS = int(os.getenv('INGEST_WEAVIATE_BATCH_WORKERS', '2'))
+
+
+def combined_text(record):
+    return f"Prompt: {record['prompt']} Response: {record['response']}"
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_csv(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def read_parquet(path, chunk_size=10000):
+    import polars as pl
+
+    # Scan lazily and materialize one slice at a time so large files never load whole
+    lazy = pl.scan_parquet(path)
+    offset = 0
+    while True:
+        chunk = lazy.slice(offset, chunk_size).collect()
+        if chunk.height == 0:
+            return
+        yield from chunk.iter_rows(named=True)
+        offset += chunk.height
+
+
+def read_records(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".ndjson"):
+        return read_jsonl(path)
+    if extension == ".csv":
+        return read_csv(path)
+    if extension == ".parquet":
+        return read_parquet(path)
+    raise ValueError(f"Unsupported input format: {extension}")
+
+
+def load_checkpoint(checkpoint_path, source):
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return 0
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("source") != os.path.abspath(source):
+        return 0
+    return checkpoint["records_done"]
+
+
+def save_checkpoint(checkpoint_path, source, records_done):
+    if not checkpoint_path:
+        return
+    # Write to a temp file and rename so a crash mid-write can't corrupt the checkpoint
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"source": os.path.abspath(source), "records_done": records_done}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def check_batch_results(results):
+    # Callback for the Weaviate batch importer, surfaces per-object errors
+    for result in results or []:
+        errors = result.get("result", {}).get("errors")
+        if errors:
+            print(f"Weaviate batch error: {errors}")
+
+
+def stored_counters(client, uuids):
+    # retrievalCount and lastRetrievedUnix of the given objects that already exist. Batch writes replace
+    # the whole object, so without these a re-import would reset what /chat and compaction rely on.
+    result = client.query.get(CLASS_NAME, ["retrievalCount", "lastRetrievedUnix"]) \
+        .with_where({"path": ["id"], "operator": "ContainsAny", "valueTextArray": uuids}) \
+        .with_additional(["id"]) \
+        .with_limit(len(uuids)) \
+        .do()
+    return {item["_additional"]["id"]: item for item in result['data']['Get'][CLASS_NAME] or []}
+
+
+class BatchErrors:
+    # Batch importer callback that also keeps the per-object errors by id, so the caller can tell which
+    # writes were rejected. Batch workers may call it from their own threads.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.errors = {}
+
+    def __call__(self, results):
+        check_batch_results(results)
+        with self.lock:
+            for result in results or []:
+                errors = result.get("result", {}).get("errors")
+                if errors:
+                    self.errors[result.get("id")] = errors
+
+    def take(self):
+        with self.lock:
+            errors, self.errors = self.errors, {}
+        return errors
+
+
+def write_rejects(path, rejected):
+    # Appends (record, errors) pairs as JSON lines, in the input format plus an "error" field
+    if not path or not rejected:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        for record, errors in rejected:
+            f.write(json.dumps({**record, "error": errors}, default=str) + "\n")
+
+
+def import_records(client, records, embed_batch_size=EMBED_BATCH_SIZE, embed_concurrency=EMBED_CONCURRENCY,
+                   checkpoint=None, source=None, skip=0, rejects=None):
+    batch_errors = BatchErrors()
+    client.batch.configure(
+        batch_size=WEAVIATE_BATCH_SIZE,
+        num_workers=WEAVIATE_BATCH_WORKERS,
+        dynamic=True,
+        callback=batch_errors
+    )
+
+    records_done = skip
+    imported = 0
+    rejected = 0
+    start = time.perf_counter()
+
+    # Each chunk is embedded by `embed_concurrency` parallel multi-input calls
+    chunk_size = embed_batch_size * embed_concurrency
+    with ThreadPoolExecutor(max_workers=embed_concurrency) as executor:
+        for chunk in batched(itertools.islice(records, skip, None), chunk_size):
+            # Objects are keyed by their prompt, so a repeated prompt within the chunk is only embedded once
+            # (the last record wins, as it would across chunks and re-runs)
+            unique = list({object_uuid(record["prompt"]): record for record in chunk}.values())
+            embed_batches = list(batched(unique, embed_batch_size))
+            embeddings = executor.map(lambda b: generate_embeddings([combined_text(r) for r in b]), embed_batches)
+            stored = stored_counters(client, [object_uuid(record["prompt"]) for record in unique])
+
+            with client.batch as batch:
+                for embed_batch, vectors in zip(embed_batches, embeddings):
+                    for record, vector in zip(embed_batch, vectors):
+                        uuid = object_uuid(record["prompt"])
+                        existing = stored.get(uuid, {})
+                        data_object = {
+                            "prompt": record["prompt"],
+                            "response": record["response"],
+                            # The higher of the two, so re-running an import never counts a record twice
+                            "retrievalCount": max(int(record.get("retrievalCount") or 0),
+                                                  existing.get("retrievalCount") or 0),
+                            "responseLength": len(record["response"])
+                        }
+                        if existing.get("lastRetrievedUnix") is not None:
+                            data_object["lastRetrievedUnix"] = existing["lastRetrievedUnix"]
+                        batch.add_data_object(
+                            data_object=data_object,
+                            class_name=CLASS_NAME,
+                            uuid=uuid,
+                            vector=vector
+                        )
+            # Leaving the batch context flushes it, so the chunk is durable in Weaviate here, except for
+            # the objects it rejected. Those are in the reject file before the checkpoint moves past them.
+            errors = batch_errors.take()
+            chunk_rejects = [(record, errors[object_uuid(record["prompt"])]) for record in unique
+                             if object_uuid(record["prompt"]) in errors]
+            write_rejects(rejects, chunk_rejects)
+
+            records_done += len(chunk)
+            imported += len(chunk) - len(chunk_rejects)
+            rejected += len(chunk_rejects)
+            save_checkpoint(checkpoint, source, records_done)
+
+            elapsed = time.perf_counter() - start
+            print(f"Imported {records_done} records ({imported / elapsed:.1f} records/sec)")
+
+    elapsed = time.perf_counter() - start
+    return {"imported": imported, "rejected": rejected, "seconds": elapsed,
+            "records_per_sec": imported / elapsed if elapsed else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream prompt/response pairs into Weaviate")
+    parser.add_argument("source", help="Input file (.jsonl, .csv or .parquet)")
+    parser.add_argument("--weaviate-url", default=WEAVIATE_URL)
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <source>.checkpoint)")
+    parser.add_argument("--rejects", default=None, help="Reject file (default: <source>.rejects.jsonl)")
+    parser.add_argument("--embed-batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--embed-concurrency", type=int, default=EMBED_CONCURRENCY)
+    parser.add_argument("--restart", action="store_true", help="Ignore any existing checkpoint")
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or f"{args.source}.checkpoint"
+    skip = 0 if args.restart else load_checkpoint(checkpoint, args.source)
+    rejects = args.rejects or f"{args.source}.rejects.jsonl"
+    if skip:
+        print(f"Resuming after {skip} records from {checkpoint}")
+    elif os.path.exists(rejects):
+        os.remove(rejects)  # Starting over, so every record is retried and may be rejected again
+
+    client = create_weaviate_client(args.weaviate_url)
+    ensure_schema(client)
+
+    stats = import_records(client, read_records(args.source), args.embed_batch_size, args.embed_concurrency,
+                           checkpoint=checkpoint, source=args.source, skip=skip, rejects=rejects)
+    print(f"Done: {stats['imported']} records in {stats['seconds']:.1f}s ({stats['records_per_sec']:.1f} records/sec)")
+    if stats["rejected"]:
+        print(f"Rejected {stats['rejected']} records, see {rejects}")
+
+
+if __name__ == '__main__':
+    main()
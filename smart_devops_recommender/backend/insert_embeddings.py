@@ -1,40 +1,12 @@
-import openai
-import weaviate
-import os
-from utils import generate_embedding
-
-# Initialize the OpenAI client
-openai.api_key = os.getenv('OPENAI_KEY')  # Replace with your actual OpenAI API key
+from client_setup import get_weaviate_client
+from schema import ensure_schema
+from ingest import import_records
 
 # Initialize the Weaviate client
-client = weaviate.Client("http://localhost:8080")  # Replace with your Weaviate instance URL
-
-# Define the schema
-schema = {
-    "classes": [
-        {
-            "class": "DevOpsPrompts_v2",
-            "properties": [
-                {
-                    "name": "prompt",
-                    "dataType": ["text"]
-                },
-                {
-                    "name": "response",
-                    "dataType": ["text"]
-                },
-                {
-                    "name": "retrievalCount",
-                    "dataType": ["int"]
-                }
-            ]
-        }
-
-    ]
-}
+client = get_weaviate_client()
 
 # Create the schema
-client.schema.create(schema)
+ensure_schema(client)
 
 # Prepare the DevOps-related prompt-response pairs
 data = [
@@ -63,31 +35,16 @@ data = [
 ]
 
 
-# Function to generate embeddings using OpenAI
-
-# Use batch import to add data with embeddings
-with client.batch as batch:
-    for i, d in enumerate(data):
-        print(f"Importing prompt-response pair: {i+1}")
-        combined_text = f"Prompt: {d['prompt']} Response: {d['response']}"
-        embedding = generate_embedding(combined_text)
-        properties = {
-            "prompt": d["prompt"],
-            "response": d["response"]
-        }
-        batch.add_data_object(
-            data_object=properties,
-            class_name="DevOpsPrompts",
-            vector=embedding
-        )
+# Use batched embedding calls and the Weaviate batch importer, see ingest.py for large files
+import_records(client, iter(data))
 
 print("Data inserted successfully.")
 
 # Query the data to verify vector generation
-result = client.query.get("DevOpsPrompts", ["prompt", "response", "_additional { vector }"]).do()
+result = client.query.get("DevOpsPrompts_v2", ["prompt", "response", "_additional { vector }"]).do()
 
 # Print the results
-for item in result['data']['Get']['DevOpsPrompts']:
+for item in result['data']['Get']['DevOpsPrompts_v2']:
     print(f"Prompt: {item['prompt']}")
     print(f"Response: {item['response']}")
     print(f"Vector: {item['_additional']['vector']}\n")
@@ -0,0 +1,289 @@
+import os
+import re
+import math
+import time
+import threading
+from bisect import bisect_left
+from collections import Counter
+import numpy as np
+from embedding_cache import normalize_text
+
+# In-process BM25 index over the prompt text of DevOpsPrompts_v2. /recommender consults it before
+# embedding: typeahead queries that are (near) verbatim copies of stored prompts are answered from
+# here, otherwise the lexical score is one more ranking feature.
+#
+# lexical_score is BM25 divided by the sum of the query terms' IDF, i.e. 1.0 for a document of
+# average length containing every query term once, clipped to [0, 1]. It only measures the query's
+# side: a long prompt holding every query term scores 1.0 too. coverage() measures the document's
+# side, the share of its terms the query matches, and a confident match needs both.
+
+BM25_K1 = float(os.getenv('LEXICAL_BM25_K1', '1.2'))
+BM25_B = float(os.getenv('LEXICAL_BM25_B', '0.75'))
+
+# The last query token is treated as a prefix (the user is still typing), expanded to at most this many terms
+PREFIX_EXPANSIONS = int(os.getenv('LEXICAL_PREFIX_EXPANSIONS', '50'))
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words that say nothing about the topic of a DevOps question, see content_tokens
+STOPWORDS = frozenset(("a an and are as at be can do does for from how i in is it me my of on or should the this "
+                       "to what when where which who why will with you your").split())
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(normalize_text(text).casefold())
+
+
+def content_tokens(tokens):
+    # Tokens that carry meaning: not a stopword and longer than one character (a prefix just started)
+    return [token for token in tokens if token not in STOPWORDS and len(token) > 1]
+
+
+def prefix_match(query, text):
+    # Share of the query's tokens found in the text, the last one (still being typed) as a token prefix.
+    # For scoring a handful of candidates against a query without an index.
+    tokens = tokenize(query)
+    if not tokens:
+        return 0.0
+    words = set(tokenize(text))
+    matched = sum(token in words for token in tokens[:-1])
+    matched += any(word.startswith(tokens[-1]) for word in words)
+    return matched / len(tokens)
+
+
+class LexicalIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self._reset(capacity=1024)
+
+    def _reset(self, capacity):
+        self.size = 0  # Rows ever used, removed rows stay as dead entries until the next reconcile
+        self.live = 0
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.lengths = np.zeros(capacity, dtype=np.float32)
+        self.retrieval_counts = np.zeros(capacity, dtype=np.int64)
+        self.creation_times = np.zeros(capacity, dtype=np.float64)
+        self.response_lengths = np.zeros(capacity, dtype=np.int64)
+        self.ids = []
+        self.prompts = []
+        self.rows = {}
+        self.total_length = 0
+        # term -> [rows, term frequencies, cached numpy arrays]
+        self.postings = {}
+        self.vocabulary = []
+        self.vocabulary_sorted = True
+
+    def __len__(self):
+        return self.live
+
+    def _grow(self, needed):
+        capacity = len(self.alive)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self.alive = np.resize(self.alive, capacity)
+        self.lengths = np.resize(self.lengths, capacity)
+        self.retrieval_counts = np.resize(self.retrieval_counts, capacity)
+        self.creation_times = np.resize(self.creation_times, capacity)
+        self.response_lengths = np.resize(self.response_lengths, capacity)
+
+    def add(self, uuid, prompt, response_length, retrieval_count=None, creation_time=None):
+        # Insert or update; an updated prompt gets a new row and keeps its counter and creation time
+        tokens = Counter(tokenize(prompt))
+        with self.lock:
+            old_row = self.rows.get(uuid)
+            if old_row is not None:
+                if retrieval_count is None:
+                    retrieval_count = int(self.retrieval_counts[old_row])
+                if creation_time is None:
+                    creation_time = float(self.creation_times[old_row])
+                self.remove(uuid)
+
+            row = self.size
+            self._grow(row + 1)
+            self.size += 1
+            self.live += 1
+            self.ids.append(uuid)
+            self.prompts.append(prompt)
+            self.rows[uuid] = row
+            self.alive[row] = True
+            self.lengths[row] = sum(tokens.values())
+            self.total_length += self.lengths[row]
+            self.retrieval_counts[row] = retrieval_count or 0
+            self.creation_times[row] = creation_time if creation_time is not None else time.time()
+            self.response_lengths[row] = response_length or 0
+
+            for term, tf in tokens.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = [[], [], None]
+                    self.vocabulary.append(term)
+                    self.vocabulary_sorted = False
+                posting[0].append(row)
+                posting[1].append(tf)
+                posting[2] = None
+
+    def remove(self, uuid):
+        with self.lock:
+            row = self.rows.pop(uuid, None)
+            if row is None:
+                return
+            self.alive[row] = False
+            self.total_length -= self.lengths[row]
+            self.live -= 1
+
+    def increment_retrieval_count(self, uuid, amount=1):
+        with self.lock:
+            row = self.rows.get(uuid)
+            if row is not None:
+                self.retrieval_counts[row] += amount
+
+    def set_retrieval_count(self, uuid, count):
+        with self.lock:
+            row = self.rows.get(uuid)
+            if row is not None:
+                self.retrieval_counts[row] = count
+
+    def _posting_arrays(self, term):
+        posting = self.postings[term]
+        if posting[2] is None:
+            posting[2] = (np.array(posting[0], dtype=np.int64), np.array(posting[1], dtype=np.float32))
+        return posting[2]
+
+    def _expand_prefix(self, prefix):
+        if not self.vocabulary_sorted:
+            self.vocabulary.sort()
+            self.vocabulary_sorted = True
+        start = bisect_left(self.vocabulary, prefix)
+        terms = []
+        for term in self.vocabulary[start:]:
+            if not term.startswith(prefix) or len(terms) >= PREFIX_EXPANSIONS:
+                break
+            terms.append(term)
+        return terms
+
+    def _idf(self, term):
+        rows, _ = self._posting_arrays(term)
+        document_frequency = int(self.alive[rows].sum())
+        return math.log(1 + (self.live - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def coverage(self, query, ids):
+        # Share of each document's terms, weighted by IDF, that the query matches (the last query token
+        # as a prefix): 1.0 when the prompt holds nothing beyond the query, 0 for ids that aren't indexed
+        tokens = tokenize(query)
+        with self.lock:
+            result = {}
+            for uuid in ids:
+                row = self.rows.get(uuid)
+                weights = {term: self._idf(term) for term in tokenize(self.prompts[row])} if row is not None else {}
+                total = sum(weights.values())
+                matched = sum(weight for term, weight in weights.items()
+                              if term in tokens[:-1] or (tokens and term.startswith(tokens[-1])))
+                result[uuid] = matched / total if total else 0.0
+            return result
+
+    def _scores(self, query):
+        # lexical_score of every row, or None when no query term is indexed
+        tokens = tokenize(query)
+        if not tokens or not self.live:
+            return None
+
+        # One group of index terms per query token, the last token also matches as a prefix
+        groups = [[token] if token in self.postings else [] for token in tokens]
+        groups[-1] = sorted(set(groups[-1]) | set(self._expand_prefix(tokens[-1])))
+
+        average_length = self.total_length / self.live
+        scores = np.zeros(self.size, dtype=np.float32)
+        idf_total = 0.0
+        for token, group in zip(tokens, groups):
+            if not group:
+                # Unknown tokens still count towards the ideal score, with the IDF of an unseen term
+                idf_total += math.log(1 + (self.live + 0.5) / 0.5)
+                continue
+            best = np.zeros(self.size, dtype=np.float32)
+            idfs = {}
+            for term in group:
+                rows, tfs = self._posting_arrays(term)
+                idf = idfs[term] = self._idf(term)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[rows] / average_length)
+                # A row appears once per term, so plain fancy indexing is safe here
+                best[rows] = np.maximum(best[rows], idf * tfs * (BM25_K1 + 1) / (tfs + norm))
+            scores += best
+            # A partial last token is fully matched by its most common completion
+            idf_total += idfs[token] if token in idfs else min(idfs.values())
+
+        if not scores.any():
+            return None
+        scores[~self.alive[:self.size]] = 0
+        return np.clip(scores / idf_total, 0, 1)
+
+    def search(self, query, limit=20):
+        # Candidates in the same shape as the vector search, with distance = 1 - lexical_score
+        with self.lock:
+            scores = self._scores(query)
+            if scores is None:
+                return []
+            matched = np.flatnonzero(scores > 0)
+            k = min(limit, len(matched))
+            if k == 0:
+                return []
+            top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {
+                    "id": self.ids[row],
+                    "prompt": self.prompts[row],
+                    "response_length": int(self.response_lengths[row]),
+                    "distance": 1 - float(scores[row]),
+                    "lexical_score": float(scores[row]),
+                    "creation_time": float(self.creation_times[row]),
+                    "retrieval_count": int(self.retrieval_counts[row])
+                }
+                for row in top
+            ]
+
+    def scores(self, query, ids):
+        # lexical_score for the given object ids, 0 for ids that aren't indexed
+        with self.lock:
+            scores = self._scores(query)
+            rows = [self.rows.get(uuid) for uuid in ids]
+            return {uuid: float(scores[row]) if scores is not None and row is not None else 0.0
+                    for uuid, row in zip(ids, rows)}
+
+    def reconcile(self, client, class_name, page_size=500):
+        # Rebuild from a cursor scan of the class, which also drops removed rows
+        fresh = LexicalIndex()
+        after = None
+        while True:
+            query = client.query.get(class_name, ["prompt", "retrievalCount", "responseLength"]) \
+                .with_additional(["id", "creationTimeUnix"]) \
+                .with_limit(page_size)
+            if after is not None:
+                query = query.with_after(after)
+            items = query.do()['data']['Get'][class_name]
+            if not items:
+                break
+            for item in items:
+                fresh.add(item["_additional"]["id"], item["prompt"], item["responseLength"], item["retrievalCount"],
+                          int(item["_additional"]["creationTimeUnix"]) / 1000)
+            after = items[-1]["_additional"]["id"]
+        return self._swap(fresh)
+
+    def load_snapshot(self, path):
+        # Warm start from a snapshot.py export, only the text and counter columns are read
+        from snapshot import load_snapshot
+
+        table = load_snapshot(path).select(["id", "prompt", "responseLength", "retrievalCount", "creationTimeUnix"])
+        fresh = LexicalIndex()
+        for row in table.to_pylist():
+            fresh.add(row["id"], row["prompt"], row["responseLength"], row["retrievalCount"],
+                      row["creationTimeUnix"] / 1000)
+        return self._swap(fresh)
+
+    def _swap(self, fresh):
+        with self.lock:
+            self.__dict__.update({k: v for k, v in fresh.__dict__.items() if k != "lock"})
+            self.loaded = True
+        return self.live
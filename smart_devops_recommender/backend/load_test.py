@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import time
+import httpx
+from ranking import DEFAULT_WEIGHTS
+
+# Load test for the backend: fires a fixed number of requests at increasing concurrency
+# levels and prints requests/sec per level. With non-blocking handlers throughput should
+# grow with concurrency until an upstream limit is hit, instead of staying flat.
+#
+#   uvicorn routes:app --workers 1
+#   python load_test.py --endpoint recommender --concurrency 1,2,4,8,16,32
+
+PROMPTS = [
+    "How do you set up a CI/CD pipeline?",
+    "What is Infrastructure as Code (IaC)?",
+    "How do you monitor a Kubernetes cluster?",
+    "What is the purpose of Docker?",
+    "How do you handle secrets in DevOps?",
+    "How do you implement blue-green deployments?",
+    "What is the role of configuration management in DevOps?",
+    "How do you ensure high availability in a cloud environment?"
+]
+
+
+def build_payload(endpoint, i):
+    message = PROMPTS[i % len(PROMPTS)]
+    if endpoint == "chat":
+        return {"message": message}
+    return {"message": message, "top_n": 5, "weights": DEFAULT_WEIGHTS, "distance_filter": 0.5}
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def run_level(client, url, make_payload, concurrency, total_requests):
+    latencies = []
+    errors = 0
+    counter = iter(range(total_requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, json=make_payload(i))
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000
+    }
+
+
+async def main(args):
+    url = f"{args.base_url.rstrip('/')}/{args.endpoint}"
+    levels = [int(c) for c in args.concurrency.split(",")]
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+
+    make_payload = lambda i: build_payload(args.endpoint, i)
+
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        # Warm up connections and caches so the first level isn't penalised
+        await run_level(client, url, make_payload, 1, min(5, args.requests))
+
+        print(f"{'concurrency':>11} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        results = []
+        for concurrency in levels:
+            result = await run_level(client, url, make_payload, concurrency, args.requests)
+            results.append(result)
+            print(f"{result['concurrency']:>11} {result['requests']:>8} {result['errors']:>6} "
+                  f"{result['rps']:>8.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f}")
+
+    baseline = results[0]["rps"]
+    if baseline:
+        print(f"\nScaling from concurrency {levels[0]} to {levels[-1]}: {results[-1]['rps'] / baseline:.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure requests/sec of the backend at increasing concurrency")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", choices=["recommender", "chat"], default="recommender")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="Comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,373 @@
+import os
+import time
+import argparse
+import threading
+import numpy as np
+from vector_codec import VectorCodec, normalize, allocate
+
+# In-process replica of DevOpsPrompts_v2 for nearVector queries without the network hop.
+# Vectors live in one contiguous, L2-normalised float32 matrix so cosine distance
+# (Weaviate's default metric) is a single matrix-vector product. Optionally the matrix is
+# replaced by compact codes (see vector_codec.py) after each full load.
+
+# Above this many objects the index switches from exact search to IVF
+LOCAL_INDEX_APPROXIMATE_THRESHOLD = int(os.getenv('LOCAL_INDEX_APPROXIMATE_THRESHOLD', '50000'))
+
+# Number of IVF lists probed per query, higher is slower but closer to exact
+LOCAL_INDEX_N_PROBE = int(os.getenv('LOCAL_INDEX_N_PROBE', '8'))
+
+# Page size used when pulling the class out of Weaviate
+LOCAL_INDEX_PAGE_SIZE = int(os.getenv('LOCAL_INDEX_PAGE_SIZE', '500'))
+
+# Compact storage: code dtype (float32, float16 or int8) and an optional reduced dimension (0 keeps it)
+LOCAL_INDEX_DTYPE = os.getenv('LOCAL_INDEX_DTYPE', 'float32')
+LOCAL_INDEX_DIM = int(os.getenv('LOCAL_INDEX_DIM', '0'))
+LOCAL_INDEX_REDUCTION = os.getenv('LOCAL_INDEX_REDUCTION', 'pca')
+
+# Keep the float32 vectors next to compact codes and re-score a shortlist of limit * factor exactly.
+# With a path the float32 vectors are a memory-mapped file instead of heap memory.
+LOCAL_INDEX_RESCORE = os.getenv('LOCAL_INDEX_RESCORE', 'false').lower() == 'true'
+LOCAL_INDEX_RESCORE_FACTOR = int(os.getenv('LOCAL_INDEX_RESCORE_FACTOR', '4'))
+LOCAL_INDEX_RESCORE_PATH = os.getenv('LOCAL_INDEX_RESCORE_PATH', '')
+
+
+def kmeans(vectors, k, iterations=10, seed=0):
+    # Spherical k-means on normalised vectors, used to train the IVF coarse quantizer
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=k)
+        # Keep the old centroid for empty lists
+        centroids = np.where(counts[:, None] > 0, sums, centroids)
+        centroids = normalize(centroids)
+    return centroids
+
+
+def assign(vectors, centroids, chunk_size=65536):
+    # Nearest centroid per vector, chunked to bound the n x k similarity matrix
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        assignments[start:start + chunk_size] = np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+    return assignments
+
+
+class LocalVectorIndex:
+    def __init__(self, dim=1536, approximate_threshold=LOCAL_INDEX_APPROXIMATE_THRESHOLD, n_probe=LOCAL_INDEX_N_PROBE,
+                 dtype=LOCAL_INDEX_DTYPE, reduced_dim=LOCAL_INDEX_DIM, reduction=LOCAL_INDEX_REDUCTION,
+                 rescore=LOCAL_INDEX_RESCORE, rescore_factor=LOCAL_INDEX_RESCORE_FACTOR,
+                 rescore_path=LOCAL_INDEX_RESCORE_PATH):
+        self.dim = dim
+        self.approximate_threshold = approximate_threshold
+        self.n_probe = n_probe
+        self.options = {"dtype": dtype, "reduced_dim": reduced_dim, "reduction": reduction, "rescore": rescore,
+                        "rescore_factor": rescore_factor, "rescore_path": rescore_path}
+        self.lock = threading.RLock()
+        self.loaded = False
+        self._reset(capacity=1024)
+
+    def _reset(self, capacity):
+        self.size = 0
+        # Full-precision vectors, None once compacted without re-scoring
+        self.vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        # Compact codes and their codec, set by compact()
+        self.codes = None
+        self.codec = None
+        self.retrieval_counts = np.zeros(capacity, dtype=np.int64)
+        self.creation_times = np.zeros(capacity, dtype=np.float64)
+        self.ids = []
+        self.prompts = []
+        self.responses = []
+        self.rows = {}
+        self.centroids = None
+        self.assignments = np.zeros(capacity, dtype=np.int32)
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, needed):
+        capacity = len(self.retrieval_counts)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        if self.vectors is not None:
+            vectors = allocate((capacity, self.dim), np.float32,
+                               self.options["rescore_path"] if self.codes is not None else None)
+            vectors[:self.size] = self.vectors[:self.size]
+            self.vectors = vectors
+        if self.codes is not None:
+            self.codes = np.resize(self.codes, (capacity, self.codes.shape[1]))
+        self.retrieval_counts = np.resize(self.retrieval_counts, capacity)
+        self.creation_times = np.resize(self.creation_times, capacity)
+        self.assignments = np.resize(self.assignments, capacity)
+
+    def add(self, uuid, vector, prompt, response, retrieval_count=None, creation_time=None):
+        # Insert or update; an existing row keeps its counter and creation time unless new ones are given
+        vector = normalize(vector)
+        with self.lock:
+            if self.size == 0 and len(vector) != self.dim:
+                # Take the dimension from the first vector, e.g. a non-ada embedding model
+                self.dim = len(vector)
+                self._reset(capacity=len(self.retrieval_counts))
+            row = self.rows.get(uuid)
+            if row is None:
+                row = self.size
+                self._grow(row + 1)
+                self.ids.append(uuid)
+                self.prompts.append(prompt)
+                self.responses.append(response)
+                self.rows[uuid] = row
+                self.size += 1
+                self.retrieval_counts[row] = 0
+                self.creation_times[row] = time.time()
+            else:
+                self.prompts[row] = prompt
+                self.responses[row] = response
+            if self.vectors is not None:
+                self.vectors[row] = vector
+            if self.codes is not None:
+                self.codes[row] = self.codec.encode(vector[None])[0]
+            if retrieval_count is not None:
+                self.retrieval_counts[row] = retrieval_count
+            if creation_time is not None:
+                self.creation_times[row] = creation_time
+            if self.centroids is not None:
+                self.assignments[row] = np.argmax(self.centroids @ vector)
+
+    def add_many(self, ids, vectors, prompts, responses, retrieval_counts, creation_times):
+        # Bulk load into an empty index, one vectorised copy instead of a row at a time
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self.lock:
+            if self.size:
+                raise ValueError("add_many only loads an empty index")
+            if len(vectors):
+                self.dim = vectors.shape[1]
+            n = len(ids)
+            self._reset(capacity=max(n, 1024))
+            for start in range(0, n, 65536):
+                end = min(start + 65536, n)
+                self.vectors[start:end] = normalize(vectors[start:end])
+            self.retrieval_counts[:n] = retrieval_counts
+            self.creation_times[:n] = creation_times
+            self.ids = list(ids)
+            self.prompts = list(prompts)
+            self.responses = list(responses)
+            self.rows = {uuid: row for row, uuid in enumerate(self.ids)}
+            self.size = n
+
+    def remove(self, uuid):
+        with self.lock:
+            row = self.rows.pop(uuid, None)
+            if row is None:
+                return
+            # Move the last row into the hole so the matrix stays contiguous
+            last = self.size - 1
+            if row != last:
+                if self.vectors is not None:
+                    self.vectors[row] = self.vectors[last]
+                if self.codes is not None:
+                    self.codes[row] = self.codes[last]
+                self.retrieval_counts[row] = self.retrieval_counts[last]
+                self.creation_times[row] = self.creation_times[last]
+                self.assignments[row] = self.assignments[last]
+                self.ids[row] = self.ids[last]
+                self.prompts[row] = self.prompts[last]
+                self.responses[row] = self.responses[last]
+                self.rows[self.ids[row]] = row
+            self.ids.pop()
+            self.prompts.pop()
+            self.responses.pop()
+            self.size -= 1
+
+    def increment_retrieval_count(self, uuid, amount=1):
+        with self.lock:
+            row = self.rows.get(uuid)
+            if row is not None:
+                self.retrieval_counts[row] += amount
+
+    def set_retrieval_count(self, uuid, count):
+        with self.lock:
+            row = self.rows.get(uuid)
+            if row is not None:
+                self.retrieval_counts[row] = count
+
+    def build_ivf(self, n_lists=None, sample_size=50000):
+        with self.lock:
+            if self.size < self.approximate_threshold or self.vectors is None:
+                self.centroids = None
+                return
+            vectors = self.vectors[:self.size]
+            n_lists = n_lists or int(np.sqrt(self.size))
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(self.size, min(sample_size, self.size), replace=False)]
+            self.centroids = kmeans(sample, n_lists)
+            self.assignments[:self.size] = assign(vectors, self.centroids)
+
+    def compact(self, sample_size=50000):
+        # Fit the codec on the loaded vectors and score against compact codes from now on
+        codec = VectorCodec(self.options["dtype"], self.options["reduced_dim"], self.options["reduction"])
+        with self.lock:
+            if codec.is_identity or self.size < max(codec.dim, 1):
+                return
+            vectors = self.vectors[:self.size]
+            rng = np.random.default_rng(0)
+            codec.fit(vectors[rng.choice(self.size, min(sample_size, self.size), replace=False)])
+            self.codes = np.zeros((len(self.retrieval_counts), codec.code_dim), dtype=codec.dtype)
+            self.codes[:self.size] = codec.encode(vectors)
+            self.codec = codec
+            if not self.options["rescore"]:
+                self.vectors = None
+            elif self.options["rescore_path"]:
+                self.vectors = allocate(self.vectors.shape, np.float32, self.options["rescore_path"])
+                self.vectors[:self.size] = vectors
+
+    def similarities(self, rows, query):
+        # Cosine similarity of the query to the given rows (None for all), approximate when compacted
+        if self.codes is None:
+            return (self.vectors[:self.size] if rows is None else self.vectors[rows]) @ query
+        codes = self.codes[:self.size] if rows is None else self.codes[rows]
+        return self.codec.similarities(codes, self.codec.project(query))
+
+    def search(self, query_vector, limit=20, max_distance=None):
+        query = normalize(query_vector)
+        with self.lock:
+            if self.size == 0:
+                return []
+
+            if self.centroids is not None:
+                # IVF: only score rows whose list is among the n_probe closest centroids
+                probe = np.argpartition(-(self.centroids @ query), min(self.n_probe, len(self.centroids) - 1))
+                probe = probe[:self.n_probe]
+                rows = np.flatnonzero(np.isin(self.assignments[:self.size], probe))
+            else:
+                rows = None
+            distances = 1 - self.similarities(rows, query)
+
+            # Compact codes with float32 vectors kept: take a larger shortlist and re-score it exactly
+            rescore = self.codes is not None and self.vectors is not None
+            if max_distance is not None and not rescore:
+                keep = np.flatnonzero(distances <= max_distance)
+                distances = distances[keep]
+                rows = keep if rows is None else rows[keep]
+
+            k = min(limit * self.options["rescore_factor"] if rescore else limit, len(distances))
+            if k == 0:
+                return []
+            top = np.argpartition(distances, k - 1)[:k]
+            top_rows = top if rows is None else rows[top]
+            top_distances = distances[top]
+
+            if rescore:
+                top_distances = 1 - self.vectors[top_rows] @ query
+                if max_distance is not None:
+                    keep = top_distances <= max_distance
+                    top_rows, top_distances = top_rows[keep], top_distances[keep]
+
+            order = np.argsort(top_distances)[:limit]
+            return [
+                {
+                    "id": self.ids[row],
+                    "prompt": self.prompts[row],
+                    "response": self.responses[row],
+                    "distance": float(top_distances[i]),
+                    "creation_time": float(self.creation_times[row]),
+                    "retrieval_count": int(self.retrieval_counts[row])
+                }
+                for i, row in zip(order, top_rows[order])
+            ]
+
+    def reconcile(self, client, class_name, page_size=LOCAL_INDEX_PAGE_SIZE):
+        # Pull the whole class with a cursor and swap it in, picking up writes from other processes
+        fresh = LocalVectorIndex(self.dim, self.approximate_threshold, self.n_probe, **self.options)
+        after = None
+        while True:
+            query = client.query.get(class_name, ["prompt", "response", "retrievalCount"]) \
+                .with_additional(["id", "vector", "creationTimeUnix"]) \
+                .with_limit(page_size)
+            if after is not None:
+                query = query.with_after(after)
+            items = query.do()['data']['Get'][class_name]
+            if not items:
+                break
+            for item in items:
+                fresh.add(
+                    item["_additional"]["id"],
+                    item["_additional"]["vector"],
+                    item["prompt"],
+                    item["response"],
+                    item["retrievalCount"],
+                    int(item["_additional"]["creationTimeUnix"]) / 1000
+                )
+            after = items[-1]["_additional"]["id"]
+        return self._swap(fresh)
+
+    def load_snapshot(self, path):
+        # Warm start from a snapshot.py export instead of paging through Weaviate
+        from snapshot import load_snapshot, snapshot_columns
+
+        columns = snapshot_columns(load_snapshot(path))
+        fresh = LocalVectorIndex(self.dim, self.approximate_threshold, self.n_probe, **self.options)
+        fresh.add_many(columns["ids"], columns["vectors"], columns["prompts"], columns["responses"],
+                       columns["retrieval_counts"], columns["creation_times"])
+        return self._swap(fresh)
+
+    def _swap(self, fresh):
+        fresh.build_ivf()
+        fresh.compact()
+        with self.lock:
+            self.__dict__.update({k: v for k, v in fresh.__dict__.items() if k != "lock"})
+            self.loaded = True
+        return self.size
+
+
+def recall_vs_weaviate(index, client, class_name, query_vectors, k=10):
+    # Fraction of Weaviate's top-k ids that the local index also returns
+    recalls = []
+    for vector in query_vectors:
+        result = client.query.get(class_name, ["prompt"]) \
+            .with_near_vector({"vector": list(map(float, vector))}) \
+            .with_additional(["id"]) \
+            .with_limit(k) \
+            .do()
+        expected = {item["_additional"]["id"] for item in result['data']['Get'][class_name]}
+        if not expected:
+            continue
+        found = {item["id"] for item in index.search(vector, k)}
+        recalls.append(len(expected & found) / len(expected))
+    return float(np.mean(recalls)) if recalls else 0.0
+
+
+def main():
+    from client_setup import WEAVIATE_URL, create_weaviate_client
+
+    parser = argparse.ArgumentParser(description="Check local index recall against Weaviate")
+    parser.add_argument("--weaviate-url", default=WEAVIATE_URL)
+    parser.add_argument("--class-name", default="DevOpsPrompts_v2")
+    parser.add_argument("--queries", type=int, default=100, help="Number of query vectors to sample")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--approximate", action="store_true", help="Force IVF regardless of corpus size")
+    args = parser.parse_args()
+
+    client = create_weaviate_client(args.weaviate_url)
+    index = LocalVectorIndex(approximate_threshold=0 if args.approximate else LOCAL_INDEX_APPROXIMATE_THRESHOLD)
+    start = time.perf_counter()
+    index.reconcile(client, args.class_name)
+    print(f"Loaded {len(index)} objects in {time.perf_counter() - start:.1f}s "
+          f"({'IVF' if index.centroids is not None else 'exact'}, "
+          f"{f'{index.codec.bytes_per_vector} byte codes' if index.codec is not None else 'float32'})")
+
+    # Use stored vectors with a little noise as queries so they resemble real near matches
+    # (read from Weaviate, a compacted index may not keep its float32 vectors)
+    result = client.query.get(args.class_name, ["prompt"]).with_additional(["vector"]).with_limit(args.queries).do()
+    stored = np.array([item["_additional"]["vector"] for item in result['data']['Get'][args.class_name]],
+                      dtype=np.float32)
+    rng = np.random.default_rng(0)
+    queries = normalize(stored + rng.normal(0, 0.01, stored.shape).astype(np.float32))
+    print(f"recall@{args.k} vs Weaviate: {recall_vs_weaviate(index, client, args.class_name, queries, args.k):.3f}")
+
+
+if __name__ == '__main__':
+    main()
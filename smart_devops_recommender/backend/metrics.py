@@ -0,0 +1,268 @@
+import os
+import re
+import sys
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from collections import deque, Counter as TallyCounter
+from contextlib import contextmanager
+
+# Hot-path instrumentation: Prometheus-format counters/histograms, per-request stage timings
+# for the Server-Timing header, and an opt-in sampling profiler for slow requests.
+
+# Dump flame data for requests slower than this (0 disables the profiler)
+PROFILE_SLOW_REQUEST_MS = float(os.getenv('PROFILE_SLOW_REQUEST_MS', '0'))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '5'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = TallyCounter()
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self.lock:
+            self.values[key] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self.lock:
+            self.values[key] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, series in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series["counts"]):
+                    cumulative += count
+                    labels = format_labels(self.labels + ("le",), key + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, key)} {series['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_seconds = registry.register(
+    Histogram("backend_request_seconds", "End-to-end request latency", ("endpoint",)))
+requests_total = registry.register(
+    Counter("backend_requests_total", "Requests handled", ("endpoint", "status")))
+stage_seconds = registry.register(
+    Histogram("backend_stage_seconds", "Latency of each stage of a request", ("endpoint", "stage")))
+
+# Stage timings of the current request, read by the middleware for the Server-Timing header
+current_timings = contextvars.ContextVar("current_timings", default=None)
+current_endpoint = contextvars.ContextVar("current_endpoint", default="")
+
+
+@contextmanager
+def stage(name):
+    # Time one stage of the current request, e.g. `with stage("embedding"): ...`
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, endpoint=current_endpoint.get(), stage=name)
+        timings = current_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def server_timing_header(timings, total):
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class SamplingProfiler:
+    """Samples every thread's stack while requests are in flight and keeps a short history."""
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL_MS / 1000, history_seconds=60):
+        self.interval = interval
+        self.samples = deque(maxlen=int(history_seconds / interval))
+        self.active = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def start_request(self):
+        with self.lock:
+            self.active += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="sampling-profiler", daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def end_request(self):
+        with self.lock:
+            self.active -= 1
+
+    def run(self):
+        own_id = threading.get_ident()
+        while True:
+            if not self.active:
+                self.wake.clear()
+                # Re-check after clearing so a request that started in between isn't missed
+                if not self.active:
+                    self.wake.wait()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            now = time.perf_counter()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples.append((now, ";".join(reversed(stack))))
+            time.sleep(self.interval)
+
+    def dump(self, start, end, endpoint, elapsed):
+        # Folded stacks (flamegraph.pl / speedscope format) for the samples taken during the request
+        folded = TallyCounter(stack for timestamp, stack in list(self.samples) if start <= timestamp <= end)
+        if not folded:
+            return None
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9]+", "_", endpoint).strip("_") or "root"
+        filename = os.path.join(PROFILE_DIR, f"{int(time.time() * 1000)}-{name}-{elapsed * 1000:.0f}ms.folded")
+        with open(filename, "w") as f:
+            for stack, count in folded.most_common():
+                f.write(f"{stack} {count}\n")
+        return filename
+
+
+profiler = SamplingProfiler() if PROFILE_SLOW_REQUEST_MS > 0 else None
+
+
+def route_template(app, scope):
+    # Label requests by route template ("/recommender/response/{object_id}"), not by path, so ids in
+    # paths don't create a metric series (and profile file name) per object
+    from starlette.routing import Match
+
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+async def timed_body(body, finish):
+    # Ends the request timer once the last chunk is sent (or the client goes away) rather than when the
+    # headers are, so /chat/stream and /recommender/batch are timed for the whole stream
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        finish()
+
+
+def instrument(app):
+    @app.middleware("http")
+    async def timing_middleware(request, call_next):
+        endpoint = route_template(app, request.scope)
+        if endpoint == "/metrics":
+            return await call_next(request)
+
+        timings = {}
+        timings_token = current_timings.set(timings)
+        endpoint_token = current_endpoint.set(endpoint)
+        if profiler is not None:
+            profiler.start_request()
+        start = time.perf_counter()
+        status = 500
+
+        def finish():
+            elapsed = time.perf_counter() - start
+            request_seconds.observe(elapsed, endpoint=endpoint)
+            requests_total.inc(endpoint=endpoint, status=status)
+            if profiler is not None:
+                profiler.end_request()
+                if elapsed * 1000 >= PROFILE_SLOW_REQUEST_MS:
+                    profiler.dump(start, start + elapsed, endpoint, elapsed)
+
+        try:
+            response = await call_next(request)
+        except BaseException:
+            finish()
+            raise
+        finally:
+            current_timings.reset(timings_token)
+            current_endpoint.reset(endpoint_token)
+
+        status = response.status_code
+        # Sent with the headers, so for streaming responses this total is the time to first byte
+        response.headers["Server-Timing"] = server_timing_header(timings, time.perf_counter() - start)
+        if hasattr(response, "body_iterator"):
+            response.body_iterator = timed_body(response.body_iterator, finish)
+        else:
+            finish()
+        return response
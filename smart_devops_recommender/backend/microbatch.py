@@ -0,0 +1,70 @@
+import time
+import asyncio
+from metrics import registry, Histogram
+
+batch_size_histogram = registry.register(
+    Histogram("backend_microbatch_size", "Inputs per dispatched micro-batch", ("batcher",),
+              buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512)))
+queue_wait_seconds = registry.register(
+    Histogram("backend_microbatch_queue_wait_seconds", "Time an input waited for its micro-batch to be sent",
+              ("batcher",)))
+
+
+class MicroBatcher:
+    """Collects concurrent single-input calls and sends them as one multi-input call."""
+
+    def __init__(self, name, func, window, max_batch_size):
+        # func takes a list of distinct inputs and returns one result per input, in order
+        self.name = name
+        self.func = func
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.pending = {}  # input -> [(future, enqueued at), ...], so repeats within a batch are sent once
+        self.timer = None
+        self.tasks = set()
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.setdefault(item, []).append((future, time.perf_counter()))
+        if len(self.pending) >= self.max_batch_size:
+            self.dispatch()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self.dispatch)
+        return await future
+
+    def dispatch(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        # Inputs whose callers have all gone away (e.g. a superseded typeahead prefix) aren't sent
+        batch = {item: waiters for item, waiters in self.pending.items()
+                 if any(not future.done() for future, _ in waiters)}
+        self.pending = {}
+        if batch:
+            task = asyncio.create_task(self.send(batch))
+            # Keep a reference until it finishes, the loop only holds a weak one
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def send(self, batch):
+        now = time.perf_counter()
+        batch_size_histogram.observe(len(batch), batcher=self.name)
+        for waiters in batch.values():
+            for _, enqueued in waiters:
+                queue_wait_seconds.observe(now - enqueued, batcher=self.name)
+
+        items = list(batch)
+        try:
+            results = await self.func(items)
+        except Exception as e:
+            for waiters in batch.values():
+                for future, _ in waiters:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for item, result in zip(items, results):
+            for future, _ in batch[item]:
+                if not future.done():
+                    future.set_result(result)
@@ -0,0 +1,194 @@
+import os
+import json
+import argparse
+from collections import defaultdict
+from client_setup import WEAVIATE_URL, create_weaviate_client
+from schema import CLASS_NAME, ensure_schema, object_uuid
+from ingest import batched, check_batch_results
+
+# One-off migration to deterministic object ids (see schema.object_uuid). Objects are grouped by
+# their normalized prompt and every group is collapsed into one object stored under the group's id:
+# the most retrieved answer is kept, retrievalCount is the sum over the group, and the other copies
+# are deleted. Groups are rewritten in bounded chunks so memory stays flat apart from the id scan.
+#
+#   python migrate_object_ids.py --dry-run
+#   python migrate_object_ids.py
+#
+# Writes happen before deletes, and a group's stale copies are only deleted once its object is read
+# back with the summed count, so an interrupted or failed run loses nothing. Each chunk's planned
+# counts and stale ids are checkpointed before its writes; a re-run first deletes the stale copies of
+# every group whose object already holds the summed count, so their retrievals aren't counted twice.
+
+PAGE_SIZE = 500
+CHUNK_SIZE = 100
+
+
+def scan(client, class_name, page_size=PAGE_SIZE):
+    # Cursor over the whole class, without vectors or response text
+    after = None
+    while True:
+        query = client.query.get(class_name, ["prompt", "retrievalCount", "lastRetrievedUnix"]) \
+            .with_additional(["id", "creationTimeUnix"]) \
+            .with_limit(page_size)
+        if after is not None:
+            query = query.with_after(after)
+        items = query.do()['data']['Get'][class_name]
+        if not items:
+            return
+        yield from items
+        after = items[-1]["_additional"]["id"]
+
+
+def plan_groups(items):
+    groups = defaultdict(list)
+    for item in items:
+        groups[object_uuid(item["prompt"])].append(item)
+    # A single object already stored under its own id needs nothing
+    return {
+        uuid: members for uuid, members in groups.items()
+        if len(members) > 1 or members[0]["_additional"]["id"] != uuid
+    }
+
+
+def pick_answer(members):
+    # Keep the most retrieved answer, the newest one on ties
+    return max(members, key=lambda m: (m["retrievalCount"] or 0, int(m["_additional"]["creationTimeUnix"])))
+
+
+def fetch_objects(client, class_name, ids):
+    result = client.query.get(class_name, ["prompt", "response"]) \
+        .with_where({"path": ["id"], "operator": "ContainsAny", "valueTextArray": ids}) \
+        .with_additional(["id", "vector"]) \
+        .with_limit(len(ids)) \
+        .do()
+    return {item["_additional"]["id"]: item for item in result['data']['Get'][class_name] or []}
+
+
+def save_checkpoint(checkpoint_path, groups):
+    if not checkpoint_path:
+        return
+    # Write to a temp file and rename so a crash mid-write can't corrupt the checkpoint
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"groups": groups}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def clear_checkpoint(checkpoint_path):
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+
+def delete_objects(client, class_name, ids):
+    if ids:
+        client.batch.delete_objects(class_name, where={"path": ["id"], "operator": "ContainsAny",
+                                                       "valueTextArray": ids})
+
+
+def landed(client, class_name, groups):
+    # Stale ids of the groups whose object holds at least the planned count, i.e. whose write landed.
+    # The batch importer only reports per-object errors to its callback, so this reads them back.
+    result = client.query.get(class_name, ["retrievalCount"]) \
+        .with_where({"path": ["id"], "operator": "ContainsAny", "valueTextArray": list(groups)}) \
+        .with_additional(["id"]) \
+        .with_limit(len(groups)) \
+        .do()
+    counts = {item["_additional"]["id"]: item["retrievalCount"] or 0
+              for item in result['data']['Get'][class_name] or []}
+    return [stale_id for uuid, group in groups.items()
+            if uuid in counts and counts[uuid] >= group["count"] for stale_id in group["stale"]]
+
+
+def recover(client, class_name, checkpoint_path):
+    # Finish the chunk an earlier run was interrupted in: groups that were written only still need
+    # their stale copies deleted. Groups that weren't are left to the scan, which sums them as usual.
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return 0
+    with open(checkpoint_path) as f:
+        groups = json.load(f)["groups"]
+    stale = landed(client, class_name, groups)
+    delete_objects(client, class_name, stale)
+    clear_checkpoint(checkpoint_path)
+    return len(stale)
+
+
+def migrate_chunk(client, class_name, chunk, checkpoint=None):
+    keep = {uuid: pick_answer(members) for uuid, members in chunk}
+    counts = {uuid: sum(m["retrievalCount"] or 0 for m in members) for uuid, members in chunk}
+    # Latest retrieval in the group, so compaction doesn't take a merged object for never retrieved
+    retrieved = {uuid: max((m["lastRetrievedUnix"] for m in members if m.get("lastRetrievedUnix") is not None),
+                           default=None) for uuid, members in chunk}
+    objects = fetch_objects(client, class_name, [item["_additional"]["id"] for item in keep.values()])
+    groups = {uuid: {"count": counts[uuid],
+                     "stale": [m["_additional"]["id"] for m in members if m["_additional"]["id"] != uuid]}
+              for uuid, members in chunk}
+    save_checkpoint(checkpoint, groups)
+
+    with client.batch as batch:
+        for uuid, members in chunk:
+            obj = objects.get(keep[uuid]["_additional"]["id"])
+            if obj is None:
+                # Deleted since the scan
+                continue
+            data_object = {
+                "prompt": obj["prompt"],
+                "response": obj["response"],
+                "retrievalCount": counts[uuid],
+                "responseLength": len(obj["response"] or "")
+            }
+            if retrieved[uuid] is not None:
+                data_object["lastRetrievedUnix"] = retrieved[uuid]
+            batch.add_data_object(
+                data_object=data_object,
+                class_name=class_name,
+                uuid=uuid,
+                vector=obj["_additional"]["vector"]
+            )
+
+    # A group whose write was rejected keeps its copies, the next run merges them again
+    stale = landed(client, class_name, groups)
+    skipped = sum(len(group["stale"]) for group in groups.values()) - len(stale)
+    if skipped:
+        print(f"Kept {skipped} objects whose merged copy wasn't written, re-run to retry")
+    delete_objects(client, class_name, stale)
+    clear_checkpoint(checkpoint)
+    return len(stale)
+
+
+def migrate(client, class_name, chunk_size=CHUNK_SIZE, checkpoint=None, dry_run=False):
+    if not dry_run:
+        recovered = recover(client, class_name, checkpoint)
+        if recovered:
+            print(f"Deleted {recovered} superseded objects left by an interrupted run")
+    items = list(scan(client, class_name))
+    groups = plan_groups(items)
+    duplicates = sum(len(members) - 1 for members in groups.values())
+    print(f"{len(items)} objects, {len(groups)} groups to rewrite, {duplicates} duplicates to remove")
+    if dry_run:
+        return 0
+
+    client.batch.configure(batch_size=chunk_size, callback=check_batch_results)
+    deleted = 0
+    for chunk in batched(iter(groups.items()), chunk_size):
+        deleted += migrate_chunk(client, class_name, chunk, checkpoint)
+        print(f"Deleted {deleted} superseded objects")
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collapse duplicate prompts into deterministic object ids")
+    parser.add_argument("--weaviate-url", default=WEAVIATE_URL)
+    parser.add_argument("--class-name", default=CLASS_NAME)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Groups rewritten per batch")
+    parser.add_argument("--checkpoint", default="migrate_object_ids.checkpoint",
+                        help="Chunk in flight, finished first when a run was interrupted")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args()
+
+    client = create_weaviate_client(args.weaviate_url)
+    ensure_schema(client)  # lastRetrievedUnix on stores created before it existed
+    migrate(client, args.class_name, args.chunk_size, args.checkpoint, args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,10 @@
-import os
-import weaviate
+from client_setup import create_weaviate_client, openai_api_key
 
 # Initialize the client with OpenAI module configuration
 # Initialize the client with OpenAI module configuration
-client = weaviate.Client(
-    "http://localhost:8080",  # Replace with your Weaviate instance URL
+client = create_weaviate_client(
     additional_headers={
-        "X-OpenAI-Api-Key": os.getenv('OPENAI_KEY')  # Replace with your actual OpenAI API key
+        "X-OpenAI-Api-Key": openai_api_key()  # Replace with your actual OpenAI API key
     }
 )
 # # Define the schema
@@ -0,0 +1,227 @@
+import numpy as np
+from datetime import datetime
+from datetime import timedelta
+
+# Weights used when a client doesn't tune them, the chat UI ships the same values
+DEFAULT_WEIGHTS = {
+    "distance": 15.9,
+    "time_elapsed_since_added": 2,
+    "length": 0.05,
+    "retrieval_count": 1
+}
+
+# Weight name -> the [0, 1] feature score column of score_frame it multiplies
+FEATURE_SCORES = {
+    "distance": "distance_score",
+    "time_elapsed_since_added": "time_elapsed_since_added_score",
+    "length": "length_score",
+    "retrieval_count": "retrieval_count_score",
+    "lexical": "lexical_score"
+}
+
+
+def format_number(num):
+    return round(num, 3)
+
+
+# def format_time_elapsed(seconds):
+#     if seconds >= 86400:
+#         return f"{seconds / 86400:.2f} days"
+#     elif seconds >= 3600:
+#         return f"{seconds / 3600:.2f} hours"
+#     elif seconds >= 60:
+#         return f"{seconds / 60:.2f} minutes"
+#     else:
+#         return f"{seconds:.2f} seconds"
+
+
+def format_time_elapsed(seconds):
+    delta = timedelta(seconds=seconds)
+    days = delta.days
+    hours, remainder = divmod(delta.seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{days} day {hours:02}:{minutes:02}:{seconds:02}"
+
+
+def score_frame(df, weights, current_time=None, by=None):
+    # Add the feature scores and the weighted score to a frame of candidates (distance, creation_time,
+    # response_length, retrieval_count). With `by`, features are normalised within each group, so
+    # many candidate sets can be scored in one pass.
+    import polars as pl
+
+    def group_max(column):
+        return pl.col(column).max().over(by) if by else pl.col(column).max()
+
+    def share_of_max(column):
+        # column / its maximum, 0 rather than 0/0 = NaN when every candidate has 0 (e.g. no retrievals yet)
+        maximum = group_max(column)
+        return pl.when(maximum > 0).then(pl.col(column) / maximum).otherwise(0.0)
+
+    # Calculate the current time for time_elapsed_since_added calculation
+    if current_time is None:
+        current_time = datetime.now().timestamp()
+
+    # Lexical match score from the BM25 index, already in [0, 1]; 0 when the index isn't in use
+    if "lexical_score" not in df.columns:
+        df = df.with_columns(pl.lit(0.0).alias("lexical_score"))
+
+    # Calculate the time elapsed since the document was added
+    df = df.with_columns([
+        (current_time - pl.col("creation_time").cast(pl.Float64)).alias("time_elapsed_seconds"),
+        pl.col("lexical_score").cast(pl.Float64).fill_null(0.0)
+    ])
+
+    # Add columns for length, distance_score, time_elapsed_since_added_score, length_score, and retrieval_count_score
+    df = df.with_columns([
+        (1 - pl.col("distance")).alias("distance_score"),
+        (1 - share_of_max("time_elapsed_seconds")).alias("time_elapsed_since_added_score"),
+        share_of_max("response_length").alias("length_score"),
+        share_of_max("retrieval_count").alias("retrieval_count_score")
+    ])
+
+    # Ensure all scores are between 0 and 1
+    df = df.with_columns([
+        pl.col("distance_score").clip(0, 1),
+        pl.col("time_elapsed_since_added_score").clip(0, 1),
+        pl.col("length_score").clip(0, 1),
+        pl.col("retrieval_count_score").clip(0, 1)
+    ])
+
+    # Calculate the weighted score
+    return df.with_columns(
+        (weights["distance"] * pl.col("distance_score") +
+         weights["time_elapsed_since_added"] * pl.col("time_elapsed_since_added_score") +
+         weights["length"] * pl.col("length_score") +
+         weights["retrieval_count"] * pl.col("retrieval_count_score") +
+         weights.get("lexical", 0) * pl.col("lexical_score")).alias("weighted_score")
+    )
+
+
+def rank_candidates(items, weights, top_n, current_time=None):
+    # Score candidate dicts (distance, creation_time, response_length, retrieval_count) and return the top N
+
+    # Polars is imported on first use to keep it out of the app's import time
+    import polars as pl
+
+    # Create a Polars DataFrame
+    df = score_frame(pl.DataFrame(items), weights, current_time)
+
+    # Sort items based on weighted score
+    df = df.unique(subset=['prompt', 'response_length']).sort("weighted_score", descending=True)
+
+    # Extract the top N responses
+    top_results = df.head(top_n).to_dicts()
+    add_contributions(top_results, weights)
+    return top_results
+
+
+class Rescorer:
+    """A candidate set scored once by score_frame that can be ranked again later without Polars.
+
+    Only the time feature depends on the clock, so the weighted sum of the other features is kept and
+    rank() recomputes time_elapsed_since_added_score for the new current time with NumPy.
+    """
+
+    def __init__(self, items, weights, current_time=None):
+        import polars as pl
+
+        df = score_frame(pl.DataFrame(items), weights, current_time).unique(subset=['prompt', 'response_length'])
+        self.weights = weights
+        self.rows = df.to_dicts()
+        self.creation_times = df["creation_time"].cast(pl.Float64).to_numpy()
+        self.static_scores = (df["weighted_score"] - weights["time_elapsed_since_added"] *
+                              df["time_elapsed_since_added_score"]).fill_null(np.nan).to_numpy()
+
+    def rank(self, top_n, current_time=None):
+        if current_time is None:
+            current_time = datetime.now().timestamp()
+        elapsed = current_time - self.creation_times
+        # As score_frame: 1 - elapsed / max elapsed, 1 for every candidate when the max is 0
+        longest = elapsed.max(initial=0)
+        time_scores = np.clip(1 - elapsed / longest, 0, 1) if longest > 0 else np.ones_like(elapsed)
+        weighted = self.static_scores + self.weights["time_elapsed_since_added"] * time_scores
+        # Descending, candidates without a score (NaN) last
+        order = np.argsort(-weighted, kind="stable")[:top_n]
+
+        top_results = [{**self.rows[i], "time_elapsed_seconds": float(elapsed[i]),
+                        "time_elapsed_since_added_score": float(time_scores[i]),
+                        "weighted_score": float(weighted[i])} for i in order]
+        add_contributions(top_results, self.weights)
+        return top_results
+
+
+def rank_candidate_sets(candidate_sets, weights, top_n, current_time=None):
+    # rank_candidates for many queries at once: one frame with a query column, scored and cut per query
+    import polars as pl
+
+    results = [[] for _ in candidate_sets]
+    rows = [{**item, "query": i} for i, items in enumerate(candidate_sets) for item in items]
+    if not rows:
+        return results
+
+    df = score_frame(pl.DataFrame(rows, infer_schema_length=None), weights, current_time, by="query")
+    df = df.unique(subset=["query", "prompt", "response_length"]) \
+        .sort(["query", "weighted_score"], descending=[False, True]) \
+        .filter(pl.int_range(pl.len()).over("query") < top_n)
+
+    for result in df.to_dicts():
+        results[result.pop("query")].append(result)
+    for top_results in results:
+        add_contributions(top_results, weights)
+    return results
+
+
+def add_contributions(top_results, weights):
+    # Add contributions to the response
+    for result in top_results:
+        result["contributions"] = [
+            {
+                "feature": "distance",
+                "value": format_number(result["distance"]),
+                "score": format_number(result["distance_score"]),
+                "weight": format_number(weights["distance"]),
+                "contribution": format_number(result["distance_score"] * weights["distance"])
+            },
+            {
+                "feature": "time_elapsed_since_added",
+                "value": result["creation_time"],
+                "score": format_number(result["time_elapsed_since_added_score"]),
+                "weight": format_number(weights["time_elapsed_since_added"]),
+                "contribution": format_number(
+                    result["time_elapsed_since_added_score"] * weights["time_elapsed_since_added"])
+            },
+            {
+                "feature": "length",
+                "value": result["response_length"],
+                "score": format_number(result["length_score"]),
+                "weight": format_number(weights["length"]),
+                "contribution": format_number(result["length_score"] * weights["length"])
+            },
+            {
+                "feature": "retrieval_count",
+                "value": result["retrieval_count"],
+                "score": format_number(result["retrieval_count_score"]),
+                "weight": format_number(weights["retrieval_count"]),
+                "contribution": format_number(result["retrieval_count_score"] * weights["retrieval_count"])
+            }
+        ]
+        if "lexical" in weights:
+            result["contributions"].append({
+                "feature": "lexical",
+                "value": format_number(result["lexical_score"]),
+                "score": format_number(result["lexical_score"]),
+                "weight": format_number(weights["lexical"]),
+                "contribution": format_number(result["lexical_score"] * weights["lexical"])
+            })
+
+        # Calculate the time elapsed in a human-readable format
+        time_elapsed_seconds = result["time_elapsed_seconds"]
+        result["time_elapsed"] = format_time_elapsed(time_elapsed_seconds)
+
+
+def no_answer():
+    return {"prompt": "", "response": "I'm sorry, I don't have an answer for that.", "distance": None,
+            "distance_score": None, "time_elapsed_since_added_score": None, "length_score": None,
+            "retrieval_count": None,
+            "retrieval_count_score": None, "weighted_score": None, "creation_time": None,
+            "time_elapsed": None, "contributions": []}
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import argparse
+import itertools
+import threading
+import numpy as np
+from ranking import DEFAULT_WEIGHTS, FEATURE_SCORES, score_frame
+
+# Offline replay of logged /recommender candidate sets for tuning the ranking weights.
+#
+#   REPLAY_LOG_PATH=replay.jsonl uvicorn routes:app      # log candidate sets and selections
+#   python replay.py replay.jsonl --grid distance=5:25:9 time_elapsed_since_added=0:4:5 \
+#       length=0,0.05,0.1 retrieval_count=0:2:5 --top 10
+#
+# Each log line is either a candidate set, as ranked by the server:
+#   {"type": "candidates", "time": ..., "query": "...", "candidates": [{"id", "prompt", "distance",
+#    "creation_time", "response_length", "retrieval_count", "lexical_score", "relevance"?}, ...]}
+# or a selection of a suggestion, from GET /recommender/response/{id}?query=...:
+#   {"type": "selection", "time": ..., "query": "...", "id": "..."}
+# A candidate is relevant when it carries a "relevance" grade or was selected for the same query.
+#
+# Feature scores are computed once with ranking.score_frame, exactly as the server does, then every
+# weight combination is scored with one matrix product and ranked with array operations.
+
+REPLAY_LOG_PATH = os.getenv('REPLAY_LOG_PATH', '')
+
+# Weight combinations scored per matrix product, bounds the (relevant x candidates x combinations)
+# comparison array
+COMBINATION_CHUNK = 64
+
+
+class ReplayLog:
+    """Appends candidate sets and selections as JSON lines, in the format replay.py reads."""
+
+    def __init__(self, path=REPLAY_LOG_PATH):
+        self.path = path
+        self.file = None
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def write(self, entry):
+        line = json.dumps(entry) + "\n"
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, "a", encoding="utf-8")
+            self.file.write(line)
+
+    def record_candidates(self, query, items, current_time):
+        fields = ("id", "prompt", "distance", "creation_time", "response_length", "retrieval_count", "lexical_score")
+        self.write({"type": "candidates", "time": current_time, "query": query,
+                    "candidates": [{field: item.get(field) for field in fields} for item in items]})
+
+    def record_selection(self, query, object_id):
+        self.write({"type": "selection", "time": time.time(), "query": query, "id": object_id})
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def load_log(path):
+    # One row per (candidate set, candidate) with a relevance grade, candidate sets without any
+    # relevant candidate can't be scored and are dropped
+    import polars as pl
+
+    log = pl.read_ndjson(path, infer_schema_length=None)
+    if "candidates" not in log.columns:
+        return pl.DataFrame()
+    if "id" not in log.columns:
+        # No selections logged, only candidates with a "relevance" grade count
+        log = log.with_columns(pl.lit(None, pl.String).alias("id"))
+    selections = log.filter(pl.col("type") == "selection").select("query", "id") \
+        .unique().with_columns(pl.lit(1.0).alias("selected"))
+
+    df = log.filter(pl.col("type") == "candidates") \
+        .with_row_index("query_index") \
+        .select("query_index", "query", pl.col("time").alias("query_time"), "candidates") \
+        .explode("candidates") \
+        .unnest("candidates")
+    if "relevance" not in df.columns:
+        df = df.with_columns(pl.lit(None, pl.Float64).alias("relevance"))
+    df = df.join(selections, on=["query", "id"], how="left", maintain_order="left") \
+        .with_columns(
+            pl.coalesce(pl.col("relevance").cast(pl.Float64), pl.col("selected"), pl.lit(0.0)).alias("relevance"),
+            pl.col("prompt").fill_null(pl.col("id")),
+            pl.col("retrieval_count").fill_null(0)) \
+        .drop("query", "selected") \
+        .rename({"query_index": "query"})
+
+    # Same de-duplication the server applies before ranking
+    df = df.unique(subset=["query", "prompt", "response_length"], maintain_order=True)
+    return df.filter(pl.col("relevance").max().over("query") > 0)
+
+
+def feature_matrix(df):
+    # Feature scores per candidate through the server's scoring code, with every query scored at its
+    # own logged time: shifting creation_time by (query_time - reference) gives the same elapsed time
+    import polars as pl
+
+    reference = float(df["query_time"].max())
+    shifted = df.with_columns(pl.col("creation_time") - (pl.col("query_time") - reference))
+    scored = score_frame(shifted, {name: 0 for name in FEATURE_SCORES}, reference, by="query")
+    scored = scored.sort("query", maintain_order=True)
+    features = np.column_stack([scored[column].fill_null(0).fill_nan(0).to_numpy().astype(np.float32)
+                                for column in FEATURE_SCORES.values()])
+    return features, scored["query"].to_numpy(), scored["relevance"].to_numpy().astype(np.float32)
+
+
+def parse_grid(specs):
+    # "distance=5:25:9" is 9 evenly spaced values from 5 to 25, "length=0,0.05,0.1" an explicit list.
+    # Features without a spec keep their DEFAULT_WEIGHTS value (0 for lexical).
+    values = {name: [DEFAULT_WEIGHTS.get(name, 0.0)] for name in FEATURE_SCORES}
+    for spec in specs:
+        name, _, text = spec.partition("=")
+        if name not in FEATURE_SCORES:
+            raise ValueError(f"Unknown weight {name}, expected one of {list(FEATURE_SCORES)}")
+        if ":" in text:
+            start, stop, count = text.split(":")
+            values[name] = list(np.linspace(float(start), float(stop), int(count)))
+        else:
+            values[name] = [float(value) for value in text.split(",")]
+    return np.array(list(itertools.product(*values.values())), dtype=np.float32)
+
+
+def evaluate(features, queries, relevance, combinations, k=5):
+    # Ranking metrics of every weight combination (rows of `combinations`), one value per combination
+    starts = np.flatnonzero(np.r_[True, queries[1:] != queries[:-1]])
+    sizes = np.diff(np.r_[starts, len(queries)])
+    group = np.repeat(np.arange(len(starts)), sizes)
+
+    # For each relevant candidate, the indices of all candidates of its query, padded with its own
+    # index up to the largest candidate set. The candidate itself and the padding tie with it.
+    relevant = np.flatnonzero(relevance > 0)
+    relevant_group = group[relevant]
+    columns = np.arange(sizes.max())
+    others = starts[relevant_group, None] + columns
+    others = np.where(columns < sizes[relevant_group, None], others, relevant[:, None])
+    self_ties = (1 + len(columns) - sizes[relevant_group])[:, None]
+    # relevant is sorted by query, so per-query reductions are reduceat over these bounds
+    bounds = np.flatnonzero(np.r_[True, relevant_group[1:] != relevant_group[:-1]])
+
+    # Ideal DCG per query, from its relevance grades in descending order
+    order = np.lexsort((-relevance, group))
+    position = np.arange(len(order)) - starts[group[order]]
+    ideal_dcg = np.bincount(group[order], np.where(position < k, relevance[order] / np.log2(position + 2), 0))
+
+    metrics = {"ndcg": [], "mrr": [], "hit_rate": []}
+    for chunk_start in range(0, len(combinations), COMBINATION_CHUNK):
+        weights = combinations[chunk_start:chunk_start + COMBINATION_CHUNK]
+        scores = features @ weights.T  # candidates x combinations
+        # Rank of each relevant candidate: the candidates of its query that score higher, plus half of
+        # those that tie with it (its expected rank under random tie-breaking), so weights that score
+        # everything alike don't rank every relevant candidate first
+        compared = scores[others]
+        own = scores[relevant, None, :]
+        ranks = (compared > own).sum(axis=1) + ((compared == own).sum(axis=1) - self_ties) / 2
+
+        gains = np.where(ranks < k, relevance[relevant, None] / np.log2(ranks + 2), 0)
+        dcg = np.add.reduceat(gains, bounds, axis=0)
+        best_rank = np.minimum.reduceat(ranks, bounds, axis=0)
+
+        metrics["ndcg"].append((dcg / ideal_dcg[:, None]).mean(axis=0))
+        metrics["mrr"].append((1 / (best_rank + 1)).mean(axis=0))
+        metrics["hit_rate"].append((best_rank < k).mean(axis=0))
+    return {name: np.concatenate(values) for name, values in metrics.items()}
+
+
+def main():
+    import polars as pl
+
+    parser = argparse.ArgumentParser(description="Grid search ranking weights on logged candidate sets")
+    parser.add_argument("log", help="JSONL replay log (see REPLAY_LOG_PATH)")
+    parser.add_argument("--grid", nargs="*", default=[], help="weight=start:stop:count or weight=v1,v2,...")
+    parser.add_argument("--k", type=int, default=5, help="Cut-off for nDCG and hit rate, usually top_n")
+    parser.add_argument("--metric", default="ndcg", choices=["ndcg", "mrr", "hit_rate"])
+    parser.add_argument("--top", type=int, default=10, help="Combinations to print")
+    parser.add_argument("--output", default=None, help="Write every combination's metrics to this CSV")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = load_log(args.log)
+    if df.is_empty():
+        print("No candidate sets with a relevant candidate in the log")
+        return
+    features, queries, relevance = feature_matrix(df)
+    combinations = parse_grid(args.grid)
+    baseline = np.array([[DEFAULT_WEIGHTS.get(name, 0.0) for name in FEATURE_SCORES]], dtype=np.float32)
+    loaded = time.perf_counter()
+
+    metrics = evaluate(features, queries, relevance, np.vstack([baseline, combinations]), args.k)
+    elapsed = time.perf_counter() - loaded
+
+    results = pl.DataFrame({name: np.r_[baseline[:, i], combinations[:, i]] for i, name in enumerate(FEATURE_SCORES)}) \
+        .with_columns([pl.Series(name, values) for name, values in metrics.items()])
+    print(f"{df['query'].n_unique()} candidate sets, {len(df)} candidates, {len(combinations)} combinations: "
+          f"loaded in {loaded - start:.1f}s, evaluated in {elapsed:.2f}s")
+    print("DEFAULT_WEIGHTS:", {name: round(float(results[0, name]), 4) for name in metrics})
+    with pl.Config(tbl_rows=args.top, tbl_cols=-1):
+        print(results[1:].sort(args.metric, descending=True).head(args.top))
+    if args.output:
+        results.write_csv(args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from embedding_cache import normalize_text
+from metrics import registry, Counter
+
+# Bounded TTL + LRU cache of /recommender results, keyed on the whole request. An entry keeps the
+# scored candidate set (ranking.Rescorer) and the response texts it served, so a hit is re-ranked
+# for the current time without embedding, searching or hydrating again.
+#
+# Entries are stamped with the store generation they were computed in. Anything that changes what a
+# search or the ranking would return (a /chat insert, a retrievalCount flush, a compaction batch)
+# calls invalidate(), which bumps the generation in O(1); entries from older generations are
+# dropped when they are next looked up or fall off the LRU end.
+
+# Maximum cached requests, 0 disables the cache
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', '1000'))
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', '60'))
+
+result_cache_requests = registry.register(
+    Counter("backend_result_cache_requests_total", "Ranked result cache lookups", ("result",)))
+
+
+def request_key(message, top_n, weights, distance_filter, candidate_limit):
+    return normalize_text(message), top_n, tuple(sorted(weights.items())), distance_filter, candidate_limit
+
+
+class CachedResult:
+    def __init__(self, items, rescorer, responses):
+        self.items = items  # Candidates as searched, for the replay log
+        self.rescorer = rescorer
+        self.responses = responses  # id -> response text of the results served so far
+
+
+class RankedResultCache:
+    def __init__(self, max_size=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (generation, expires_at, CachedResult)
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                result = "miss"
+            elif entry[0] != self.generation:
+                result = "stale"
+            elif entry[1] < time.monotonic():
+                result = "expired"
+            else:
+                self.entries.move_to_end(key)
+                result_cache_requests.inc(result="hit")
+                return entry[2]
+            if entry is not None:
+                del self.entries[key]
+        result_cache_requests.inc(result=result)
+        return None
+
+    def put(self, key, value, generation):
+        # `generation` is read before the result was computed, so a write that landed meanwhile
+        # leaves the entry stale from the start
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[key] = (generation, time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
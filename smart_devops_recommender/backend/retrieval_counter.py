@@ -0,0 +1,115 @@
+import os
+import time
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from utils import run_blocking
+
+# Flush buffered retrievalCount increments every N seconds or once this many objects are pending
+RETRIEVAL_COUNT_FLUSH_INTERVAL = float(os.getenv('RETRIEVAL_COUNT_FLUSH_INTERVAL', '5'))
+RETRIEVAL_COUNT_FLUSH_SIZE = int(os.getenv('RETRIEVAL_COUNT_FLUSH_SIZE', '100'))
+# Concurrent per-object updates during a flush. Weaviate has no batch partial update (a batch
+# write replaces the whole object, vector included), so each count is its own PATCH.
+RETRIEVAL_COUNT_FLUSH_WORKERS = int(os.getenv('RETRIEVAL_COUNT_FLUSH_WORKERS', '8'))
+
+
+class RetrievalCountBuffer:
+    """Write-behind buffer for retrievalCount increments, keyed by object UUID."""
+
+    def __init__(self, client, class_name, flush_interval=RETRIEVAL_COUNT_FLUSH_INTERVAL,
+                 flush_size=RETRIEVAL_COUNT_FLUSH_SIZE, on_flush=None, workers=RETRIEVAL_COUNT_FLUSH_WORKERS):
+        self.client = client
+        self.class_name = class_name
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.pending = Counter()
+        self.lock = threading.Lock()
+        # Held through a whole flush: each one writes back current + delta, so two overlapping flushes
+        # (the background loop and compaction or shutdown) would overwrite each other's increments
+        self.flush_lock = threading.Lock()
+        self.flush_requested = None
+        self.on_flush = on_flush  # Called after counts were written, e.g. to invalidate cached rankings
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="retrieval-count")
+
+    def increment(self, uuid, amount=1):
+        with self.lock:
+            self.pending[uuid] += amount
+            full = len(self.pending) >= self.flush_size
+        if full and self.flush_requested is not None:
+            self.flush_requested.set()
+
+    def flush(self):
+        with self.flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        # Swap the buffer out under the lock so increments keep landing while we write
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+        if not pending:
+            return 0
+
+        try:
+            current_counts = self.fetch_counts(list(pending))
+        except Exception as e:
+            # Nothing was written, put the increments back so they go out with the next flush
+            self.requeue(pending)
+            print(f"Failed to flush retrieval counts: {e}")
+            return 0
+
+        retrieved_at = int(time.time() * 1000)
+        # Objects deleted since they were retrieved are dropped
+        updates = {uuid: self.executor.submit(self.write_count, uuid, (current_counts[uuid] or 0) + delta,
+                                              retrieved_at)
+                   for uuid, delta in pending.items() if uuid in current_counts}
+        failed = Counter()
+        for uuid, update in updates.items():
+            try:
+                update.result()
+            except Exception as e:
+                failed[uuid] = pending[uuid]
+                error = e
+        if failed:
+            # Only the counts that didn't land, the others are already in the store
+            self.requeue(failed)
+            print(f"Failed to flush {len(failed)} of {len(updates)} retrieval counts: {error}")
+
+        written = len(updates) - len(failed)
+        if written and self.on_flush is not None:
+            self.on_flush()
+        return written
+
+    def write_count(self, uuid, count, retrieved_at):
+        self.client.data_object.update(
+            data_object={"retrievalCount": count, "lastRetrievedUnix": retrieved_at},
+            class_name=self.class_name,
+            uuid=uuid
+        )
+
+    def requeue(self, increments):
+        with self.lock:
+            self.pending.update(increments)
+
+    def fetch_counts(self, uuids):
+        # One GraphQL round trip for the current counts of every pending object
+        result = self.client.query.get(self.class_name, ["retrievalCount"]) \
+            .with_where({"path": ["id"], "operator": "ContainsAny", "valueTextArray": uuids}) \
+            .with_additional(["id"]) \
+            .with_limit(len(uuids)) \
+            .do()
+        return {
+            item["_additional"]["id"]: item["retrievalCount"]
+            for item in result['data']['Get'][self.class_name] or []
+        }
+
+    async def run(self):
+        # Background flush loop, started from the FastAPI lifespan
+        self.flush_requested = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self.flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_requested.clear()
+            await run_blocking(self.flush)
@@ -1,39 +1,193 @@
 import json
-
-from fastapi import FastAPI, HTTPException, Query
+import anyio
+import asyncio
+import importlib
+import numpy as np
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 import os
-import openai
-import weaviate
-import polars as pl
+import time
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
-from datetime import timedelta
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from starlette.background import BackgroundTask
 from typing import Dict
 from typing import List, Optional
-from openai import OpenAI
-
-openai_client = OpenAI()
 
-from utils import generate_embedding, calculate_weighted_score
-
-app = FastAPI()
+from client_setup import get_weaviate_client, get_async_openai_client, close_clients
+from utils import generate_embedding_async, generate_embeddings_async, run_blocking, calculate_weighted_score, \
+    EMBEDDING_MODEL
+from embedding_cache import embedding_cache, normalize_text
+from retrieval_counter import RetrievalCountBuffer
+from local_index import LocalVectorIndex
+from schema import ensure_schema, object_uuid
+from singleflight import SingleFlight
+from ranking import rank_candidates, rank_candidate_sets, no_answer, Rescorer, DEFAULT_WEIGHTS
+from metrics import registry, stage, instrument, Counter, Gauge
+from lexical_index import LexicalIndex, tokenize, content_tokens, prefix_match
+from admission import AdmissionController, Overloaded
+from circuit_breaker import CircuitBreaker, UpstreamUnavailable, is_client_error
+from serialization import FastJSONResponse, COMPACT_FIELDS, PREVIEW_CHARS, dumps, project, response_bytes
+from replay import ReplayLog
+from compaction import Compactor, COMPACTION_INTERVAL
+from result_cache import RankedResultCache, CachedResult, request_key
+
+# Ranked /recommender results, invalidated by anything that writes to the store (see result_cache.py)
+result_cache = RankedResultCache()
+
+# retrievalCount increments are buffered and written in bulk off the request path,
+# the shared Weaviate client is attached at startup
+retrieval_counts = RetrievalCountBuffer(None, "DevOpsPrompts_v2", on_flush=result_cache.invalidate)
+
+# Optional in-process replica of DevOpsPrompts_v2, queried instead of Weaviate's nearVector
+LOCAL_INDEX_ENABLED = os.getenv('LOCAL_INDEX_ENABLED', 'false').lower() == 'true'
+LOCAL_INDEX_RECONCILE_INTERVAL = float(os.getenv('LOCAL_INDEX_RECONCILE_INTERVAL', '300'))
+local_index = LocalVectorIndex()
+
+# Optional BM25 index over the stored prompts, consulted before embedding. Queries with at least
+# LEXICAL_MIN_TOKENS tokens, LEXICAL_MIN_CONTENT_TOKENS of them not stopwords, are answered without
+# calling the embeddings API when a match reaches LEXICAL_FAST_PATH_THRESHOLD and the query covers
+# LEXICAL_FAST_PATH_COVERAGE of that prompt's terms; otherwise lexical_score is passed to ranking as
+# the "lexical" feature
+LEXICAL_INDEX_ENABLED = os.getenv('LEXICAL_INDEX_ENABLED', 'false').lower() == 'true'
+LEXICAL_FAST_PATH_THRESHOLD = float(os.getenv('LEXICAL_FAST_PATH_THRESHOLD', '0.9'))
+LEXICAL_FAST_PATH_COVERAGE = float(os.getenv('LEXICAL_FAST_PATH_COVERAGE', '0.8'))
+LEXICAL_MIN_TOKENS = int(os.getenv('LEXICAL_MIN_TOKENS', '3'))
+LEXICAL_MIN_CONTENT_TOKENS = int(os.getenv('LEXICAL_MIN_CONTENT_TOKENS', '2'))
+lexical_index = LexicalIndex()
+
+# snapshot.py export to warm-start the in-process indexes from at startup, the first reconcile
+# then picks up whatever changed since the snapshot was taken
+INDEX_SNAPSHOT_PATH = os.getenv('INDEX_SNAPSHOT_PATH', '')
+
+# Default candidate pool size sent to the vector search, requests can override it
+CANDIDATE_LIMIT = int(os.getenv('RECOMMENDER_CANDIDATE_LIMIT', '50'))
+
+# /recommender/batch works through the messages in chunks of this size, with at most
+# BATCH_SEARCH_CONCURRENCY vector searches in flight
+BATCH_CHUNK_SIZE = int(os.getenv('RECOMMENDER_BATCH_CHUNK_SIZE', '256'))
+BATCH_SEARCH_CONCURRENCY = int(os.getenv('RECOMMENDER_BATCH_SEARCH_CONCURRENCY', '16'))
+
+# Candidate sets served by /recommender and the suggestions users then open, for replay.py to tune
+# the ranking weights against, written only when REPLAY_LOG_PATH is set
+replay_log = ReplayLog()
+
+# Per-endpoint concurrency limits and bounded queues, chat is admitted ahead of typeahead and batch
+admission = AdmissionController()
+
+# Upper bound on a chat completion (time to the first chunk when streaming), slower calls trip the breaker
+COMPLETION_TIMEOUT = float(os.getenv('COMPLETION_TIMEOUT', '60'))
+completion_breaker = CircuitBreaker("openai_completions", COMPLETION_TIMEOUT)
+
+# Compress responses of at least this many bytes for clients that accept gzip, 0 disables it
+RESPONSE_GZIP_MIN_SIZE = int(os.getenv('RESPONSE_GZIP_MIN_SIZE', '0'))
+
+degraded_responses = registry.register(
+    Counter("backend_degraded_responses_total", "Requests answered by a fallback", ("endpoint", "fallback")))
+
+
+async def reconcile_local_index():
+    # Periodically re-sync the replicas with Weaviate to pick up writes from other processes
+    while True:
+        await asyncio.sleep(LOCAL_INDEX_RECONCILE_INTERVAL)
+        if LOCAL_INDEX_ENABLED:
+            try:
+                await run_blocking(local_index.reconcile, get_weaviate_client(), "DevOpsPrompts_v2")
+            except Exception as e:
+                print(f"Failed to reconcile local index: {e}")
+        if LEXICAL_INDEX_ENABLED:
+            try:
+                await run_blocking(lexical_index.reconcile, get_weaviate_client(), "DevOpsPrompts_v2")
+            except Exception as e:
+                print(f"Failed to reconcile lexical index: {e}")
+
+
+async def compact_store(compactor):
+    # One bounded compaction batch per interval, skipped while requests are queued for admission
+    while True:
+        await asyncio.sleep(COMPACTION_INTERVAL)
+        if admission.busy:
+            continue
+        try:
+            # Counts buffered for objects about to be merged would otherwise be dropped with them
+            await run_blocking(retrieval_counts.flush)
+            result = await run_blocking(compactor.step)
+        except Exception as e:
+            print(f"Failed to compact prompt store: {e}")
+            continue
+        if result["removed"] or result["counts"]:
+            result_cache.invalidate()
+        for uuid in result["removed"]:
+            local_index.remove(uuid)
+            lexical_index.remove(uuid)
+        for uuid, count in result["counts"].items():
+            local_index.set_retrieval_count(uuid, count)
+            lexical_index.set_retrieval_count(uuid, count)
+
+
+async def load_index(index, client):
+    if INDEX_SNAPSHOT_PATH and os.path.exists(INDEX_SNAPSHOT_PATH):
+        try:
+            await run_blocking(index.load_snapshot, INDEX_SNAPSHOT_PATH)
+            return
+        except Exception as e:
+            print(f"Failed to load index snapshot {INDEX_SNAPSHOT_PATH}, falling back to Weaviate: {e}")
+    await run_blocking(index.reconcile, client, "DevOpsPrompts_v2")
+
+
+def record_retrieval(uuid):
+    # Buffer the retrievalCount update, it is flushed in bulk later, and keep the in-process indexes current
+    retrieval_counts.increment(uuid)
+    local_index.increment_retrieval_count(uuid)
+    lexical_index.increment_retrieval_count(uuid)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Upstream clients are built here rather than at import time, so importing routes stays cheap
+    client = await run_blocking(get_weaviate_client)
+    get_async_openai_client()
+    retrieval_counts.client = client
+    # Load Polars in the background so neither startup nor the first ranking waits for it
+    warmup_task = asyncio.create_task(run_blocking(importlib.import_module, "polars"))
+
+    flush_task = asyncio.create_task(retrieval_counts.run())
+    reconcile_task = None
+    await run_blocking(ensure_schema, client)
+    for enabled, index in ((LOCAL_INDEX_ENABLED, local_index), (LEXICAL_INDEX_ENABLED, lexical_index)):
+        if enabled:
+            await load_index(index, client)
+    if LOCAL_INDEX_ENABLED or LEXICAL_INDEX_ENABLED:
+        reconcile_task = asyncio.create_task(reconcile_local_index())
+    compaction_task = asyncio.create_task(compact_store(Compactor(client))) if COMPACTION_INTERVAL > 0 else None
+    yield
+    flush_task.cancel()
+    if reconcile_task is not None:
+        reconcile_task.cancel()
+    if compaction_task is not None:
+        compaction_task.cancel()
+    # Don't lose increments buffered since the last flush. Cancelling flush_task doesn't stop a flush
+    # already running on the executor; flush() waits for it before writing.
+    await run_blocking(retrieval_counts.flush)
+    replay_log.close()
+    await warmup_task
+    await close_clients()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True,
                    allow_methods=["*"], allow_headers=["*"])
+if RESPONSE_GZIP_MIN_SIZE > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=RESPONSE_GZIP_MIN_SIZE)
 
-# Initialize the OpenAI client
-openai.api_key = os.getenv('OPENAI_KEY')  # Replace with your actual OpenAI API key
-
-# Initialize the Weaviate client
-client = weaviate.Client("http://localhost:8080")  # Replace with your Weaviate instance URL
+# Per-stage latency histograms, Server-Timing header and slow-request profiling
+instrument(app)
 
 # Define weights for each factor
-weights = {
-    "distance": 15.9,
-    "time_elapsed_since_added": 2,
-    "length": 0.05,
-    "retrieval_count": 1
-}
+weights = DEFAULT_WEIGHTS
 
 
 class ChatRequest(BaseModel):
@@ -41,6 +195,10 @@ class ChatRequest(BaseModel):
     top_n: int
     weights: Dict[str, float]
     distance_filter: float  # Add this field
+    candidate_limit: Optional[int] = None  # Size of the candidate pool to rank, defaults to CANDIDATE_LIMIT
+    compact: bool = False  # Only id, prompt, preview and weighted_score per result
+    fields: Optional[List[str]] = None  # Explicit projection, any ChatResponse field or "preview"
+    preview_chars: Optional[int] = None  # Preview length, defaults to RECOMMENDER_PREVIEW_CHARS
 
 
 class FeatureContribution(BaseModel):
@@ -51,6 +209,7 @@ class FeatureContribution(BaseModel):
     contribution: Optional[float]
 
 class ChatResponse(BaseModel):
+    id: Optional[str] = None
     prompt: str
     response: str
     distance_score: Optional[float]
@@ -59,32 +218,161 @@ class ChatResponse(BaseModel):
     retrieval_count: Optional[int]
     retrieval_count_score: Optional[float]
     weighted_score: Optional[float]
+    lexical_score: Optional[float] = None
     creation_time: Optional[float]
     time_elapsed: Optional[str]
     contributions: List[FeatureContribution]
 
 
-def format_number(num):
-    return round(num, 3)
-
-
-# def format_time_elapsed(seconds):
-#     if seconds >= 86400:
-#         return f"{seconds / 86400:.2f} days"
-#     elif seconds >= 3600:
-#         return f"{seconds / 3600:.2f} hours"
-#     elif seconds >= 60:
-#         return f"{seconds / 60:.2f} minutes"
-#     else:
-#         return f"{seconds:.2f} seconds"
-
-
-def format_time_elapsed(seconds):
-    delta = timedelta(seconds=seconds)
-    days = delta.days
-    hours, remainder = divmod(delta.seconds, 3600)
-    minutes, seconds = divmod(remainder, 60)
-    return f"{days} day {hours:02}:{minutes:02}:{seconds:02}"
+RESPONSE_FIELDS = tuple(ChatResponse.model_fields)
+
+
+def result_fields(request):
+    # Fields to return for a ChatRequest, validated before any upstream work
+    if request.fields:
+        unknown = sorted(set(request.fields) - set(RESPONSE_FIELDS) - {"preview"})
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        return request.fields
+    return COMPACT_FIELDS if request.compact else RESPONSE_FIELDS
+
+
+def encode_results(request, results, endpoint):
+    with stage("serialize"):
+        body = dumps(project(results, result_fields(request), request.preview_chars or PREVIEW_CHARS))
+    response_bytes.observe(len(body), endpoint=endpoint, mode="full" if not (request.fields or request.compact) else
+                           "compact" if not request.fields else "fields")
+    return body
+
+
+async def search_candidates(query_embedding, distance_filter, limit):
+    if LOCAL_INDEX_ENABLED and local_index.loaded:
+        with stage("search"):
+            items = await run_blocking(local_index.search, query_embedding, limit, distance_filter)
+        for item in items:
+            item["response_length"] = len(item["response"])
+        return items
+
+    # Perform the query using the nearVector filter, with the distance bound and pool size applied server side.
+    # Only the fields ranking needs are fetched, the response text is loaded for the final top N.
+    query = get_weaviate_client().query.get("DevOpsPrompts_v2",
+                             ["prompt", "retrievalCount", "responseLength",
+                              "_additional { id, distance, creationTimeUnix }"]) \
+        .with_near_vector({"vector": query_embedding, "distance": distance_filter}) \
+        .with_limit(limit)
+    with stage("search"):
+        result = await run_blocking(query.do)
+
+    items = [
+        {
+            "id": item["_additional"]["id"],
+            "prompt": item["prompt"],
+            "response_length": item["responseLength"],
+            "distance": item["_additional"]["distance"],
+            "creation_time": int(item["_additional"]["creationTimeUnix"]) / 1000,  # Convert to seconds
+            "retrieval_count": item["retrievalCount"]
+        }
+        for item in result['data']['Get']['DevOpsPrompts_v2'] or []
+    ]
+
+    # Objects stored before responseLength existed need their response to be ranked
+    legacy = [item for item in items if item["response_length"] is None]
+    if legacy:
+        with stage("hydrate"):
+            responses = await run_blocking(fetch_responses, [item["id"] for item in legacy])
+        for item in legacy:
+            item["response"] = responses.get(item["id"], "")
+            item["response_length"] = len(item["response"])
+
+    return items
+
+
+def fetch_responses(ids):
+    result = get_weaviate_client().query.get("DevOpsPrompts_v2", ["response"]) \
+        .with_where({"path": ["id"], "operator": "ContainsAny", "valueTextArray": ids}) \
+        .with_additional(["id"]) \
+        .with_limit(len(ids)) \
+        .do()
+    return {item["_additional"]["id"]: item["response"] for item in result['data']['Get']['DevOpsPrompts_v2'] or []}
+
+
+async def hydrate_responses(results):
+    # Load the response text for the results that are actually returned
+    missing = [result["id"] for result in results if not result.get("response")]
+    if missing:
+        with stage("hydrate"):
+            responses = await run_blocking(fetch_responses, missing)
+        for result in results:
+            if not result.get("response"):
+                result["response"] = responses.get(result["id"], "")
+
+
+def lexical_fast_path(message, distance_filter, limit):
+    # Candidates from the lexical index when it is confident enough to skip the embedding, else None
+    tokens = tokenize(message)
+    if not (LEXICAL_INDEX_ENABLED and lexical_index.loaded) or len(tokens) < LEXICAL_MIN_TOKENS or \
+            len(content_tokens(tokens)) < LEXICAL_MIN_CONTENT_TOKENS:
+        return None
+    with stage("lexical"):
+        items = lexical_index.search(message, limit)
+        # Every query term in a prompt isn't enough, the prompt must also be mostly the query
+        matches = [item["id"] for item in items if item["lexical_score"] >= LEXICAL_FAST_PATH_THRESHOLD]
+        confident = matches and max(lexical_index.coverage(message, matches).values()) >= LEXICAL_FAST_PATH_COVERAGE
+    if not confident:
+        return None
+    # distance is 1 - lexical_score here, so the request's distance filter still applies
+    return [item for item in items if item["distance"] <= distance_filter]
+
+
+def add_lexical_scores(message, items):
+    if LEXICAL_INDEX_ENABLED and lexical_index.loaded and items:
+        with stage("lexical"):
+            scores = lexical_index.scores(message, [item["id"] for item in items])
+        for item in items:
+            item["lexical_score"] = scores[item["id"]]
+    return items
+
+
+async def find_candidates(message, distance_filter, limit):
+    # Lexical fast path first, then the embedding and vector search with lexical scores attached
+    items = lexical_fast_path(message, distance_filter, limit)
+    if items:
+        return items
+    with stage("embedding"):
+        query_embedding = await generate_embedding_async(message)
+    items = await search_candidates(query_embedding, distance_filter, limit)
+    return add_lexical_scores(message, items)
+
+
+def service_unavailable(e):
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+
+def client_error(e):
+    # OpenAI rejected the request's own input (e.g. over the context length); the breakers pass that
+    # through unchanged, and it is this request's 400 rather than an outage
+    return HTTPException(status_code=400, detail=str(e))
+
+
+def lexical_fallback(message, limit, error):
+    # Lexical matches at any confidence, for when the request was shed or embeddings are unavailable
+    if LEXICAL_INDEX_ENABLED and lexical_index.loaded:
+        with stage("lexical"):
+            items = lexical_index.search(message, limit)
+        if items:
+            return items
+    raise service_unavailable(error)
+
+
+async def suggest(message, distance_filter, limit):
+    # Typeahead candidates under admission control, returns (items, fallback name or None)
+    try:
+        async with await admission.acquire("typeahead"):
+            return await find_candidates(message, distance_filter, limit), None
+    except (Overloaded, UpstreamUnavailable) as e:
+        items = lexical_fallback(message, limit, e)
+        degraded_responses.inc(endpoint="typeahead", fallback="lexical")
+        return items, "lexical"
 
 
 @app.post("/recommender", response_model=List[ChatResponse])
@@ -96,177 +384,295 @@ async def recommender(request: ChatRequest):
 
     if not user_input:
         raise HTTPException(status_code=400, detail="No message provided")
-
-    # Generate the embedding for the user input
-    query_embedding = generate_embedding(user_input)
-
-    # Perform the query using the nearVector filter
-    result = client.query.get("DevOpsPrompts_v2",
-                              ["prompt", "response", "retrievalCount", "_additional { distance, creationTimeUnix }"]) \
-        .with_near_vector({"vector": query_embedding}).do()
-
-    # Extract the results and process them
-    if result['data']['Get']['DevOpsPrompts_v2']:
-        items = [
-            {
-                "prompt": item["prompt"],
-                "response": item["response"],
-                "distance": item["_additional"]["distance"],
-                "creation_time": int(item["_additional"]["creationTimeUnix"]) / 1000,  # Convert to seconds
-                "retrieval_count": item["retrievalCount"]
-            }
-            for item in result['data']['Get']['DevOpsPrompts_v2']
-        ]
-
-        # Create a Polars DataFrame
-        df = pl.DataFrame(items)
-
-        # Filter out items with a distance greater than the distance filter
-        df = df.filter(pl.col("distance") <= distance_filter)
-
-        # Calculate the current time for time_elapsed_since_added calculation
-        current_time = datetime.now().timestamp()
-
-        # Calculate the time elapsed since the document was added
-        df = df.with_columns([
-            (current_time - pl.col("creation_time").cast(pl.Float64)).alias("time_elapsed_seconds")
-        ])
-
-        # Add columns for length, distance_score, time_elapsed_since_added_score, length_score, and retrieval_count_score
-        df = df.with_columns([
-            (1 - pl.col("distance")).alias("distance_score"),
-            (1 - (pl.col("time_elapsed_seconds") / pl.col("time_elapsed_seconds").max())).alias(
-                "time_elapsed_since_added_score"),
-            (pl.col("response").str.len_chars() / pl.col("response").str.len_chars().max()).alias("length_score"),
-            (pl.col("retrieval_count") / pl.col("retrieval_count").max()).alias("retrieval_count_score")
-        ])
-
-        # Ensure all scores are between 0 and 1
-        df = df.with_columns([
-            pl.col("distance_score").clip(0, 1),
-            pl.col("time_elapsed_since_added_score").clip(0, 1),
-            pl.col("length_score").clip(0, 1),
-            pl.col("retrieval_count_score").clip(0, 1)
-        ])
-
-        # Calculate the weighted score
-        df = df.with_columns(
-            (weights["distance"] * pl.col("distance_score") +
-             weights["time_elapsed_since_added"] * pl.col("time_elapsed_since_added_score") +
-             weights["length"] * pl.col("length_score") +
-             weights["retrieval_count"] * pl.col("retrieval_count_score")).alias("weighted_score")
-        )
-
-        # Sort items based on weighted score
-        df = df.unique(subset=['prompt', 'response']).sort("weighted_score", descending=True)
-
-        # Extract the top N responses
-        top_results = df.head(top_n).to_dicts()
-
-        # Update the retrieval count for the top results
+    result_fields(request)
+
+    key = request_key(user_input, top_n, weights, distance_filter, request.candidate_limit)
+    cached = result_cache.get(key) if result_cache.enabled else None
+    fallback = None
+    if cached is None:
+        generation = result_cache.generation
+        # Find the nearest stored prompt-response pairs within the distance filter
+        try:
+            items, fallback = await suggest(user_input, distance_filter, request.candidate_limit or CANDIDATE_LIMIT)
+        except Exception as e:
+            if is_client_error(e):
+                raise client_error(e) from e
+            raise
+        with stage("rank"):
+            cached = CachedResult(items, Rescorer(items, weights) if items else None, {})
+        # Degraded results are served but not cached
+        if result_cache.enabled and not fallback:
+            result_cache.put(key, cached, generation)
+
+    # Process the results, ranked for the current time also when they come from the cache
+    if cached.rescorer is not None:
+        current_time = time.time()
+        if replay_log.enabled:
+            replay_log.record_candidates(user_input, cached.items, current_time)
+        with stage("rank"):
+            top_results = cached.rescorer.rank(top_n, current_time)
         for result in top_results:
-            update_retrieval_count(client, "DevOpsPrompts_v2", result["prompt"], result["response"])
+            if result["id"] in cached.responses:
+                result["response"] = cached.responses[result["id"]]
+        await hydrate_responses(top_results)
+        cached.responses.update((result["id"], result["response"]) for result in top_results)
 
-        # Add contributions to the response
         for result in top_results:
-            result["contributions"] = [
-                {
-                    "feature": "distance",
-                    "value": format_number(result["distance"]),
-                    "score": format_number(result["distance_score"]),
-                    "weight": format_number(weights["distance"]),
-                    "contribution": format_number(result["distance_score"] * weights["distance"])
-                },
-                {
-                    "feature": "time_elapsed_since_added",
-                    "value": result["creation_time"],
-                    "score": format_number(result["time_elapsed_since_added_score"]),
-                    "weight": format_number(weights["time_elapsed_since_added"]),
-                    "contribution": format_number(
-                        result["time_elapsed_since_added_score"] * weights["time_elapsed_since_added"])
-                },
-                {
-                    "feature": "length",
-                    "value": len(result["response"]),
-                    "score": format_number(result["length_score"]),
-                    "weight": format_number(weights["length"]),
-                    "contribution": format_number(result["length_score"] * weights["length"])
-                },
-                {
-                    "feature": "retrieval_count",
-                    "value": result["retrieval_count"],
-                    "score": format_number(result["retrieval_count_score"]),
-                    "weight": format_number(weights["retrieval_count"]),
-                    "contribution": format_number(result["retrieval_count_score"] * weights["retrieval_count"])
-                }
-            ]
-
-            # Calculate the time elapsed in a human-readable format
-            time_elapsed_seconds = result["time_elapsed_seconds"]
-            result["time_elapsed"] = format_time_elapsed(time_elapsed_seconds)
-    else:
-        top_results = [{"prompt": "", "response": "I'm sorry, I don't have an answer for that.", "distance": None,
-                        "distance_score": None, "time_elapsed_since_added_score": None, "length_score": None,
-                        "retrieval_count": None,
-                        "retrieval_count_score": None, "weighted_score": None, "creation_time": None,
-                        "time_elapsed": None, "contributions": []}]
-
-    # Include creation_time in the response
-    return [ChatResponse(**res) for res in top_results]
-
-
-def escape_graphql_string(value):
-    return json.dumps(value)[1:-1]  # json.dumps adds quotes around the string, so we strip them
-
-def update_retrieval_count(client, class_name, prompt, response):
-
-    # Example usage
-    prompt = escape_graphql_string(prompt)
-    response = escape_graphql_string(response)
-
-    # Search for the object with the given prompt and response
-    result = client.query.get(
-        class_name,
-        ["prompt", "response", "retrievalCount"]
-    ).with_where({
-        "operator": "And",
-        "operands": [
-            {
-                "path": ["prompt"],
-                "operator": "Equal",
-                "valueString": prompt
-            },
-            {
-                "path": ["response"],
-                "operator": "Equal",
-                "valueString": response
-            }
-        ]
-    }).with_additional(["id"]).do()
-
-    if result and result['data']['Get'][class_name]:
-        # Get the object ID and current retrieval count
-        obj = result['data']['Get'][class_name][0]
-        obj_id = obj['_additional']['id']
-        current_retrieval_count = obj.get('retrievalCount', 0)
-
-        # If current_retrieval_count is None, set it to 0
-        if current_retrieval_count is None:
-            current_retrieval_count = 0
-
-        # Increment the retrieval count
-        new_retrieval_count = current_retrieval_count + 1
-
-        # Update the object with the new retrieval count
-        client.data_object.update(
-            data_object={
-                "retrievalCount": new_retrieval_count
-            },
-            class_name=class_name,
-            uuid=obj_id
-        )
+            record_retrieval(result["id"])
     else:
-        print("Object not found")
+        top_results = [no_answer()]
+
+    # Encoded straight from the ranking dicts, the ChatResponse model only documents the full shape
+    body = encode_results(request, top_results, "/recommender")
+    return Response(body, media_type="application/json", headers={"X-Degraded": fallback} if fallback else None)
+
+
+class StoredResponse(BaseModel):
+    id: str
+    prompt: str
+    response: str
+    retrieval_count: Optional[int]
+    creation_time: Optional[float]
+
+
+def fetch_object(object_id):
+    try:
+        obj = get_weaviate_client().data_object.get_by_id(object_id, class_name="DevOpsPrompts_v2")
+    except ValueError:
+        # Not a UUID, so it can't be a stored object
+        return None
+    if obj is None:
+        return None
+    return {
+        "id": obj["id"],
+        "prompt": obj["properties"]["prompt"],
+        "response": obj["properties"]["response"],
+        "retrieval_count": obj["properties"].get("retrievalCount"),
+        "creation_time": int(obj["creationTimeUnix"]) / 1000
+    }
+
+
+@app.get("/recommender/response/{object_id}", response_model=StoredResponse)
+async def recommender_response(object_id: str, query: Optional[str] = None):
+    # Full response text of a suggestion, fetched when the user selects it from a compact result list.
+    # Passing the query it was suggested for logs the selection for offline weight tuning (replay.py).
+    with stage("hydrate"):
+        obj = await run_blocking(fetch_object, object_id)
+    if obj is None:
+        raise HTTPException(status_code=404, detail="Unknown id")
+    if query and replay_log.enabled:
+        replay_log.record_selection(query, object_id)
+    return obj
+
+
+class BatchChatRequest(BaseModel):
+    messages: List[str]
+    top_n: int
+    weights: Dict[str, float]
+    distance_filter: float
+    candidate_limit: Optional[int] = None
+    count_retrievals: bool = False  # Offline jobs don't bump retrievalCount unless asked to
+
+
+async def recommend_chunk(request, messages, search_slots):
+    # One multi-input embedding call per chunk, concurrent searches, and a single ranking pass. A failed
+    # search only fails its own message: its entry in the returned list is the exception.
+    embeddings = await generate_embeddings_async(messages)
+
+    async def search(embedding):
+        async with search_slots:
+            return await search_candidates(embedding, request.distance_filter,
+                                           request.candidate_limit or CANDIDATE_LIMIT)
+
+    searched = await asyncio.gather(*(search(embedding) for embedding in embeddings), return_exceptions=True)
+    candidate_sets = [[] if isinstance(items, Exception) else items for items in searched]
+    for message, items in zip(messages, candidate_sets):
+        add_lexical_scores(message, items)
+    ranked = await run_blocking(rank_candidate_sets, candidate_sets, request.weights, request.top_n)
+    await hydrate_responses([result for top_results in ranked for result in top_results])
+    ranked = [items if isinstance(items, Exception) else top_results for items, top_results in zip(searched, ranked)]
+
+    if request.count_retrievals:
+        for top_results in ranked:
+            for result in [] if isinstance(top_results, Exception) else top_results:
+                record_retrieval(result["id"])
+    return ranked
+
+
+@app.post("/recommender/batch")
+async def recommender_batch(request: BatchChatRequest):
+    # Recommendations for many messages, streamed back as NDJSON in input order, one line per message:
+    # {"index": 0, "message": "...", "results": [...]} or {"index": 0, "message": "...", "error": "..."}
+    if not request.messages:
+        raise HTTPException(status_code=400, detail="No messages provided")
+    empty = [i for i, message in enumerate(request.messages) if not message]
+    if empty:
+        raise HTTPException(status_code=400, detail=f"Empty message at index {empty[0]}")
+
+    try:
+        ticket = await admission.acquire("batch")
+    except Overloaded as e:
+        raise service_unavailable(e)
+    search_slots = asyncio.Semaphore(BATCH_SEARCH_CONCURRENCY)
+
+    async def lines():
+        try:
+            for start in range(0, len(request.messages), BATCH_CHUNK_SIZE):
+                messages = request.messages[start:start + BATCH_CHUNK_SIZE]
+                try:
+                    ranked = await recommend_chunk(request, messages, search_slots)
+                except Exception as e:
+                    # Report the failed chunk and carry on with the rest of the job
+                    for i, message in enumerate(messages):
+                        yield json.dumps({"index": start + i, "message": message, "error": str(e)}) + "\n"
+                    continue
+
+                for i, (message, top_results) in enumerate(zip(messages, ranked)):
+                    if isinstance(top_results, Exception):
+                        yield json.dumps({"index": start + i, "message": message, "error": str(top_results)}) + "\n"
+                        continue
+                    results = [ChatResponse(**res) for res in top_results or [no_answer()]]
+                    yield json.dumps({"index": start + i, "message": message,
+                                      "results": jsonable_encoder(results)}) + "\n"
+        finally:
+            ticket.release()
+
+    # The background task releases the slot too, in case the client left before the stream started
+    return StreamingResponse(lines(), media_type="application/x-ndjson", background=BackgroundTask(ticket.release))
+
+
+# Weight of the match against the new prefix when the previous candidates are re-ranked provisionally,
+# used when the request doesn't weight "lexical" itself
+TYPEAHEAD_PREFIX_WEIGHT = float(os.getenv('TYPEAHEAD_PREFIX_WEIGHT', '10'))
+
+
+class TypeaheadSession:
+    """Per-connection typeahead state: the latest candidate set and the in-flight search."""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.candidates = []
+        self.responses = {}
+        self.task = None
+
+    async def on_prefix(self, request):
+        # A newer prefix supersedes whatever is still running for the previous one
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+        self.task = asyncio.create_task(self.search(request))
+
+        # While the new embedding is pending, re-rank the previous candidates against the new prefix
+        candidates = self.prefix_candidates(request.message)
+        if candidates:
+            weights = {**request.weights, "lexical": request.weights.get("lexical") or TYPEAHEAD_PREFIX_WEIGHT}
+            provisional = rank_candidates(candidates, weights, request.top_n)
+            for result in provisional:
+                if result["id"] in self.responses:
+                    result["response"] = self.responses[result["id"]]
+            await hydrate_responses(provisional)
+            self.responses.update({result["id"]: result["response"] for result in provisional})
+            # Not once the real results are out
+            if not self.task.done():
+                await self.send(request, provisional, provisional=True)
+
+    def prefix_candidates(self, message):
+        # The previous candidate set scored against the new prefix, those that no longer match it dropped
+        if not self.candidates:
+            return []
+        if LEXICAL_INDEX_ENABLED and lexical_index.loaded:
+            scores = lexical_index.scores(message, [item["id"] for item in self.candidates])
+        else:
+            scores = {item["id"]: prefix_match(message, item["prompt"]) for item in self.candidates}
+        return [{**item, "lexical_score": scores[item["id"]]} for item in self.candidates if scores[item["id"]] > 0]
+
+    async def search(self, request):
+        try:
+            items, fallback = await suggest(request.message, request.distance_filter,
+                                            request.candidate_limit or CANDIDATE_LIMIT)
+            if items:
+                top_results = rank_candidates(items, request.weights, request.top_n)
+                await hydrate_responses(top_results)
+                for result in top_results:
+                    record_retrieval(result["id"])
+            else:
+                top_results = [no_answer()]
+
+            self.candidates = items
+            self.responses.update({r["id"]: r["response"] for r in top_results if r.get("id")})
+            self.responses.update({item["id"]: item["response"] for item in items if item.get("response")})
+            await self.send(request, top_results, provisional=False, degraded=fallback)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self.websocket.send_json({"message": request.message, "error": str(e)})
+
+    async def send(self, request, results, provisional, degraded=None):
+        payload = {
+            "message": request.message,
+            "provisional": provisional,
+            "results": project(results, result_fields(request), request.preview_chars or PREVIEW_CHARS)
+        }
+        if degraded:
+            payload["degraded"] = degraded
+        await self.websocket.send_text(dumps(payload).decode("utf-8"))
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+
+
+@app.websocket("/ws/typeahead")
+async def typeahead(websocket: WebSocket):
+    # Each message is a ChatRequest for the current prefix, replies carry the prefix they belong to
+    await websocket.accept()
+    session = TypeaheadSession(websocket)
+    try:
+        while True:
+            data = await websocket.receive_text()
+            try:
+                # Malformed JSON and missing or mistyped fields both raise ValidationError
+                request = ChatRequest.model_validate_json(data)
+            except ValueError as e:
+                # A bad frame is answered with an error, the session carries on
+                await websocket.send_json({"error": str(e)})
+                continue
+            try:
+                result_fields(request)
+            except HTTPException as e:
+                await websocket.send_json({"message": request.message, "error": e.detail})
+                continue
+            if request.message:
+                await session.on_prefix(request)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session.close()
+
+
+@app.get("/embedding_cache/stats")
+async def embedding_cache_stats():
+    return embedding_cache.stats()
+
+
+embedding_cache_gauge = registry.register(
+    Gauge("backend_embedding_cache", "Embedding cache statistics", ("stat",)))
+retrieval_counts_pending = registry.register(
+    Gauge("backend_retrieval_counts_pending", "retrievalCount increments waiting to be flushed"))
+local_index_size = registry.register(Gauge("backend_local_index_size", "Objects in the local vector index"))
+lexical_index_size = registry.register(Gauge("backend_lexical_index_size", "Prompts in the lexical index"))
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus scrape endpoint
+    for name, value in embedding_cache.stats().items():
+        if isinstance(value, (int, float)):
+            embedding_cache_gauge.set(value, stat=name)
+    retrieval_counts_pending.set(len(retrieval_counts.pending))
+    local_index_size.set(len(local_index))
+    lexical_index_size.set(len(lexical_index))
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 
 class CompletionRequest(BaseModel):
@@ -276,6 +682,192 @@ class CompletionRequest(BaseModel):
 class CompletionResponse(BaseModel):
     prompt: str
     response: str
+    cache_hit: bool = False  # Answer was served from a stored near-identical prompt
+    coalesced: bool = False  # Request shared an identical in-flight request's answer
+    cached_id: Optional[str] = None
+    cached_distance: Optional[float] = None
+    degraded: bool = False  # OpenAI was unavailable and a stored answer was served instead
+    latency_ms: Optional[float] = None
+
+
+# Semantic answer cache: reuse a stored answer when its prompt is within SEMANTIC_CACHE_DISTANCE (cosine)
+# of the new one. Stored vectors embed "Prompt: ... Response: ...", so they only shortlist candidates,
+# together with the closest lexical matches; the question is then compared with the candidates' prompts.
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'false').lower() == 'true'
+SEMANTIC_CACHE_DISTANCE = float(os.getenv('SEMANTIC_CACHE_DISTANCE', '0.1'))
+SEMANTIC_CACHE_CANDIDATES = int(os.getenv('SEMANTIC_CACHE_CANDIDATES', '5'))
+
+SYSTEM_PROMPT = """You are a DevOps helpful assistant. 
+             Send Response as html format don't send information as ```html,
+             Please necessary hyperlinks for information, don't add much
+             Give Answer more descriptive, so that user can understand properly, also added steps if needed"""
+
+# Identical questions asked concurrently share one upstream call
+chat_flight = SingleFlight()
+
+
+async def prompt_embeddings(prompts):
+    # Prompt vectors through the embedding cache. While the embeddings API is unavailable, prompts that
+    # were never embedded are left out (None).
+    try:
+        return await generate_embeddings_async(prompts)
+    except UpstreamUnavailable:
+        return await run_blocking(lambda: [embedding_cache.get(prompt, EMBEDDING_MODEL) for prompt in prompts])
+
+
+def closest_prompt(query_embedding, hits, vectors, max_distance):
+    # The hit whose prompt vector is closest to the question within max_distance, with that distance
+    best, best_distance = None, None
+    query = np.asarray(query_embedding, dtype=np.float32)
+    for hit, vector in zip(hits, vectors):
+        if vector is None:
+            continue
+        vector = np.asarray(vector, dtype=np.float32)
+        distance = 1 - float(query @ vector) / float(np.linalg.norm(query) * np.linalg.norm(vector) or 1)
+        if distance <= max_distance and (best_distance is None or distance < best_distance):
+            best, best_distance = hit, distance
+    return best, best_distance
+
+
+async def semantic_cache_lookup(user_input):
+    with stage("embedding"):
+        query_embedding = await generate_embedding_async(user_input)
+    # Cosine distance is at most 2, so the vector shortlist is only bounded by its size
+    hits = {hit["id"]: hit for hit in await search_candidates(query_embedding, 2.0, SEMANTIC_CACHE_CANDIDATES)}
+    if LEXICAL_INDEX_ENABLED and lexical_index.loaded:
+        for hit in lexical_index.search(user_input, SEMANTIC_CACHE_CANDIDATES):
+            hits.setdefault(hit["id"], hit)
+    if not hits:
+        return None
+
+    hits = list(hits.values())
+    with stage("embedding"):
+        vectors = await prompt_embeddings([hit["prompt"] for hit in hits])
+    hit, distance = closest_prompt(query_embedding, hits, vectors, SEMANTIC_CACHE_DISTANCE)
+    if hit is None:
+        return None
+
+    if not hit.get("response"):
+        hit["response"] = (await run_blocking(fetch_responses, [hit["id"]])).get(hit["id"])
+        if not hit["response"]:
+            return None
+
+    # A cache hit counts as a retrieval of the stored answer
+    record_retrieval(hit["id"])
+    return {"response": hit["response"], "cache_hit": True, "cached_id": hit["id"], "cached_distance": distance}
+
+
+async def fallback_answer(user_input, error):
+    # Best stored answer while completions are unavailable: the same question asked before, then the
+    # closest lexical match, then the semantic cache (which still works for cached embeddings)
+    candidates = [("stored", {"id": object_uuid(user_input), "distance": 0.0})]
+    if LEXICAL_INDEX_ENABLED and lexical_index.loaded:
+        candidates += [("lexical", item) for item in lexical_index.search(user_input, 1)]
+    responses = await run_blocking(fetch_responses, [item["id"] for _, item in candidates])
+
+    for fallback, item in candidates:
+        if responses.get(item["id"]):
+            record_retrieval(item["id"])
+            result = {"response": responses[item["id"]], "cache_hit": True, "cached_id": item["id"],
+                      "cached_distance": item["distance"]}
+            break
+    else:
+        try:
+            result = await semantic_cache_lookup(user_input)
+        except UpstreamUnavailable:
+            result = None
+        if result is None:
+            raise service_unavailable(error)
+        fallback = "semantic"
+
+    degraded_responses.inc(endpoint="chat", fallback=fallback)
+    return {**result, "degraded": True}
+
+
+def answer_object(user_input, response_text):
+    # Properties of a new /chat object; lastRetrievedUnix stays unset until a retrieval is flushed
+    return {
+        "prompt": user_input,
+        "response": response_text,
+        "retrievalCount": 1,  # Initialize retrieval count to 1 when the object is created
+        "responseLength": len(response_text)
+    }
+
+
+async def store_answer(user_input, response_text):
+    # Generate the embedding for the combined prompt and response
+    combined_text = f"Prompt: {user_input} Response: {response_text}"
+    with stage("store_embedding"):
+        embedding = await generate_embedding_async(combined_text)
+
+    # Store the prompt-response pair in Weaviate with the combined vector, keyed by the question
+    uuid = object_uuid(user_input)
+    data_object = answer_object(user_input, response_text)
+    with stage("store"):
+        created = await run_blocking(upsert_answer, uuid, data_object, embedding)
+    result_cache.invalidate()
+    # Keep the in-process indexes in sync with the insert
+    if LOCAL_INDEX_ENABLED:
+        local_index.add(uuid, embedding, user_input, response_text, data_object["retrievalCount"] if created else None)
+    if LEXICAL_INDEX_ENABLED:
+        lexical_index.add(uuid, user_input, len(response_text), data_object["retrievalCount"] if created else None)
+    if not created:
+        # Asked before: the stored object now holds the new answer and counts one more retrieval
+        record_retrieval(uuid)
+    return uuid
+
+
+def upsert_answer(uuid, data_object, vector):
+    # Create the object under its deterministic id, or replace the answer of the existing one
+    from weaviate.exceptions import ObjectAlreadyExistsException
+
+    client = get_weaviate_client()
+    try:
+        client.data_object.create(data_object=data_object, class_name="DevOpsPrompts_v2", uuid=uuid, vector=vector)
+        return True
+    except ObjectAlreadyExistsException:
+        # Merge update, so the stored retrievalCount is kept
+        update = {key: value for key, value in data_object.items() if key != "retrievalCount"}
+        client.data_object.update(update, class_name="DevOpsPrompts_v2", uuid=uuid, vector=vector)
+        return False
+
+
+async def cached_answer(user_input):
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    try:
+        return await semantic_cache_lookup(user_input)
+    except UpstreamUnavailable:
+        # Embeddings are down, go straight to the completion
+        return None
+
+
+async def answer(user_input):
+    cached = await cached_answer(user_input)
+    if cached is not None:
+        return cached
+
+    # Generate a response using OpenAI's Chat Completion API
+    try:
+        with stage("completion"):
+            response = await completion_breaker.call(
+                get_async_openai_client().chat.completions.create,
+                model="gpt-4o-mini",  # Replace with the appropriate model
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": user_input}
+                ]
+            )
+    except UpstreamUnavailable as e:
+        return await fallback_answer(user_input, e)
+    response_text = response.choices[0].message.content
+
+    try:
+        await store_answer(user_input, response_text)
+    except Exception as e:
+        # Embeddings down or Weaviate failing: the answer is still good, it just isn't stored for next time
+        print(f"Failed to store answer: {e!r}")
+    return {"response": response_text, "cache_hit": False}
 
 
 @app.post("/chat", response_model=CompletionResponse)
@@ -284,37 +876,104 @@ async def chat(request: CompletionRequest):
     if not user_input:
         raise HTTPException(status_code=400, detail="No message provided")
 
-    # Generate a response using OpenAI's Chat Completion API
-    response = openai_client.chat.completions.create(
-        model="gpt-4o-mini",  # Replace with the appropriate model
-        messages=[
-            {"role": "system",
-             "content": """You are a DevOps helpful assistant. 
-             Send Response as html format don't send information as ```html,
-             Please necessary hyperlinks for information, don't add much
-             Give Answer more descriptive, so that user can understand properly, also added steps if needed"""},
-            {"role": "user", "content": user_input}
-        ]
-    )
-    response_text = response.choices[0].message.content
+    start = time.perf_counter()
+    try:
+        async with await admission.acquire("chat"):
+            result, coalesced = await chat_flight.do(normalize_text(user_input), lambda: answer(user_input))
+    except Overloaded as e:
+        raise service_unavailable(e)
+    except Exception as e:
+        if is_client_error(e):
+            raise client_error(e) from e
+        raise
 
-    # Generate the embedding for the combined prompt and response
-    combined_text = f"Prompt: {user_input} Response: {response_text}"
-    embedding = generate_embedding(combined_text)
+    return CompletionResponse(prompt=user_input, coalesced=coalesced,
+                              latency_ms=(time.perf_counter() - start) * 1000, **result)
 
-    # Store the prompt-response pair in Weaviate with the combined vector
-    data_object = {
-        "prompt": user_input,
-        "response": response_text,
-        "retrievalCount": 1  # Initialize retrieval count to 1 when the object is created
-    }
-    client.data_object.create(
-        data_object=data_object,
-        class_name="DevOpsPrompts_v2",
-        vector=embedding
-    )
 
-    return CompletionResponse(prompt=user_input, response=response_text)
+def sse_event(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: CompletionRequest):
+    # Server-Sent Events variant of /chat: tokens are forwarded as they arrive and the
+    # embedding + Weaviate insert run as a background task once the stream has closed
+    user_input = request.message
+    if not user_input:
+        raise HTTPException(status_code=400, detail="No message provided")
+
+    start = time.perf_counter()
+    try:
+        ticket = await admission.acquire("chat")
+    except Overloaded as e:
+        raise service_unavailable(e)
+
+    try:
+        cached = await cached_answer(user_input)
+        stream = None
+        if cached is None:
+            try:
+                stream = await completion_breaker.call(
+                    get_async_openai_client().chat.completions.create,
+                    model="gpt-4o-mini",  # Replace with the appropriate model
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": user_input}
+                    ],
+                    stream=True
+                )
+            except UpstreamUnavailable as e:
+                cached = await fallback_answer(user_input, e)
+    except BaseException as e:
+        ticket.release()
+        if is_client_error(e):
+            raise client_error(e) from e
+        raise
+
+    if cached is not None:
+        ticket.release()
+
+        async def cached_events():
+            yield sse_event({"token": cached["response"]})
+            # The answer already went out as the token
+            summary = {key: value for key, value in cached.items() if key != "response"}
+            yield sse_event({"done": True, "latency_ms": (time.perf_counter() - start) * 1000, **summary})
+
+        return StreamingResponse(cached_events(), media_type="text/event-stream")
+
+    chunks = []
+    completed = False
+
+    async def events():
+        nonlocal completed
+        try:
+            async for chunk in stream:
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if token:
+                    chunks.append(token)
+                    yield sse_event({"token": token})
+        finally:
+            ticket.release()
+            # A client that disconnects mid-stream cancels the generator; close the upstream response
+            # (shielded from that cancellation) so the completion stops instead of running on unread
+            with anyio.CancelScope(shield=True):
+                await stream.close()
+        completed = True
+        yield sse_event({"done": True, "cache_hit": False, "latency_ms": (time.perf_counter() - start) * 1000})
+
+    async def persist():
+        ticket.release()
+        # Only store answers that were generated completely
+        if completed and chunks:
+            try:
+                await store_answer(user_input, "".join(chunks))
+            except Exception as e:
+                # The client already has the answer, nothing is left to report the failure to
+                print(f"Failed to store answer: {e!r}")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"},
+                             background=BackgroundTask(persist))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,54 @@
+import uuid
+from embedding_cache import normalize_text
+
+CLASS_NAME = "DevOpsPrompts_v2"
+
+# Namespace for object ids: the same question always maps to the same object
+OBJECT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, f"smart-devops-recommender/{CLASS_NAME}")
+
+# Define the schema
+schema = {
+    "class": CLASS_NAME,
+    "properties": [
+        {
+            "name": "prompt",
+            "dataType": ["text"]
+        },
+        {
+            "name": "response",
+            "dataType": ["text"]
+        },
+        {
+            "name": "retrievalCount",
+            "dataType": ["int"]
+        },
+        {
+            # Lets ranking use the answer length without shipping the full response text
+            "name": "responseLength",
+            "dataType": ["int"]
+        },
+        {
+            # Unix milliseconds of the last flushed retrieval, unset until the object is first retrieved.
+            # retrievalCount can't tell: /chat creates objects with a count of 1.
+            "name": "lastRetrievedUnix",
+            "dataType": ["int"]
+        }
+    ]
+}
+
+
+def object_uuid(prompt):
+    # Deterministic id from the normalized, case-folded prompt, so storing a repeat question is an upsert
+    return str(uuid.uuid5(OBJECT_ID_NAMESPACE, normalize_text(prompt).casefold()))
+
+
+def ensure_schema(client):
+    if not client.schema.exists(CLASS_NAME):
+        client.schema.create_class(schema)
+        return
+
+    # Add properties introduced after the class was created
+    existing = {p["name"] for p in client.schema.get(CLASS_NAME)["properties"]}
+    for prop in schema["properties"]:
+        if prop["name"] not in existing:
+            client.schema.property.create(CLASS_NAME, prop)
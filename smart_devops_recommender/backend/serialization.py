@@ -0,0 +1,73 @@
+import os
+import re
+import math
+import json
+from fastapi.responses import Response
+from metrics import registry, Histogram
+
+# Response encoding for the hot endpoints. Results are plain dicts from ranking, so they are
+# projected to the requested fields and encoded in one go instead of being validated into
+# Pydantic models first. orjson is used when it is installed, the standard library otherwise.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Characters of response text kept in a compact result's preview
+PREVIEW_CHARS = int(os.getenv('RECOMMENDER_PREVIEW_CHARS', '160'))
+
+# Fields of a compact result, see project()
+COMPACT_FIELDS = ("id", "prompt", "preview", "weighted_score")
+
+TAG_PATTERN = re.compile(r"<[^>]+>")
+SPACE_PATTERN = re.compile(r"\s+")
+
+response_bytes = registry.register(
+    Histogram("backend_response_bytes", "Encoded response body size before compression", ("endpoint", "mode"),
+              buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576)))
+
+
+def finite(content):
+    # NaN and infinities as null, like orjson writes them
+    if isinstance(content, float):
+        return content if math.isfinite(content) else None
+    if isinstance(content, dict):
+        return {key: finite(value) for key, value in content.items()}
+    if isinstance(content, (list, tuple)):
+        return [finite(value) for value in content]
+    return content
+
+
+def dumps(content):
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    try:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+    except ValueError:
+        # Only walk the content when it actually holds a non-finite float
+        return json.dumps(finite(content), ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
+
+
+def preview(text, chars=PREVIEW_CHARS):
+    # Plain text start of a (usually HTML) response
+    text = SPACE_PATTERN.sub(" ", TAG_PATTERN.sub(" ", text or "")).strip()
+    if len(text) <= chars:
+        return text
+    return text[:chars].rstrip() + "…"
+
+
+def project(results, fields, preview_chars=PREVIEW_CHARS):
+    # Keep only the given fields of each result, "preview" is derived from the response text
+    return [
+        {field: preview(result.get("response"), preview_chars) if field == "preview" else result.get(field)
+         for field in fields}
+        for result in results
+    ]
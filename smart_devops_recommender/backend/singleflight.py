@@ -0,0 +1,23 @@
+import asyncio
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution."""
+
+    def __init__(self):
+        self.in_flight = {}
+
+    async def do(self, key, func):
+        # Returns (result, shared), shared is True when the caller joined an existing call
+        future = self.in_flight.get(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+
+        future = asyncio.ensure_future(func())
+        self.in_flight[key] = future
+        try:
+            return await asyncio.shield(future), False
+        finally:
+            # The first caller owns the key, later callers start a fresh call
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
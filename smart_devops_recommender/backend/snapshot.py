@@ -0,0 +1,220 @@
+import os
+import time
+import argparse
+import numpy as np
+from schema import CLASS_NAME, ensure_schema
+from client_setup import WEAVIATE_URL, create_weaviate_client
+from ingest import WEAVIATE_BATCH_SIZE, WEAVIATE_BATCH_WORKERS, check_batch_results
+
+# Snapshots of DevOpsPrompts_v2: ids, prompts, responses, counters, timestamps and vectors, so a
+# store can be rebuilt (e.g. after a schema change) without re-embedding anything.
+#
+#   python snapshot.py export prompts.arrow
+#   python snapshot.py import prompts.arrow
+#
+# The format follows the extension: .arrow/.ipc/.feather is an uncompressed Arrow IPC file, which
+# is memory-mapped on read (vectors are a zero-copy view of the page cache), .parquet is smaller
+# but decoded on read. Export pages through the class with a cursor and writes one record batch
+# per page, so memory stays flat. Weaviate sets creationTimeUnix itself, so imported objects keep
+# their counters but get a new creation time.
+
+SNAPSHOT_PAGE_SIZE = int(os.getenv('SNAPSHOT_PAGE_SIZE', '500'))
+
+IPC_EXTENSIONS = (".arrow", ".ipc", ".feather")
+
+
+def snapshot_schema(dim, metadata=None):
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.string()),
+        ("prompt", pa.string()),
+        ("response", pa.string()),
+        ("retrievalCount", pa.int64()),
+        ("responseLength", pa.int64()),
+        ("creationTimeUnix", pa.int64()),  # Milliseconds, as Weaviate reports it
+        ("lastUpdateTimeUnix", pa.int64()),
+        ("lastRetrievedUnix", pa.int64()),  # Null until first retrieved
+        ("vector", pa.list_(pa.float32(), dim))
+    ], metadata=metadata)
+
+
+def is_ipc(path):
+    return os.path.splitext(path)[1].lower() in IPC_EXTENSIONS
+
+
+def scan_pages(client, class_name, page_size=SNAPSHOT_PAGE_SIZE):
+    # Cursor over the whole class, one page of objects at a time
+    after = None
+    while True:
+        query = client.query.get(class_name, ["prompt", "response", "retrievalCount", "responseLength",
+                                              "lastRetrievedUnix"]) \
+            .with_additional(["id", "vector", "creationTimeUnix", "lastUpdateTimeUnix"]) \
+            .with_limit(page_size)
+        if after is not None:
+            query = query.with_after(after)
+        items = query.do()['data']['Get'][class_name]
+        if not items:
+            return
+        yield items
+        after = items[-1]["_additional"]["id"]
+
+
+def page_to_batch(items, schema):
+    import pyarrow as pa
+
+    dim = schema.field("vector").type.list_size
+    vectors = np.asarray([item["_additional"]["vector"] for item in items], dtype=np.float32).reshape(-1, dim)
+    return pa.RecordBatch.from_arrays([
+        pa.array([item["_additional"]["id"] for item in items], pa.string()),
+        pa.array([item["prompt"] for item in items], pa.string()),
+        pa.array([item["response"] for item in items], pa.string()),
+        pa.array([item["retrievalCount"] for item in items], pa.int64()),
+        # Objects stored before responseLength existed
+        pa.array([item["responseLength"] if item["responseLength"] is not None else len(item["response"] or "")
+                  for item in items], pa.int64()),
+        pa.array([int(item["_additional"]["creationTimeUnix"]) for item in items], pa.int64()),
+        pa.array([int(item["_additional"]["lastUpdateTimeUnix"] or 0) for item in items], pa.int64()),
+        pa.array([item.get("lastRetrievedUnix") for item in items], pa.int64()),
+        pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), dim)
+    ], schema=schema)
+
+
+def open_writer(path, schema, ipc):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if ipc:
+        return pa.ipc.new_file(path, schema)
+    return pq.ParquetWriter(path, schema, compression="zstd")
+
+
+def export_snapshot(client, path, class_name=CLASS_NAME, page_size=SNAPSHOT_PAGE_SIZE):
+    # Written to a temp file and renamed, so a reader never sees a partial snapshot
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    ensure_schema(client)  # Adds properties the cursor asks for to stores created before they existed
+    writer = None
+    exported = 0
+    try:
+        for items in scan_pages(client, class_name, page_size):
+            if writer is None:
+                # The vector width is only known once the first page is in
+                metadata = {"class_name": class_name, "exported_at": str(time.time())}
+                schema = snapshot_schema(len(items[0]["_additional"]["vector"]), metadata)
+                writer = open_writer(tmp_path, schema, is_ipc(path))
+            writer.write_batch(page_to_batch(items, schema))
+            exported += len(items)
+            print(f"Exported {exported} objects")
+        if writer is None:
+            writer = open_writer(tmp_path, snapshot_schema(0, {"class_name": class_name}), is_ipc(path))
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, path)
+    return exported
+
+
+def read_batches(path, batch_size=SNAPSHOT_PAGE_SIZE):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if is_ipc(path):
+        reader = pa.ipc.open_file(pa.memory_map(path))
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+    else:
+        yield from pq.ParquetFile(path).iter_batches(batch_size=batch_size)
+
+
+def load_snapshot(path):
+    # Whole snapshot as an Arrow table, memory-mapped rather than read for IPC files
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if is_ipc(path):
+        return pa.ipc.open_file(pa.memory_map(path)).read_all()
+    return pq.read_table(path, memory_map=True)
+
+
+def snapshot_vectors(data):
+    # (n, dim) float32 array of a table or record batch, a view of the mapped file when it is a single chunk
+    column = data.column("vector")
+    chunks = column.chunks if hasattr(column, "chunks") else [column]
+    dim = column.type.list_size
+    arrays = [chunk.values.to_numpy(zero_copy_only=False)[chunk.offset * dim:(chunk.offset + len(chunk)) * dim]
+              .reshape(-1, dim) for chunk in chunks]
+    if len(arrays) == 1:
+        return arrays[0]
+    return np.concatenate(arrays) if arrays else np.zeros((0, dim), dtype=np.float32)
+
+
+def snapshot_columns(data):
+    # Plain Python/NumPy columns of a table or record batch, as the in-process indexes take them
+    return {
+        "ids": data.column("id").to_pylist(),
+        "prompts": data.column("prompt").to_pylist(),
+        "responses": data.column("response").to_pylist(),
+        "retrieval_counts": data.column("retrievalCount").fill_null(0).to_numpy(),
+        "response_lengths": data.column("responseLength").fill_null(0).to_numpy(),
+        "creation_times": data.column("creationTimeUnix").to_numpy() / 1000,  # Convert to seconds
+        # Snapshots written before the column existed
+        "last_retrieved": data.column("lastRetrievedUnix").to_pylist() if "lastRetrievedUnix" in data.schema.names
+        else [None] * data.num_rows,
+        "vectors": snapshot_vectors(data)
+    }
+
+
+def import_snapshot(client, path, class_name=CLASS_NAME):
+    # Bulk-load a snapshot under its original ids with the stored vectors, nothing is re-embedded
+    ensure_schema(client)
+    client.batch.configure(
+        batch_size=WEAVIATE_BATCH_SIZE,
+        num_workers=WEAVIATE_BATCH_WORKERS,
+        dynamic=True,
+        callback=check_batch_results
+    )
+
+    imported = 0
+    start = time.perf_counter()
+    for record_batch in read_batches(path):
+        columns = snapshot_columns(record_batch)
+        with client.batch as batch:
+            for i, uuid in enumerate(columns["ids"]):
+                batch.add_data_object(
+                    data_object={
+                        "prompt": columns["prompts"][i],
+                        "response": columns["responses"][i],
+                        "retrievalCount": int(columns["retrieval_counts"][i]),
+                        "responseLength": int(columns["response_lengths"][i]),
+                        "lastRetrievedUnix": columns["last_retrieved"][i]
+                    },
+                    class_name=class_name,
+                    uuid=uuid,
+                    vector=columns["vectors"][i]
+                )
+        imported += len(columns["ids"])
+        elapsed = time.perf_counter() - start
+        print(f"Imported {imported} objects ({imported / elapsed:.1f} objects/sec)")
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import DevOpsPrompts_v2 snapshots (Arrow IPC or Parquet)")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="Snapshot file, .arrow/.ipc/.feather for Arrow IPC, otherwise Parquet")
+    parser.add_argument("--weaviate-url", default=WEAVIATE_URL)
+    parser.add_argument("--class-name", default=CLASS_NAME)
+    parser.add_argument("--page-size", type=int, default=SNAPSHOT_PAGE_SIZE, help="Objects per cursor page on export")
+    args = parser.parse_args()
+
+    client = create_weaviate_client(args.weaviate_url)
+    start = time.perf_counter()
+    if args.command == "export":
+        count = export_snapshot(client, args.path, args.class_name, args.page_size)
+    else:
+        count = import_snapshot(client, args.path, args.class_name)
+    print(f"Done: {count} objects in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The backend modules import each other as top-level modules, as they do under `uvicorn routes:app`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep tests off the on-disk embedding cache
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
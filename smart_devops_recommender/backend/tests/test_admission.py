@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+import admission
+from admission import AdmissionController, Overloaded
+
+# One shared slot, so every acquire after the first queues
+LANES = {"chat": (0, 1, 4, 1.0), "typeahead": (1, 1, 4, 1.0)}
+
+
+async def queued(controller, name):
+    # Start an acquire and let it reach the queue
+    task = asyncio.create_task(controller.acquire(name))
+    await asyncio.sleep(0)
+    return task
+
+
+def test_released_slot_goes_to_the_higher_priority_lane():
+    async def scenario():
+        controller = AdmissionController(capacity=1, lanes=LANES)
+        holder = await controller.acquire("typeahead")
+        typeahead = await queued(controller, "typeahead")
+        chat = await queued(controller, "chat")
+        assert controller.busy
+
+        holder.release()
+        chat_ticket = await chat
+        assert not typeahead.done()
+
+        chat_ticket.release()
+        (await typeahead).release()
+        assert controller.active == 0 and not controller.busy
+
+    asyncio.run(scenario())
+
+
+def test_new_request_does_not_jump_the_queue():
+    async def scenario():
+        controller = AdmissionController(capacity=1, lanes=LANES)
+        holder = await controller.acquire("chat")
+        waiter = await queued(controller, "chat")
+        holder.release()
+        # The freed slot is already promised to the waiter
+        late = await queued(controller, "chat")
+        (await waiter).release()
+        (await late).release()
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_and_full_queue_are_shed():
+    async def scenario():
+        controller = AdmissionController(capacity=1, lanes={"chat": (0, 1, 1, 0.01)})
+        holder = await controller.acquire("chat")
+        waiter = await queued(controller, "chat")
+        with pytest.raises(Overloaded, match="queue full"):
+            await controller.acquire("chat")
+        with pytest.raises(Overloaded, match="queue timeout"):
+            await waiter
+        assert controller.lanes["chat"].queued == 0
+        holder.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_grant_that_races_the_queue_timeout_is_kept(monkeypatch):
+    async def grant_then_timeout(awaitable, timeout):
+        # The slot is handed over in the same loop iteration the timeout fires
+        await awaitable
+        raise asyncio.TimeoutError
+
+    async def scenario():
+        controller = AdmissionController(capacity=1, lanes=LANES)
+        holder = await controller.acquire("chat")
+        monkeypatch.setattr(admission.asyncio, "wait_for", grant_then_timeout)
+        waiter = await queued(controller, "chat")
+        holder.release()
+        ticket = await waiter
+        assert controller.active == 1 and controller.lanes["chat"].active == 1
+        ticket.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_granted_to_a_cancelled_waiter_is_handed_on():
+    async def scenario():
+        controller = AdmissionController(capacity=1, lanes=LANES)
+        holder = await controller.acquire("chat")
+        first = await queued(controller, "chat")
+        second = await queued(controller, "chat")
+
+        # The first waiter is cancelled and granted the slot before it gets to run again
+        first.cancel()
+        holder.release()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        ticket = await second
+        assert controller.active == 1
+        ticket.release()
+        ticket.release()  # Idempotent
+        assert controller.active == 0 and controller.lanes["chat"].active == 0
+
+    asyncio.run(scenario())
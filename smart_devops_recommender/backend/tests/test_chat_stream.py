@@ -0,0 +1,103 @@
+import json
+import asyncio
+from types import SimpleNamespace
+import routes
+
+
+class FakeStream:
+    # Stand-in for the OpenAI AsyncStream: a few token chunks, then close()
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.closed = False
+
+    def __aiter__(self):
+        return self.chunks()
+
+    async def chunks(self):
+        for token in self.tokens:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+    async def close(self):
+        self.closed = True
+
+
+def events(body):
+    return [json.loads(line[len("data: "):]) for line in body.split("\n\n") if line]
+
+
+def test_disconnect_closes_the_upstream_stream(monkeypatch):
+    stream = FakeStream(["Use ", "kubectl ", "rollout ", "restart"])
+
+    async def no_cached_answer(user_input):
+        return None
+
+    async def call(func, *args, **kwargs):
+        return stream
+
+    monkeypatch.setattr(routes, "cached_answer", no_cached_answer)
+    monkeypatch.setattr(routes.completion_breaker, "call", call)
+    monkeypatch.setattr(routes, "get_async_openai_client", lambda: SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=None))))
+
+    async def read_two_tokens():
+        response = await routes.chat_stream(routes.CompletionRequest(message="How do I restart a pod?"))
+        body = response.body_iterator
+        first = [await body.__anext__(), await body.__anext__()]
+        # What Starlette does when the client goes away
+        await body.aclose()
+        return first
+
+    first = asyncio.run(read_two_tokens())
+    assert [event["token"] for event in events("".join(first))] == ["Use ", "kubectl "]
+    assert stream.closed
+
+
+def test_cached_answer_is_sent_once(monkeypatch):
+    async def cached_answer(user_input):
+        return {"response": "Delete the pod", "cache_hit": True, "cached_id": "a", "cached_distance": 0.0}
+
+    monkeypatch.setattr(routes, "cached_answer", cached_answer)
+
+    async def read_all():
+        response = await routes.chat_stream(routes.CompletionRequest(message="How do I restart a pod?"))
+        return "".join([chunk async for chunk in response.body_iterator])
+
+    token, done = events(asyncio.run(read_all()))
+    assert token == {"token": "Delete the pod"}
+    assert done["done"] and done["cache_hit"] and done["cached_id"] == "a"
+    assert "response" not in done
+
+
+def test_answer_is_returned_when_storing_it_fails(monkeypatch):
+    # /chat and /chat/stream both answer when the Weaviate insert after the completion fails
+    async def no_cached_answer(user_input):
+        return None
+
+    async def call(func, *args, **kwargs):
+        if kwargs.get("stream"):
+            return FakeStream(["Use ", "kubectl"])
+        message = SimpleNamespace(content="Use kubectl")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    stored = []
+
+    async def failing_store(user_input, response_text):
+        stored.append(response_text)
+        raise ConnectionError("weaviate unreachable")
+
+    monkeypatch.setattr(routes, "cached_answer", no_cached_answer)
+    monkeypatch.setattr(routes.completion_breaker, "call", call)
+    monkeypatch.setattr(routes, "store_answer", failing_store)
+    monkeypatch.setattr(routes, "get_async_openai_client", lambda: SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=None))))
+
+    from fastapi.testclient import TestClient
+    client = TestClient(routes.app)
+    response = client.post("/chat", json={"message": "How do I restart a pod?"})
+    assert response.status_code == 200
+    assert response.json()["response"] == "Use kubectl"
+
+    response = client.post("/chat/stream", json={"message": "How do I restart a pod?"})
+    assert response.status_code == 200
+    assert "".join(event.get("token", "") for event in events(response.text)) == "Use kubectl"
+    assert stored == ["Use kubectl", "Use kubectl"]
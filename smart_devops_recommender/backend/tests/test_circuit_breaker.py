@@ -0,0 +1,179 @@
+import asyncio
+import httpx
+import openai
+import pytest
+from types import SimpleNamespace
+from fastapi import HTTPException
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, UpstreamUnavailable, is_client_error, CLOSED, OPEN, HALF_OPEN
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(circuit_breaker, "time", SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+async def fail():
+    raise ConnectionError("connection refused")
+
+
+async def succeed():
+    return "ok"
+
+
+async def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(UpstreamUnavailable):
+            await breaker.call(fail)
+    assert breaker.state == OPEN
+
+
+def test_opens_after_consecutive_failures_and_fails_fast(clock):
+    calls = []
+
+    async def counted():
+        calls.append(True)
+        return "ok"
+
+    async def scenario():
+        breaker = CircuitBreaker("test", timeout=1, failure_threshold=2, reset_seconds=30)
+        await open_breaker(breaker)
+        with pytest.raises(UpstreamUnavailable, match="circuit open"):
+            await breaker.call(counted)
+        assert not calls and not breaker.available
+
+    asyncio.run(scenario())
+
+
+def test_timeout_counts_as_failure(clock):
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def scenario():
+        breaker = CircuitBreaker("test", timeout=0.01, failure_threshold=1)
+        with pytest.raises(UpstreamUnavailable, match="timeout"):
+            await breaker.call(slow)
+        assert breaker.state == OPEN
+
+    asyncio.run(scenario())
+
+
+def test_half_open_lets_one_probe_through(clock):
+    async def scenario():
+        breaker = CircuitBreaker("test", timeout=1, failure_threshold=2, reset_seconds=30)
+        await open_breaker(breaker)
+        clock.value += 30
+        assert breaker.available
+
+        released = asyncio.Event()
+
+        async def probe():
+            await released.wait()
+            return "ok"
+
+        in_flight = asyncio.create_task(breaker.call(probe))
+        await asyncio.sleep(0)
+        assert breaker.state == HALF_OPEN
+        # Only the probe reaches the upstream while it is in flight
+        with pytest.raises(UpstreamUnavailable, match="circuit open"):
+            await breaker.call(succeed)
+
+        released.set()
+        assert await in_flight == "ok"
+        assert breaker.state == CLOSED and breaker.failures == 0
+        assert await breaker.call(succeed) == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_failed_probe_reopens_for_another_reset_period(clock):
+    async def scenario():
+        breaker = CircuitBreaker("test", timeout=1, failure_threshold=2, reset_seconds=30)
+        await open_breaker(breaker)
+        clock.value += 30
+        with pytest.raises(UpstreamUnavailable):
+            await breaker.call(fail)
+        assert breaker.state == OPEN and not breaker.available
+        clock.value += 30
+        assert await breaker.call(succeed) == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_probe_frees_the_probe_slot(clock):
+    async def scenario():
+        breaker = CircuitBreaker("test", timeout=1, failure_threshold=2, reset_seconds=30)
+        await open_breaker(breaker)
+        clock.value += 30
+
+        in_flight = asyncio.create_task(breaker.call(asyncio.sleep, 10))
+        await asyncio.sleep(0)
+        in_flight.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await in_flight
+        # The caller went away, which says nothing about the upstream: the next call probes
+        assert breaker.available
+        assert await breaker.call(succeed) == "ok"
+        assert breaker.state == CLOSED
+
+    asyncio.run(scenario())
+
+
+def status_error(status):
+    request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+    response = httpx.Response(status, request=request, json={"error": {"message": "rejected"}})
+    return openai.APIStatusError("rejected", response=response, body=None)
+
+
+def test_client_errors_pass_through_without_opening(clock):
+    async def bad_request():
+        raise status_error(400)
+
+    async def scenario():
+        breaker = CircuitBreaker("test", timeout=1, failure_threshold=2)
+        for _ in range(5):
+            with pytest.raises(openai.APIStatusError) as raised:
+                await breaker.call(bad_request)
+            assert is_client_error(raised.value)
+        assert breaker.state == CLOSED and breaker.failures == 0
+        assert await breaker.call(succeed) == "ok"
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_rate_limits_and_server_errors_count_as_failures(clock, status):
+    async def rejected():
+        raise status_error(status)
+
+    async def scenario():
+        breaker = CircuitBreaker("test", timeout=1, failure_threshold=2)
+        for _ in range(2):
+            with pytest.raises(UpstreamUnavailable):
+                await breaker.call(rejected)
+        assert breaker.state == OPEN
+
+    asyncio.run(scenario())
+
+
+def test_http_exception_is_not_an_upstream_client_error():
+    assert not is_client_error(HTTPException(status_code=400, detail="No message provided"))
+
+
+def test_rejected_input_is_a_400_not_a_503(monkeypatch):
+    import routes
+    from fastapi.testclient import TestClient
+
+    async def rejected(*args, **kwargs):
+        raise status_error(400)
+
+    monkeypatch.setattr(routes, "suggest", rejected)
+    monkeypatch.setattr(routes, "answer", rejected)
+    monkeypatch.setattr(routes.result_cache, "max_size", 0)
+    client = TestClient(routes.app)
+    response = client.post("/recommender", json={"message": "x" * 100, "top_n": 3, "weights": routes.DEFAULT_WEIGHTS,
+                                                 "distance_filter": 0.5})
+    assert response.status_code == 400
+    assert client.post("/chat", json={"message": "x" * 100}).status_code == 400
@@ -0,0 +1,60 @@
+import time
+from compaction import Compactor, is_expired
+from routes import answer_object
+
+DAY_MS = 86400 * 1000
+
+
+class FakeQuery:
+    # Near-vector lookups find no duplicates
+    def __init__(self, class_name):
+        self.class_name = class_name
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def do(self):
+        return {"data": {"Get": {self.class_name: []}}}
+
+
+class FakeClient:
+    def __init__(self):
+        self.updates = []
+        self.deleted = []
+        self.query = self
+        self.data_object = self
+        self.batch = self
+
+    def get(self, class_name, fields):
+        return FakeQuery(class_name)
+
+    def update(self, data_object, class_name, uuid):
+        self.updates.append((uuid, data_object))
+
+    def delete_objects(self, class_name, where):
+        self.deleted.extend(where["valueTextArray"])
+
+
+def stored(object_id, properties, age_days, last_retrieved=None):
+    # An object as the compaction cursor returns it
+    return {**properties, "lastRetrievedUnix": last_retrieved,
+            "_additional": {"id": object_id, "vector": [1.0, 0.0],
+                            "creationTimeUnix": str(int(time.time() * 1000 - age_days * DAY_MS)),
+                            "lastUpdateTimeUnix": None}}
+
+
+def test_old_chat_object_never_retrieved_is_evicted():
+    client = FakeClient()
+    old = stored("old", answer_object("How do I rotate secrets?", "Use vault."), age_days=100)
+    result = Compactor(client, retention_days=30).compact([old])
+    assert result["evicted"] == 1
+    assert client.deleted == ["old"]
+
+
+def test_retrieved_or_recent_objects_are_kept():
+    cutoff = time.time() - 30 * 86400
+    chat = answer_object("How do I rotate secrets?", "Use vault.")
+    assert not is_expired(stored("recent", chat, age_days=1), cutoff)
+    assert not is_expired(stored("retrieved", chat, age_days=100, last_retrieved=int(time.time() * 1000)), cutoff)
+    # Objects from before lastRetrievedUnix existed count as retrieved once their count passed the initial 1
+    assert not is_expired(stored("legacy", {**chat, "retrievalCount": 7}, age_days=100), cutoff)
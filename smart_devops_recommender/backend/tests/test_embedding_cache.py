@@ -0,0 +1,57 @@
+import time
+import threading
+import embedding_cache
+from embedding_cache import EmbeddingCache
+
+
+def test_sqlite_tier_keeps_the_newest_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "PRUNE_EVERY_ROWS", 2)
+    cache = EmbeddingCache(max_size=0, path=str(tmp_path / "cache.sqlite3"), max_rows=3)
+    for i in range(6):
+        cache.put(f"text {i}", "model", [float(i)])
+
+    # Pruned after every second write
+    assert cache.stats()["disk_entries"] == 3
+    assert cache.prune() == 0
+    assert cache.get("text 0", "model") is None
+    assert cache.get("text 5", "model") == [5.0]
+
+
+def test_sqlite_tier_drops_rows_past_the_age_limit_on_open(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(max_size=0, path=path, max_age_days=1)
+    cache.put("recent", "model", [1.0])
+    cache.put("old", "model", [2.0])
+    cache.db.execute("UPDATE embeddings SET created_at = ? WHERE key = ?",
+                     (time.time() - 2 * 86400, embedding_cache.cache_key("old", "model")))
+    cache.db.commit()
+
+    reopened = EmbeddingCache(max_size=0, path=path, max_age_days=1)
+    assert reopened.get("old", "model") is None
+    assert reopened.get("recent", "model") == [1.0]
+
+
+def test_get_memory_does_not_read_sqlite(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    EmbeddingCache(path=path).put("text", "model", [1.0])
+    cache = EmbeddingCache(path=path)
+    assert cache.get_memory("text", "model") is None
+    assert cache.get("text", "model") == [1.0]
+    assert cache.get_memory("text", "model") == [1.0]
+
+
+def test_get_memory_is_not_blocked_by_sqlite_writes(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "cache.sqlite3"))
+    cache.put("text", "model", [1.0])
+
+    # Stands in for a long executemany/commit/prune holding the SQLite tier
+    with cache.db_lock:
+        writer = threading.Thread(target=cache.put, args=("other", "model", [2.0]))
+        writer.start()
+        found = []
+        reader = threading.Thread(target=lambda: found.append(cache.get_memory("text", "model")))
+        reader.start()
+        reader.join(timeout=2)
+        assert found == [[1.0]]
+    writer.join()
+    assert cache.stats()["disk_entries"] == 2
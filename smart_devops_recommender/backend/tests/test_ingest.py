@@ -0,0 +1,108 @@
+import json
+import ingest
+from ingest import import_records
+from schema import CLASS_NAME, object_uuid
+
+
+class FakeQuery:
+    def __init__(self, client):
+        self.client = client
+        self.ids = None
+
+    def with_where(self, where):
+        self.ids = set(where["valueTextArray"])
+        return self
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def do(self):
+        items = [{**properties, "_additional": {"id": uuid}} for uuid, properties in self.client.objects.items()
+                 if uuid in self.ids]
+        return {"data": {"Get": {CLASS_NAME: items}}}
+
+
+class FakeClient:
+    # Batch writes replace the whole object, like Weaviate's batch import
+    def __init__(self, objects=None):
+        self.objects = dict(objects or {})
+        self.query = self
+        self.batch = self
+
+    def get(self, class_name, fields):
+        return FakeQuery(self)
+
+    def configure(self, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add_data_object(self, data_object, class_name, uuid, vector):
+        self.objects[uuid] = data_object
+
+
+def fake_embeddings(monkeypatch):
+    monkeypatch.setattr(ingest, "generate_embeddings", lambda texts: [[1.0, 0.0] for _ in texts])
+
+
+def test_reimport_keeps_stored_retrieval_counters(monkeypatch):
+    fake_embeddings(monkeypatch)
+    known, new = "How do I rotate secrets?", "How do I scale pods?"
+    client = FakeClient({object_uuid(known): {"prompt": known, "response": "Use vault.",
+                                              "retrievalCount": 9, "lastRetrievedUnix": 1700000000}})
+
+    import_records(client, iter([
+        {"prompt": known, "response": "Use a secrets manager.", "retrievalCount": 2},
+        {"prompt": new, "response": "Use an HPA.", "retrievalCount": 3},
+    ]))
+
+    stored = client.objects[object_uuid(known)]
+    assert stored["response"] == "Use a secrets manager."
+    assert stored["retrievalCount"] == 9
+    assert stored["lastRetrievedUnix"] == 1700000000
+    assert client.objects[object_uuid(new)]["retrievalCount"] == 3
+    assert "lastRetrievedUnix" not in client.objects[object_uuid(new)]
+
+
+class RejectingClient(FakeClient):
+    # Drops the writes of the given prompts and reports them to the batch callback on flush
+    def __init__(self, rejected):
+        super().__init__()
+        self.rejected = {object_uuid(prompt) for prompt in rejected}
+        self.callback = None
+        self.pending = []
+
+    def configure(self, callback=None, **kwargs):
+        self.callback = callback
+
+    def add_data_object(self, data_object, class_name, uuid, vector):
+        self.pending.append(uuid)
+        if uuid not in self.rejected:
+            super().add_data_object(data_object, class_name, uuid, vector)
+
+    def __exit__(self, *exc_info):
+        self.callback([{"id": uuid, "result": {"errors": {"error": [{"message": "invalid"}]}}
+                        if uuid in self.rejected else {}} for uuid in self.pending])
+        self.pending = []
+        return False
+
+
+def test_rejected_records_go_to_reject_file(monkeypatch, tmp_path):
+    fake_embeddings(monkeypatch)
+    records = [{"prompt": f"prompt {i}", "response": f"response {i}"} for i in range(5)]
+    client = RejectingClient(rejected=["prompt 1", "prompt 3"])
+    checkpoint, rejects = str(tmp_path / "checkpoint"), str(tmp_path / "rejects.jsonl")
+
+    stats = import_records(client, iter(records), embed_batch_size=2, embed_concurrency=1,
+                           checkpoint=checkpoint, source="prompts.jsonl", rejects=rejects)
+
+    assert stats["imported"] == 3 and stats["rejected"] == 2
+    with open(rejects) as f:
+        lines = [json.loads(line) for line in f]
+    assert [line["prompt"] for line in lines] == ["prompt 1", "prompt 3"]
+    assert lines[0]["error"] == {"error": [{"message": "invalid"}]}
+    assert ingest.load_checkpoint(checkpoint, "prompts.jsonl") == 5
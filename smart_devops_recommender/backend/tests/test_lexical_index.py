@@ -0,0 +1,95 @@
+import pytest
+import routes
+from lexical_index import LexicalIndex, content_tokens, tokenize
+
+PROMPTS = [
+    "How do I restart a pod in Kubernetes?",
+    "What is a Kubernetes deployment and how do I scale it?",
+    "How to debug a pod stuck in CrashLoopBackOff",
+    "How do I rotate secrets in HashiCorp Vault?",
+    "What is the difference between a Docker image and a container?",
+    "How to configure a Terraform remote state backend in S3",
+    "How do I roll back a Helm release?",
+    "What is the best way to monitor Kubernetes nodes with Prometheus?",
+    "How to set up a GitHub Actions pipeline for a Python project",
+    "How do I drain a Kubernetes node before maintenance?",
+    "What is a service mesh and do I need Istio?",
+    "How to reduce Docker image size with multi-stage builds",
+]
+
+
+@pytest.fixture
+def index():
+    index = LexicalIndex()
+    for i, prompt in enumerate(PROMPTS):
+        index.add(str(i), prompt, response_length=100)
+    index.loaded = True
+    return index
+
+
+def top_ids(index, query, limit=3):
+    return [item["id"] for item in index.search(query, limit)]
+
+
+def test_bm25_ranks_the_matching_prompt_first(index):
+    assert top_ids(index, "rotate vault secrets")[0] == "3"
+    assert top_ids(index, "helm rollback release")[0] == "6"
+    # A rare term outweighs a common one: "crashloopbackoff" is in one prompt, "pod" in two
+    assert top_ids(index, "pod crashloopbackoff")[0] == "2"
+
+
+def test_shorter_prompt_scores_higher_for_the_same_match():
+    index = LexicalIndex()
+    index.add("short", "docker image size", 10)
+    index.add("long", "docker image size and everything else about registries and tags", 10)
+    scores = index.scores("docker image size", ["short", "long"])
+    assert scores["short"] > scores["long"]
+
+
+def test_last_token_matches_as_a_prefix(index):
+    assert top_ids(index, "terraform remote sta")[0] == "5"
+    # Earlier tokens must match whole, "terra" adds nothing
+    assert index.scores("terra remote", ["5"])["5"] < index.scores("terraform remote", ["5"])["5"] / 2
+    assert index.search("zzz") == []
+
+
+def test_removed_prompt_is_not_returned(index):
+    index.remove("3")
+    assert "3" not in top_ids(index, "rotate vault secrets")
+    assert len(index) == len(PROMPTS) - 1
+    index.add("3", PROMPTS[3], 100)
+    assert top_ids(index, "rotate vault secrets")[0] == "3"
+
+
+def test_coverage_measures_the_prompt_side(index):
+    coverage = index.coverage("how do i restart a pod in kubernetes", ["0", "9"])
+    assert coverage["0"] == pytest.approx(1.0)
+    assert coverage["9"] < 0.5
+    # Every query token is in prompt 1, which holds much more than the query
+    assert index.scores("what is kubernetes", ["1"])["1"] == pytest.approx(1.0, abs=0.2)
+    assert index.coverage("what is kubernetes", ["1"])["1"] < 0.5
+
+
+def test_content_tokens_skip_stopwords_and_started_prefixes():
+    assert content_tokens(tokenize("what is k")) == []
+    assert content_tokens(tokenize("How do I r")) == []
+    assert content_tokens(tokenize("restart pod kube")) == ["restart", "pod", "kube"]
+
+
+@pytest.fixture
+def fast_path(index, monkeypatch):
+    monkeypatch.setattr(routes, "lexical_index", index)
+    monkeypatch.setattr(routes, "LEXICAL_INDEX_ENABLED", True)
+    return lambda message: routes.lexical_fast_path(message, 1.0, 5)
+
+
+@pytest.mark.parametrize("prefix", ["what is k", "how to d", "How do I r", "what is kubernetes", "how do i scale",
+                                    "restart kubernetes"])
+def test_stopword_prefixes_and_partial_matches_take_the_semantic_path(fast_path, prefix):
+    assert fast_path(prefix) is None
+
+
+def test_near_verbatim_prompt_takes_the_fast_path(fast_path):
+    items = fast_path("how do I roll back a helm release")
+    assert items and items[0]["id"] == "6"
+    assert fast_path("How do I restart a pod in Kubern")[0]["id"] == "0"
@@ -0,0 +1,93 @@
+import numpy as np
+from local_index import LocalVectorIndex
+from vector_codec import normalize
+
+DIM = 32
+
+
+def corpus(n, seed=0):
+    # Clustered unit vectors, so IVF lists are meaningful
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((8, DIM))
+    return normalize(centers[rng.integers(0, 8, n)] + 0.3 * rng.standard_normal((n, DIM)))
+
+
+def build(vectors, **options):
+    index = LocalVectorIndex(dim=DIM, **options)
+    for i, vector in enumerate(vectors):
+        index.add(f"id-{i}", vector, f"prompt {i}", f"response {i}", retrieval_count=i)
+    return index
+
+
+def exact_ids(vectors, query, k):
+    distances = 1 - vectors @ normalize(query)
+    return [f"id-{i}" for i in np.argsort(distances)[:k]]
+
+
+def test_exact_search_matches_brute_force():
+    vectors = corpus(300)
+    index = build(vectors, approximate_threshold=10_000)
+    for query in corpus(5, seed=1):
+        results = index.search(query, limit=10)
+        assert [result["id"] for result in results] == exact_ids(vectors, query, 10)
+        distances = [result["distance"] for result in results]
+        assert distances == sorted(distances)
+        assert results[0]["retrieval_count"] == int(results[0]["id"].split("-")[1])
+
+
+def test_max_distance_filters_results():
+    vectors = corpus(300)
+    index = build(vectors, approximate_threshold=10_000)
+    query = corpus(1, seed=1)[0]
+    cutoff = sorted(1 - vectors @ query)[4]
+    results = index.search(query, limit=10, max_distance=cutoff)
+    assert len(results) == 5
+    assert all(result["distance"] <= cutoff for result in results)
+
+
+def test_ivf_search_probing_every_list_is_exact_and_few_lists_keep_recall():
+    vectors = corpus(400)
+    exhaustive = build(vectors, approximate_threshold=100, n_probe=1000)
+    exhaustive.build_ivf(n_lists=8)
+    assert exhaustive.centroids is not None
+    probed = build(vectors, approximate_threshold=100, n_probe=3)
+    probed.build_ivf(n_lists=8)
+
+    recall = []
+    for query in corpus(10, seed=1):
+        expected = exact_ids(vectors, query, 10)
+        assert [result["id"] for result in exhaustive.search(query, limit=10)] == expected
+        found = {result["id"] for result in probed.search(query, limit=10)}
+        recall.append(len(found & set(expected)) / 10)
+    assert np.mean(recall) >= 0.9
+
+
+def test_ivf_assigns_rows_added_after_the_build():
+    vectors = corpus(400)
+    index = build(vectors, approximate_threshold=100, n_probe=2)
+    index.build_ivf(n_lists=8)
+    query = corpus(1, seed=2)[0]
+    index.add("new", query, "new prompt", "new response")
+    assert index.search(query, limit=1)[0]["id"] == "new"
+
+
+def test_add_updates_in_place_and_remove_keeps_rows_consistent():
+    vectors = corpus(50)
+    index = build(vectors, approximate_threshold=10_000)
+
+    # Updating an existing id keeps its row and counter unless a new one is given
+    index.add("id-7", vectors[7], "prompt 7 edited", "response 7 edited")
+    assert len(index) == 50
+    hit = index.search(vectors[7], limit=1)[0]
+    assert (hit["id"], hit["prompt"], hit["retrieval_count"]) == ("id-7", "prompt 7 edited", 7)
+
+    # Removing swaps the last row into the hole; every other id still finds itself
+    index.remove("id-7")
+    index.remove("id-49")
+    index.remove("missing")
+    assert len(index) == 48
+    assert "id-7" not in {result["id"] for result in index.search(vectors[7], limit=48)}
+    for i in (0, 13, 48):
+        hit = index.search(vectors[i], limit=1)[0]
+        assert (hit["id"], hit["response"], hit["retrieval_count"]) == (f"id-{i}", f"response {i}", i)
+        assert hit["distance"] < 1e-5
@@ -0,0 +1,42 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from metrics import instrument, registry, request_seconds
+
+
+def test_requests_are_labelled_by_route_template():
+    app = FastAPI()
+    instrument(app)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        return {"id": item_id}
+
+    client = TestClient(app)
+    for item_id in ("3f1c", "9a7e", "c0de"):
+        assert client.get(f"/items/{item_id}").status_code == 200
+    client.get("/no/such/path")
+
+    rendered = registry.render()
+    assert 'backend_requests_total{endpoint="/items/{item_id}",status="200"} 3' in rendered
+    assert 'endpoint="unmatched"' in rendered
+    assert "3f1c" not in rendered and "/no/such/path" not in rendered
+
+
+def test_streaming_requests_are_timed_until_the_body_ends():
+    app = FastAPI()
+    instrument(app)
+
+    @app.get("/stream")
+    async def stream():
+        async def body():
+            yield "first\n"
+            await asyncio.sleep(0.3)
+            yield "last\n"
+        return StreamingResponse(body())
+
+    response = TestClient(app).get("/stream")
+    assert response.text == "first\nlast\n"
+    assert float(response.headers["server-timing"].split("total;dur=")[1]) < 300
+    assert request_seconds.series[("/stream",)]["sum"] >= 0.3
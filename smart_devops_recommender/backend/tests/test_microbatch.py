@@ -0,0 +1,63 @@
+import asyncio
+from microbatch import MicroBatcher
+
+
+class Recorder:
+    # Batch function that records what it was sent
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+
+    async def __call__(self, items):
+        self.batches.append(items)
+        if self.error is not None:
+            raise self.error
+        return [item.upper() for item in items]
+
+
+def test_concurrent_inputs_share_one_call_and_repeats_are_sent_once():
+    async def scenario():
+        func = Recorder()
+        batcher = MicroBatcher("test", func, window=0.01, max_batch_size=10)
+        results = await asyncio.gather(*(batcher.submit(item) for item in ["a", "b", "a"]))
+        assert results == ["A", "B", "A"]
+        assert func.batches == [["a", "b"]]
+
+    asyncio.run(scenario())
+
+
+def test_full_batch_is_sent_without_waiting_for_the_window():
+    async def scenario():
+        func = Recorder()
+        batcher = MicroBatcher("test", func, window=10, max_batch_size=2)
+        assert await asyncio.wait_for(asyncio.gather(batcher.submit("a"), batcher.submit("b")), 1) == ["A", "B"]
+        assert batcher.timer is None
+
+    asyncio.run(scenario())
+
+
+def test_inputs_whose_callers_went_away_are_not_sent():
+    async def scenario():
+        func = Recorder()
+        batcher = MicroBatcher("test", func, window=0.01, max_batch_size=10)
+        superseded = asyncio.create_task(batcher.submit("kube"))
+        # Two callers of the same input, only one of them goes away
+        shared = [asyncio.create_task(batcher.submit("kubectl")) for _ in range(2)]
+        await asyncio.sleep(0)
+        superseded.cancel()
+        shared[0].cancel()
+
+        assert await shared[1] == "KUBECTL"
+        assert func.batches == [["kubectl"]]
+        assert superseded.cancelled() and shared[0].cancelled()
+
+    asyncio.run(scenario())
+
+
+def test_failure_reaches_every_caller():
+    async def scenario():
+        batcher = MicroBatcher("test", Recorder(ConnectionError("reset")), window=0.01, max_batch_size=10)
+        results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+        assert all(isinstance(result, ConnectionError) for result in results)
+
+    asyncio.run(scenario())
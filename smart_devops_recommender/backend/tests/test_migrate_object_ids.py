@@ -0,0 +1,116 @@
+from migrate_object_ids import migrate
+from schema import CLASS_NAME, object_uuid
+
+
+class FakeQuery:
+    # The cursor and id filters the migration uses, over the fake store
+    def __init__(self, client, class_name):
+        self.client = client
+        self.class_name = class_name
+        self.ids = None
+        self.after = None
+        self.limit = None
+
+    def with_additional(self, fields):
+        return self
+
+    def with_where(self, where):
+        self.ids = set(where["valueTextArray"])
+        return self
+
+    def with_limit(self, limit):
+        self.limit = limit
+        return self
+
+    def with_after(self, after):
+        self.after = after
+        return self
+
+    def do(self):
+        items = [{**properties, "_additional": {"id": uuid, "vector": [1.0, 0.0], "creationTimeUnix": str(created)}}
+                 for uuid, (properties, created) in sorted(self.client.objects.items())
+                 if (self.ids is None or uuid in self.ids) and (self.after is None or uuid > self.after)]
+        return {"data": {"Get": {self.class_name: items[:self.limit]}}}
+
+
+class FakeClient:
+    def __init__(self, objects):
+        self.objects = {uuid: (properties, i) for i, (uuid, properties) in enumerate(objects.items())}
+        self.fail_deletes = False
+        self.rejected = set()  # uuids whose writes the batch drops, like a per-object error
+        self.query = self
+        self.batch = self
+
+    def get(self, class_name, fields):
+        return FakeQuery(self, class_name)
+
+    def configure(self, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add_data_object(self, data_object, class_name, uuid, vector):
+        if uuid in self.rejected:
+            return
+        created = self.objects.get(uuid, (None, len(self.objects)))[1]
+        self.objects[uuid] = (data_object, created)
+
+    def delete_objects(self, class_name, where):
+        if self.fail_deletes:
+            raise ConnectionError("connection reset")
+        for uuid in where["valueTextArray"]:
+            self.objects.pop(uuid, None)
+
+
+def test_rerun_after_interrupted_chunk_does_not_double_count(tmp_path):
+    prompt = "How do I rotate secrets?"
+    client = FakeClient({
+        "legacy-1": {"prompt": prompt, "response": "Use vault.", "retrievalCount": 4},
+        "legacy-2": {"prompt": prompt, "response": "Use vault!", "retrievalCount": 3},
+    })
+    checkpoint = str(tmp_path / "migrate.checkpoint")
+
+    # Interrupted after the merged object was written, before its copies were deleted
+    client.fail_deletes = True
+    try:
+        migrate(client, CLASS_NAME, checkpoint=checkpoint)
+    except ConnectionError:
+        pass
+    assert client.objects[object_uuid(prompt)][0]["retrievalCount"] == 7
+    assert "legacy-1" in client.objects
+
+    client.fail_deletes = False
+    migrate(client, CLASS_NAME, checkpoint=checkpoint)
+    migrate(client, CLASS_NAME, checkpoint=checkpoint)
+    assert list(client.objects) == [object_uuid(prompt)]
+    assert client.objects[object_uuid(prompt)][0]["retrievalCount"] == 7
+
+
+def test_rejected_write_keeps_copies_and_latest_retrieval_is_carried(tmp_path):
+    rejected, kept = "How do I rotate secrets?", "How do I scale pods?"
+    client = FakeClient({
+        "legacy-1": {"prompt": rejected, "response": "Use vault.", "retrievalCount": 4},
+        "legacy-2": {"prompt": rejected, "response": "Use vault!", "retrievalCount": 3},
+        "legacy-3": {"prompt": kept, "response": "Use an HPA.", "retrievalCount": 2, "lastRetrievedUnix": 100},
+        "legacy-4": {"prompt": kept, "response": "Use an HPA!", "retrievalCount": 5, "lastRetrievedUnix": 300},
+        "legacy-5": {"prompt": kept, "response": "Use an HPA?", "retrievalCount": 1, "lastRetrievedUnix": None},
+    })
+    checkpoint = str(tmp_path / "migrate.checkpoint")
+
+    client.rejected = {object_uuid(rejected)}
+    migrate(client, CLASS_NAME, checkpoint=checkpoint)
+    assert {"legacy-1", "legacy-2"} <= set(client.objects)
+    merged = client.objects[object_uuid(kept)][0]
+    assert merged["retrievalCount"] == 8
+    assert merged["lastRetrievedUnix"] == 300
+    assert not {"legacy-3", "legacy-4", "legacy-5"} & set(client.objects)
+
+    client.rejected = set()
+    migrate(client, CLASS_NAME, checkpoint=checkpoint)
+    assert sorted(client.objects) == sorted([object_uuid(rejected), object_uuid(kept)])
+    assert client.objects[object_uuid(rejected)][0]["retrievalCount"] == 7
+    assert "lastRetrievedUnix" not in client.objects[object_uuid(rejected)][0]
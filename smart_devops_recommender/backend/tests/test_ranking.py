@@ -0,0 +1,60 @@
+import json
+import math
+import numpy as np
+import pytest
+import serialization
+from ranking import DEFAULT_WEIGHTS, Rescorer, rank_candidate_sets, rank_candidates
+
+NOW = 1_700_000_000.0
+
+
+def fresh_items():
+    # Nothing retrieved yet and everything created at the same moment: every max is 0
+    return [{"id": str(i), "prompt": f"prompt {i}", "distance": 0.1 * i, "creation_time": NOW,
+             "response_length": 100 + i, "retrieval_count": 0} for i in range(3)]
+
+
+def test_zero_counts_and_ages_give_finite_scores():
+    for results in (rank_candidates(fresh_items(), DEFAULT_WEIGHTS, 3, NOW),
+                    Rescorer(fresh_items(), DEFAULT_WEIGHTS, NOW).rank(3, NOW)):
+        assert [result["id"] for result in results] == ["0", "1", "2"]
+        for result in results:
+            assert result["retrieval_count_score"] == 0
+            assert result["time_elapsed_since_added_score"] == 1
+            assert math.isfinite(result["weighted_score"])
+
+
+def random_items(n, seed=0):
+    rng = np.random.default_rng(seed)
+    items = [{"id": str(i), "prompt": f"prompt {i}", "distance": float(rng.uniform(0.05, 0.6)),
+              "creation_time": NOW - float(rng.uniform(0, 90 * 86400)), "response_length": int(rng.integers(50, 2000)),
+              "retrieval_count": int(rng.integers(0, 40)), "lexical_score": float(rng.uniform())} for i in range(n)]
+    # The same object returned twice is ranked once
+    return items + items[:3]
+
+
+@pytest.mark.parametrize("weights", [DEFAULT_WEIGHTS, {**DEFAULT_WEIGHTS, "time_elapsed_since_added": 8, "lexical": 3}])
+@pytest.mark.parametrize("later", [0, 3600, 30 * 86400])
+def test_rescorer_ranks_like_rank_candidates(weights, later):
+    items = random_items(40)
+    expected = rank_candidates(items, weights, 10, NOW + later)
+    # Scored at NOW, ranked again `later` seconds on
+    ranked = Rescorer(items, weights, NOW).rank(10, NOW + later)
+
+    assert [result["id"] for result in ranked] == [result["id"] for result in expected]
+    for result, reference in zip(ranked, expected):
+        for key in ("weighted_score", "time_elapsed_since_added_score", "time_elapsed_seconds"):
+            assert result[key] == pytest.approx(reference[key])
+        assert result["contributions"] == reference["contributions"]
+        assert result["time_elapsed"] == reference["time_elapsed"]
+
+    batched = rank_candidate_sets([items, items[:10]], weights, 10, NOW + later)[0]
+    assert [result["id"] for result in batched] == [result["id"] for result in expected]
+
+
+def test_stdlib_dumps_writes_non_finite_floats_as_null(monkeypatch):
+    monkeypatch.setattr(serialization, "orjson", None)
+    content = [{"score": float("nan"), "contributions": [{"value": float("inf")}, {"value": 0.5}]}]
+    assert json.loads(serialization.dumps(content)) == [
+        {"score": None, "contributions": [{"value": None}, {"value": 0.5}]}]
+    assert serialization.dumps({"a": 1}) == b'{"a":1}'
@@ -0,0 +1,50 @@
+import json
+import asyncio
+from fastapi.testclient import TestClient
+import routes
+
+NOW = 1_700_000_000.0
+
+
+def test_lines_follow_input_order_with_per_message_errors(monkeypatch):
+    # Chunks of two: [q0, bad search] [q2, unembeddable] [q4]
+    messages = ["q0", "bad search", "q2", "unembeddable", "q4"]
+
+    async def embeddings(texts):
+        if "unembeddable" in texts:
+            raise ConnectionError("embedding call failed")
+        return [[float(messages.index(text))] for text in texts]
+
+    async def search_candidates(embedding, distance_filter, limit):
+        position = int(embedding[0])
+        if messages[position] == "bad search":
+            raise ValueError("search failed")
+        # Later messages finish first, the output still follows the input
+        await asyncio.sleep(0.01 * (len(messages) - position))
+        return [{"id": f"{position}-{i}", "prompt": f"answer {i} to q{position}", "distance": 0.1 * (i + 1),
+                 "creation_time": NOW, "response_length": 100, "retrieval_count": 0} for i in range(3)]
+
+    async def hydrate_responses(results):
+        for result in results:
+            result["response"] = f"response {result['id']}"
+
+    monkeypatch.setattr(routes, "BATCH_CHUNK_SIZE", 2)
+    monkeypatch.setattr(routes, "generate_embeddings_async", embeddings)
+    monkeypatch.setattr(routes, "search_candidates", search_candidates)
+    monkeypatch.setattr(routes, "hydrate_responses", hydrate_responses)
+
+    response = TestClient(routes.app).post("/recommender/batch", json={
+        "messages": messages, "top_n": 2, "weights": routes.DEFAULT_WEIGHTS, "distance_filter": 0.5})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+
+    assert [(line["index"], line["message"]) for line in lines] == list(enumerate(messages))
+    # A failed search only fails its own message, a failed embedding call its whole chunk
+    assert lines[1]["error"] == "search failed"
+    assert lines[2]["error"] == lines[3]["error"] == "embedding call failed"
+    for line in (lines[0], lines[4]):
+        assert "error" not in line
+        position = line["index"]
+        assert [result["id"] for result in line["results"]] == [f"{position}-0", f"{position}-1"]
+        assert line["results"][0]["response"] == f"response {position}-0"
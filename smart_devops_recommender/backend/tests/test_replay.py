@@ -0,0 +1,53 @@
+import json
+import numpy as np
+import pytest
+from replay import evaluate, feature_matrix, load_log, parse_grid
+
+
+def candidate_sets(n_queries=20, n_candidates=10, seed=0):
+    # Feature rows per query where the candidate with the best distance score is the relevant one
+    rng = np.random.default_rng(seed)
+    features = rng.random((n_queries * n_candidates, 5)).astype(np.float32)
+    queries = np.repeat(np.arange(n_queries), n_candidates)
+    relevance = np.zeros(len(queries), dtype=np.float32)
+    for query in range(n_queries):
+        rows = np.flatnonzero(queries == query)
+        relevance[rows[np.argmax(features[rows, 0])]] = 1
+    return features, queries, relevance
+
+
+def test_uniform_scores_are_not_a_perfect_ranking():
+    features, queries, relevance = candidate_sets()
+    metrics = evaluate(features, queries, relevance, np.zeros((1, 5), dtype=np.float32), k=5)
+    # Ten-way tie: the relevant candidate's expected rank is 4.5
+    assert metrics["mrr"][0] == pytest.approx(1 / 5.5)
+    assert metrics["ndcg"][0] < 1
+    assert metrics["hit_rate"][0] == 1
+
+
+def test_separating_weights_rank_first():
+    features, queries, relevance = candidate_sets()
+    combinations = np.array([[0, 0, 0, 0, 0], [1, 0, 0, 0, 0], [-1, 0, 0, 0, 0]], dtype=np.float32)
+    metrics = evaluate(features, queries, relevance, combinations, k=5)
+    assert metrics["ndcg"][1] == metrics["mrr"][1] == metrics["hit_rate"][1] == 1
+    assert metrics["mrr"][2] == pytest.approx(0.1)
+    assert np.argmax(metrics["ndcg"]) == 1
+
+
+def test_grid_search_on_a_log_prefers_informative_weights(tmp_path):
+    rng = np.random.default_rng(1)
+    path = tmp_path / "replay.jsonl"
+    with open(path, "w") as f:
+        for query in range(50):
+            candidates = [{"id": f"{query}-{i}", "prompt": f"p{query}-{i}", "distance": float(rng.random()),
+                           "creation_time": 1e9 - float(rng.random()) * 1e6, "response_length": int(rng.integers(1, 999)),
+                           "retrieval_count": int(rng.integers(0, 9)), "lexical_score": 0.0} for i in range(8)]
+            best = min(candidates, key=lambda c: c["distance"])
+            f.write(json.dumps({"type": "candidates", "time": 1e9, "query": f"q{query}", "candidates": candidates}) + "\n")
+            f.write(json.dumps({"type": "selection", "time": 1e9, "query": f"q{query}", "id": best["id"]}) + "\n")
+
+    features, queries, relevance = feature_matrix(load_log(path))
+    combinations = parse_grid(["distance=0:25:6", "time_elapsed_since_added=0", "length=0", "retrieval_count=0"])
+    metrics = evaluate(features, queries, relevance, combinations, k=3)
+    assert combinations[np.argmax(metrics["ndcg"]), 0] > 0
+    assert metrics["ndcg"][0] < 1  # All-zero weights
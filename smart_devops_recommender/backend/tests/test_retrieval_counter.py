@@ -0,0 +1,70 @@
+import time
+import threading
+from retrieval_counter import RetrievalCountBuffer
+
+
+class FakeQuery:
+    def __init__(self, counts):
+        self.counts = counts
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def do(self):
+        items = [{"retrievalCount": count, "_additional": {"id": uuid}} for uuid, count in self.counts.items()]
+        return {"data": {"Get": {"DevOpsPrompts_v2": items}}}
+
+
+class FakeClient:
+    def __init__(self, counts, failing=()):
+        self.counts = counts
+        self.failing = set(failing)
+        self.query = self
+        self.data_object = self
+
+    def get(self, class_name, properties):
+        return FakeQuery(dict(self.counts))
+
+    def update(self, data_object, class_name, uuid):
+        if uuid in self.failing:
+            raise ConnectionError("connection reset")
+        self.counts[uuid] = data_object["retrievalCount"]
+
+
+def test_partial_failure_requeues_only_unwritten_counts():
+    client = FakeClient({"a": 1, "b": 5}, failing={"b"})
+    flushed = []
+    buffer = RetrievalCountBuffer(client, "DevOpsPrompts_v2", on_flush=lambda: flushed.append(True))
+    buffer.increment("a", 2)
+    buffer.increment("b", 3)
+
+    assert buffer.flush() == 1
+    assert client.counts == {"a": 3, "b": 5}
+    assert buffer.pending == {"b": 3}
+    assert flushed
+
+    # The retry adds b's increments once and doesn't add a's again
+    client.failing.clear()
+    assert buffer.flush() == 1
+    assert client.counts == {"a": 3, "b": 8}
+    assert not buffer.pending
+
+
+class SlowClient(FakeClient):
+    # Updates land after a delay, so a second flush can start while the first is still writing
+    def update(self, data_object, class_name, uuid):
+        time.sleep(0.05)
+        super().update(data_object, class_name, uuid)
+
+
+def test_overlapping_flushes_keep_both_increments():
+    client = SlowClient({"a": 10})
+    buffer = RetrievalCountBuffer(client, "DevOpsPrompts_v2")
+    buffer.increment("a", 5)
+    background = threading.Thread(target=buffer.flush)
+    background.start()
+    time.sleep(0.01)
+    buffer.increment("a", 3)
+    buffer.flush()
+    background.join()
+    assert client.counts == {"a": 18}
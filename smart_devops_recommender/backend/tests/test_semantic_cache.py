@@ -0,0 +1,33 @@
+import asyncio
+import routes
+
+
+def test_semantic_cache_compares_prompts_not_stored_vectors(monkeypatch):
+    # "b" is the closest stored (prompt + response) vector, but only "a" asked the same question
+    hits = [{"id": "b", "prompt": "How do I scale a deployment?", "distance": 0.01, "response": "Scale it"},
+            {"id": "a", "prompt": "How do I restart a pod?", "distance": 0.3, "response": "Delete it"}]
+    prompt_vectors = {"How do I scale a deployment?": [0.0, 1.0], "How do I restart a pod?": [1.0, 0.05]}
+
+    async def generate_embedding_async(text):
+        return [1.0, 0.0]
+
+    async def search_candidates(query_embedding, distance_filter, limit):
+        return [dict(hit) for hit in hits]
+
+    async def prompt_embeddings(prompts):
+        return [prompt_vectors[prompt] for prompt in prompts]
+
+    retrieved = []
+    monkeypatch.setattr(routes, "generate_embedding_async", generate_embedding_async)
+    monkeypatch.setattr(routes, "search_candidates", search_candidates)
+    monkeypatch.setattr(routes, "prompt_embeddings", prompt_embeddings)
+    monkeypatch.setattr(routes, "record_retrieval", retrieved.append)
+    monkeypatch.setattr(routes, "LEXICAL_INDEX_ENABLED", False)
+
+    result = asyncio.run(routes.semantic_cache_lookup("How do I restart a pod?"))
+    assert result["cached_id"] == "a" and result["response"] == "Delete it"
+    assert result["cached_distance"] < 0.01
+    assert retrieved == ["a"]
+
+    monkeypatch.setitem(prompt_vectors, "How do I restart a pod?", [0.5, 0.5])
+    assert asyncio.run(routes.semantic_cache_lookup("How do I restart a pod?")) is None
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_with_one_key_run_once():
+    calls = []
+
+    async def answer():
+        calls.append(True)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", answer) for _ in range(3)),
+                                       flight.do("other", answer))
+        assert results == [("answer", False), ("answer", True), ("answer", True), ("answer", False)]
+        assert len(calls) == 2
+        assert not flight.in_flight
+        # Finished calls aren't reused
+        assert await flight.do("key", answer) == ("answer", False)
+
+    asyncio.run(scenario())
+
+
+def test_first_caller_going_away_does_not_cancel_the_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+        done = asyncio.Event()
+
+        async def answer():
+            await done.wait()
+            return "answer"
+
+        owner = asyncio.create_task(flight.do("key", answer))
+        await asyncio.sleep(0)
+        joiner = asyncio.create_task(flight.do("key", answer))
+        await asyncio.sleep(0)
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        # The owner gave up the key, the joiner still gets the shared result
+        assert "key" not in flight.in_flight
+        done.set()
+        assert await joiner == ("answer", True)
+
+    asyncio.run(scenario())
+
+
+def test_failure_reaches_every_caller_and_clears_the_key():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ConnectionError("reset")
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+        assert all(isinstance(result, ConnectionError) for result in results)
+        assert not flight.in_flight
+
+    asyncio.run(scenario())
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+from local_index import LocalVectorIndex
+from schema import CLASS_NAME, schema
+from snapshot import export_snapshot, import_snapshot
+
+DIM = 8
+
+
+class FakeQuery:
+    # The cursor export pages with
+    def __init__(self, client):
+        self.client = client
+        self.after = None
+        self.limit = None
+
+    def with_additional(self, fields):
+        return self
+
+    def with_limit(self, limit):
+        self.limit = limit
+        return self
+
+    def with_after(self, after):
+        self.after = after
+        return self
+
+    def do(self):
+        items = [{**properties, "_additional": {"id": uuid, "vector": vector, "creationTimeUnix": str(created),
+                                                "lastUpdateTimeUnix": str(created + 1)}}
+                 for uuid, (properties, vector, created) in sorted(self.client.objects.items())
+                 if self.after is None or uuid > self.after]
+        return {"data": {"Get": {CLASS_NAME: items[:self.limit]}}}
+
+
+class FakeClient:
+    # A store whose schema is up to date, so ensure_schema changes nothing
+    def __init__(self, objects=None):
+        self.objects = dict(objects or {})
+        self.query = self
+        self.batch = self
+        self.schema = self
+
+    def exists(self, class_name):
+        return True
+
+    def get(self, class_name, fields=None):
+        if fields is None:
+            return schema
+        return FakeQuery(self)
+
+    def configure(self, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add_data_object(self, data_object, class_name, uuid, vector):
+        self.objects[uuid] = (data_object, [float(x) for x in vector], 0)
+
+
+def stored_objects(n):
+    rng = np.random.default_rng(0)
+    return {
+        f"{i:08d}-0000-0000-0000-000000000000": (
+            {"prompt": f"prompt {i}", "response": f"response {i}", "retrievalCount": i, "responseLength": 10 + i,
+             "lastRetrievedUnix": 1_700_000_000_000 + i if i % 2 else None},
+            [float(x) for x in rng.standard_normal(DIM).astype(np.float32)],
+            1_600_000_000_000 + i)
+        for i in range(n)
+    }
+
+
+@pytest.mark.parametrize("extension", [".arrow", ".parquet"])
+def test_export_import_round_trip(tmp_path, extension):
+    source = FakeClient(stored_objects(7))
+    path = str(tmp_path / f"snapshot{extension}")
+
+    # Several pages, so the file holds several record batches
+    assert export_snapshot(source, path, page_size=3) == 7
+    target = FakeClient()
+    assert import_snapshot(target, path) == 7
+
+    assert sorted(target.objects) == sorted(source.objects)
+    for uuid, (properties, vector, _) in source.objects.items():
+        imported, imported_vector, _ = target.objects[uuid]
+        assert imported == properties
+        assert imported_vector == vector
+
+    # The same file warm-starts the local index, with creation times in seconds
+    index = LocalVectorIndex(dim=DIM, approximate_threshold=10_000)
+    assert index.load_snapshot(path) == 7
+    hit = index.search(source.objects["00000003-0000-0000-0000-000000000000"][1], limit=1)[0]
+    assert (hit["prompt"], hit["retrieval_count"]) == ("prompt 3", 3)
+    assert hit["creation_time"] == 1_600_000_000.003
+    assert hit["distance"] < 1e-5
+
+
+def test_empty_class_exports_an_empty_snapshot(tmp_path):
+    path = str(tmp_path / "snapshot.arrow")
+    assert export_snapshot(FakeClient(), path) == 0
+    assert import_snapshot(FakeClient(), path) == 0
@@ -0,0 +1,71 @@
+import json
+import time
+import asyncio
+from lexical_index import prefix_match
+from routes import TypeaheadSession, ChatRequest
+
+WEIGHTS = {"distance": 15.9, "time_elapsed_since_added": 2, "length": 0.05, "retrieval_count": 1}
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def send_json(self, payload):
+        self.sent.append(payload)
+
+
+class PendingSearchSession(TypeaheadSession):
+    # The embedding for the new prefix never arrives, so only the provisional reply is sent
+    async def search(self, request):
+        await asyncio.sleep(3600)
+
+
+def candidate(object_id, prompt, distance):
+    return {"id": object_id, "prompt": prompt, "distance": distance, "creation_time": time.time() - 3600,
+            "response_length": 100, "retrieval_count": 1, "response": f"answer {object_id}"}
+
+
+def test_prefix_match():
+    assert prefix_match("terraform st", "How do I unlock terraform state?") == 1
+    assert prefix_match("terraform st", "Restart a kubernetes pod") == 0
+    assert prefix_match("kubernetes pod lo", "kubernetes pod restart") == 2 / 3
+
+
+def test_provisional_results_are_ranked_for_the_new_prefix():
+    async def run():
+        websocket = FakeWebSocket()
+        session = PendingSearchSession(websocket)
+        # Candidates of the previous prefix "how do I", where the pod answer ranked first
+        session.candidates = [candidate("pod", "How do I restart a kubernetes pod?", 0.1),
+                              candidate("state", "How do I unlock terraform state?", 0.3),
+                              candidate("vault", "Rotate vault secrets", 0.2)]
+        session.responses = {item["id"]: item["response"] for item in session.candidates}
+        await session.on_prefix(ChatRequest(message="how do i unlock terraform st", top_n=3, weights=WEIGHTS,
+                                            distance_filter=0.5))
+        session.close()
+        return websocket.sent
+
+    sent = asyncio.run(run())
+    assert len(sent) == 1 and sent[0]["provisional"]
+    ids = [result["id"] for result in sent[0]["results"]]
+    assert ids[0] == "state"
+    assert "vault" not in ids  # No longer matches what is typed
+
+
+def test_invalid_frames_get_an_error_and_keep_the_session():
+    from fastapi.testclient import TestClient
+    from routes import app
+
+    with TestClient(app).websocket_connect("/ws/typeahead") as websocket:
+        websocket.send_text("{not json")
+        assert "error" in websocket.receive_json()
+        websocket.send_json({"message": "kafka"})  # Missing top_n, weights, distance_filter
+        assert "error" in websocket.receive_json()
+        websocket.send_json({"message": "kafka", "top_n": 3, "weights": WEIGHTS, "distance_filter": 0.5,
+                             "fields": ["nope"]})
+        reply = websocket.receive_json()
+        assert reply["message"] == "kafka" and "nope" in reply["error"]
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from local_index import LocalVectorIndex
+from vector_codec import VectorCodec, normalize, top_k
+
+DIM = 64
+
+
+def corpus(n, seed=0):
+    # Like embeddings, most of the variance lies in a few directions, which is what PCA relies on
+    basis = np.random.default_rng(0).standard_normal((12, DIM))
+    rng = np.random.default_rng(seed)
+    return normalize(rng.standard_normal((n, 12)) @ basis + 0.1 * rng.standard_normal((n, DIM)))
+
+
+def build(vectors, **options):
+    index = LocalVectorIndex(dim=DIM, approximate_threshold=10_000, **options)
+    for i, vector in enumerate(vectors):
+        index.add(f"id-{i}", vector, f"prompt {i}", f"response {i}")
+    index.compact()
+    return index
+
+
+@pytest.mark.parametrize("dtype, dim, code_dtype, code_dim", [
+    ("float16", 0, np.float16, DIM),
+    ("int8", 0, np.int8, DIM),
+    ("float32", 16, np.float32, 16),
+    ("int8", 16, np.int8, 16),
+])
+def test_codes_approximate_cosine_similarity(dtype, dim, code_dtype, code_dim):
+    vectors = corpus(500)
+    codec = VectorCodec(dtype, dim).fit(vectors)
+    codes = codec.encode(vectors)
+    assert codes.dtype == code_dtype and codes.shape == (500, code_dim)
+    assert codec.bytes_per_vector == code_dim * np.dtype(code_dtype).itemsize
+
+    query = corpus(1, seed=1)[0]
+    exact = vectors @ query
+    approximate = codec.similarities(codes, codec.project(query))
+    assert np.abs(approximate - exact).max() < 0.02
+    assert len(set(top_k(approximate, 10)) & set(top_k(exact, 10))) >= 9
+
+
+def test_pca_keeps_more_of_the_similarity_than_a_random_projection():
+    vectors = corpus(500)
+    query = corpus(1, seed=1)[0]
+    exact = vectors @ query
+    errors = {}
+    for reduction in ("pca", "random"):
+        codec = VectorCodec("float32", 16, reduction).fit(vectors)
+        errors[reduction] = np.abs(codec.similarities(codec.encode(vectors), codec.project(query)) - exact).mean()
+    assert errors["pca"] < errors["random"]
+
+
+@pytest.mark.parametrize("dtype, dim", [("float16", 0), ("int8", 0), ("int8", 16)])
+def test_compacted_index_with_rescore_returns_exact_results(dtype, dim):
+    vectors = corpus(500)
+    index = build(vectors, dtype=dtype, reduced_dim=dim, rescore=True, rescore_factor=8)
+    assert index.codes is not None and index.vectors is not None
+    for query in corpus(5, seed=1):
+        results = index.search(query, limit=5)
+        expected = [f"id-{i}" for i in top_k(vectors @ query, 5)]
+        assert [result["id"] for result in results] == expected
+        # Distances are the exact float32 ones
+        assert np.allclose([result["distance"] for result in results], 1 - np.sort(vectors @ query)[::-1][:5],
+                           atol=1e-5)
+
+
+def test_int8_without_rescore_can_return_results_past_distance_filter():
+    # Without the float32 vectors, max_distance is applied to approximate distances, so an object just
+    # outside the filter can come back when its code underestimates the distance. Re-scoring fixes that.
+    vectors = corpus(500)
+    query = corpus(1, seed=1)[0]
+    exact = 1 - vectors @ query
+    approximate_index = build(vectors, dtype="int8", rescore=False)
+    assert approximate_index.vectors is None
+    approximate = 1 - approximate_index.similarities(None, query)
+
+    # Among the closest rows, the one whose code most underestimates its distance
+    near = top_k(-exact, 20)
+    row = near[np.argmax(exact[near] - approximate[near])]
+    assert approximate[row] < exact[row]
+    max_distance = (approximate[row] + exact[row]) / 2
+
+    leaked = {result["id"] for result in approximate_index.search(query, limit=500, max_distance=max_distance)}
+    assert f"id-{row}" in leaked
+
+    rescored = build(vectors, dtype="int8", rescore=True, rescore_factor=8).search(
+        query, limit=50, max_distance=max_distance)
+    assert f"id-{row}" not in {result["id"] for result in rescored}
+    assert all(exact[int(result["id"].split("-")[1])] <= max_distance + 1e-6 for result in rescored)
@@ -1,12 +1,119 @@
-import openai
-from openai import OpenAI
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import datetime
+from embedding_cache import embedding_cache
+from client_setup import get_openai_client, get_async_openai_client
+from microbatch import MicroBatcher
+from circuit_breaker import CircuitBreaker
 
-client = OpenAI()
+# Bounded pool for blocking calls (weaviate.Client, SQLite) made from async handlers
+BLOCKING_EXECUTOR_WORKERS = int(os.getenv('BLOCKING_EXECUTOR_WORKERS', '32'))
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_EXECUTOR_WORKERS, thread_name_prefix="blocking")
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Inputs per embeddings API call for multi-input requests
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '256'))
+
+# Concurrent single-text embedding requests (one per /recommender call) are collected for up to
+# EMBEDDING_BATCH_WINDOW_MS, or until EMBEDDING_MAX_BATCH_SIZE distinct texts are waiting, and sent
+# as one multi-input call. 0 sends every request on its own.
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv('EMBEDDING_BATCH_WINDOW_MS', '2'))
+EMBEDDING_MAX_BATCH_SIZE = min(int(os.getenv('EMBEDDING_MAX_BATCH_SIZE', '64')), EMBEDDING_BATCH_SIZE)
+
+# Upper bound on one embeddings call from the app, slower calls count as failures for the breaker
+EMBEDDING_TIMEOUT = float(os.getenv('EMBEDDING_TIMEOUT', '5'))
+embedding_breaker = CircuitBreaker("openai_embeddings", EMBEDDING_TIMEOUT)
 
 
 def generate_embedding(text):
-    return client.embeddings.create(input=[text], model="text-embedding-ada-002").data[0].embedding
+    # Serve repeated texts (e.g. growing typeahead prefixes) from the embedding cache
+    embedding = embedding_cache.get(text, EMBEDDING_MODEL)
+    if embedding is not None:
+        return embedding
+
+    start = time.perf_counter()
+    embedding = get_openai_client().embeddings.create(input=[text], model=EMBEDDING_MODEL).data[0].embedding
+    embedding_cache.put(text, EMBEDDING_MODEL, embedding, time.perf_counter() - start)
+    return embedding
+
+
+def generate_embeddings(texts):
+    # Multi-input variant of generate_embedding: one API call for every text not already cached
+    embeddings = [embedding_cache.get(text, EMBEDDING_MODEL) for text in texts]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if not missing:
+        return embeddings
+
+    start = time.perf_counter()
+    response = get_openai_client().embeddings.create(input=[texts[i] for i in missing], model=EMBEDDING_MODEL)
+    elapsed = time.perf_counter() - start
+
+    for i, item in zip(missing, sorted(response.data, key=lambda d: d.index)):
+        embeddings[i] = item.embedding
+    embedding_cache.put_many([texts[i] for i in missing], EMBEDDING_MODEL, [embeddings[i] for i in missing], elapsed)
+    return embeddings
+
+
+async def run_blocking(func, *args, **kwargs):
+    # Run a synchronous call on the bounded executor so it doesn't stall the event loop
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, partial(func, *args, **kwargs))
+
+
+async def embed_texts(texts):
+    # One multi-input embeddings call, the vectors go to the embedding cache in a single write
+    start = time.perf_counter()
+    response = await embedding_breaker.call(get_async_openai_client().embeddings.create, input=texts,
+                                            model=EMBEDDING_MODEL)
+    vectors = [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+    await run_blocking(embedding_cache.put_many, texts, EMBEDDING_MODEL, vectors, time.perf_counter() - start)
+    return vectors
+
+
+embedding_batcher = MicroBatcher("embedding", embed_texts, EMBEDDING_BATCH_WINDOW_MS / 1000, EMBEDDING_MAX_BATCH_SIZE)
+
+
+async def generate_embedding_async(text):
+    # Memory hits are served inline, a miss there reads the SQLite tier off the event loop
+    embedding = embedding_cache.get_memory(text, EMBEDDING_MODEL)
+    if embedding is None and embedding_cache.db is not None:
+        embedding = await run_blocking(embedding_cache.get, text, EMBEDDING_MODEL)
+    if embedding is not None:
+        return embedding
+    # Only cache hits are served while the embeddings breaker is open
+    embedding_breaker.ensure_available()
+    if EMBEDDING_BATCH_WINDOW_MS > 0:
+        return await embedding_batcher.submit(text)
+
+    start = time.perf_counter()
+    response = await embedding_breaker.call(get_async_openai_client().embeddings.create, input=[text],
+                                            model=EMBEDDING_MODEL)
+    embedding = response.data[0].embedding
+    # The disk tier commits to SQLite, keep that off the event loop too
+    await run_blocking(embedding_cache.put, text, EMBEDDING_MODEL, embedding, time.perf_counter() - start)
+    return embedding
+
+
+async def generate_embeddings_async(texts):
+    # Multi-input variant of generate_embedding_async: cache misses are embedded EMBEDDING_BATCH_SIZE at a time,
+    # with the calls running concurrently
+    embeddings = await run_blocking(lambda: [embedding_cache.get(text, EMBEDDING_MODEL) for text in texts])
+    missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+    if not missing:
+        return embeddings
+
+    fresh = {}
+
+    async def embed(batch):
+        fresh.update(zip(batch, await embed_texts(batch)))
+
+    await asyncio.gather(*(embed(missing[i:i + EMBEDDING_BATCH_SIZE])
+                           for i in range(0, len(missing), EMBEDDING_BATCH_SIZE)))
+    return [embedding if embedding is not None else fresh[text] for text, embedding in zip(texts, embeddings)]
 
 
 def calculate_weighted_score(item, weights, max_length, max_recency):
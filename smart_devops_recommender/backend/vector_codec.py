@@ -0,0 +1,177 @@
+import os
+import time
+import argparse
+import numpy as np
+
+# Compact representation of L2-normalised embedding vectors for in-process indexes: an optional
+# PCA or random projection to fewer dimensions, then float32, float16 or int8 codes.
+# Similarities against codes are approximate, exact float32 re-scoring of a shortlist is left to
+# the caller (see LocalVectorIndex.search).
+#
+#   python vector_codec.py --configs float32,float16,int8,float16:256,int8:256,int8:256:random --k 10
+#
+# prints recall@k, memory and query time per configuration on the vectors stored in Weaviate.
+
+DTYPES = ("float32", "float16", "int8")
+REDUCTIONS = ("pca", "random")
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class VectorCodec:
+    def __init__(self, dtype="float32", dim=0, reduction="pca", seed=0):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype {dtype}, expected one of {DTYPES}")
+        if reduction not in REDUCTIONS:
+            raise ValueError(f"Unsupported reduction {reduction}, expected one of {REDUCTIONS}")
+        self.dtype = np.dtype(dtype)
+        self.dim = dim  # Reduced dimension, 0 keeps the input dimension
+        self.reduction = reduction
+        self.seed = seed
+        self.input_dim = None
+        self.projection = None
+        self.scale = None
+
+    @property
+    def is_identity(self):
+        return self.dtype == np.float32 and not self.dim
+
+    @property
+    def code_dim(self):
+        return self.projection.shape[1] if self.projection is not None else self.input_dim
+
+    @property
+    def bytes_per_vector(self):
+        return self.code_dim * self.dtype.itemsize
+
+    def fit(self, sample):
+        sample = normalize(sample)
+        self.input_dim = sample.shape[1]
+        if self.dim and self.dim < self.input_dim:
+            if self.reduction == "pca":
+                # Uncentred, so the direction shared by all embeddings is kept and cosine stays comparable
+                _, _, vt = np.linalg.svd(sample, full_matrices=False)
+                self.projection = np.ascontiguousarray(vt[:self.dim].T, dtype=np.float32)
+            else:
+                rng = np.random.default_rng(self.seed)
+                self.projection = (rng.standard_normal((self.input_dim, self.dim)) / np.sqrt(self.dim)) \
+                    .astype(np.float32)
+        if self.dtype == np.int8:
+            # Per-dimension range, embedding components use a small part of [-1, 1]
+            self.scale = np.maximum(np.abs(self.project(sample)).max(axis=0), 1e-6).astype(np.float32)
+        return self
+
+    def project(self, vectors):
+        vectors = normalize(vectors)
+        if self.projection is None:
+            return vectors
+        return normalize(vectors @ self.projection)
+
+    def encode(self, vectors):
+        projected = self.project(vectors)
+        if self.dtype == np.int8:
+            return np.clip(np.rint(projected / self.scale * 127), -127, 127).astype(np.int8)
+        return projected.astype(self.dtype)
+
+    def similarities(self, codes, projected_query, chunk_size=512):
+        # Approximate cosine similarity of a projected query against codes. Small chunks keep the float32
+        # copy in cache, numpy has no fast float16/int8 matmul
+        query = projected_query * (self.scale / 127) if self.dtype == np.int8 else projected_query
+        query = query.astype(np.float32)
+        result = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), chunk_size):
+            result[start:start + chunk_size] = codes[start:start + chunk_size].astype(np.float32, copy=False) @ query
+        return result
+
+
+def allocate(shape, dtype, path=None):
+    # Zeroed array, file backed when a path is given so it lives in the page cache rather than the heap
+    if not path:
+        return np.zeros(shape, dtype=dtype)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    array = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+    os.replace(tmp_path, path)
+    return array
+
+
+def parse_config(text):
+    # "int8:256:random" -> VectorCodec(dtype="int8", dim=256, reduction="random")
+    parts = text.split(":")
+    return VectorCodec(parts[0], int(parts[1]) if len(parts) > 1 else 0, parts[2] if len(parts) > 2 else "pca")
+
+
+def top_k(similarities, k):
+    top = np.argpartition(-similarities, k - 1)[:k]
+    return top[np.argsort(-similarities[top])]
+
+
+def evaluate(vectors, queries, codec, k=10, rescore_factor=4, sample_size=50000):
+    # recall@k of the codec against exact float32 search, with and without re-scoring a k * rescore_factor shortlist
+    rng = np.random.default_rng(0)
+    codec.fit(vectors[rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False)])
+    codes = codec.encode(vectors)
+
+    recall, recall_rescored, seconds = [], [], 0.0
+    for query in queries:
+        expected = set(top_k(vectors @ query, k))
+
+        start = time.perf_counter()
+        similarities = codec.similarities(codes, codec.project(query))
+        seconds += time.perf_counter() - start
+        recall.append(len(expected & set(top_k(similarities, k))) / k)
+
+        shortlist = top_k(similarities, min(k * rescore_factor, len(vectors)))
+        rescored = shortlist[top_k(vectors[shortlist] @ query, k)]
+        recall_rescored.append(len(expected & set(rescored)) / k)
+
+    return {
+        "bytes_per_vector": codec.bytes_per_vector,
+        "memory_mb": codes.nbytes / 1e6,
+        "recall": float(np.mean(recall)),
+        "recall_rescored": float(np.mean(recall_rescored)),
+        "query_ms": seconds / len(queries) * 1000
+    }
+
+
+def main():
+    from client_setup import WEAVIATE_URL, create_weaviate_client
+    from local_index import LocalVectorIndex
+
+    parser = argparse.ArgumentParser(description="Compare compact vector encodings by recall@k on the stored corpus")
+    parser.add_argument("--weaviate-url", default=WEAVIATE_URL)
+    parser.add_argument("--class-name", default="DevOpsPrompts_v2")
+    parser.add_argument("--configs", default="float32,float16,int8,float16:256,int8:256,int8:256:random",
+                        help="Comma separated dtype[:dim[:pca|random]] entries")
+    parser.add_argument("--queries", type=int, default=200, help="Number of query vectors to sample")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=4, help="Shortlist size as a multiple of k")
+    args = parser.parse_args()
+
+    # A plain index gives the full float32 vectors
+    index = LocalVectorIndex(dtype="float32", reduced_dim=0)
+    index.reconcile(create_weaviate_client(args.weaviate_url), args.class_name)
+    vectors = index.vectors[:len(index)]
+    if len(vectors) < args.k:
+        print(f"Only {len(vectors)} vectors stored, need at least {args.k}")
+        return
+
+    # Stored vectors with a little noise as queries, so they resemble real near matches
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    queries = normalize(vectors[rows] + rng.normal(0, 0.01, (len(rows), vectors.shape[1])).astype(np.float32))
+
+    print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    print(f"{'config':>20} {'bytes/vec':>9} {'MB':>8} {'recall':>7} {'rescored':>8} {'ms/query':>8}")
+    for config in args.configs.split(","):
+        result = evaluate(vectors, queries, parse_config(config), args.k, args.rescore_factor)
+        print(f"{config:>20} {result['bytes_per_vector']:>9} {result['memory_mb']:>8.1f} {result['recall']:>7.3f} "
+              f"{result['recall_rescored']:>8.3f} {result['query_ms']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
-import weaviate
+from client_setup import get_weaviate_client
 
 # Initialize the Weaviate client
-client = weaviate.Client("http://localhost:8080")  # Replace with your Weaviate instance URL
+client = get_weaviate_client()
 
 # Define the class name you want to delete
 class_name = "DevOpsPrompts_v2"  # Replace with the name of the class you want to delete
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Prism as SyntaxHighlighter } from 'react-syntax-highlighter';
 import { coy } from 'react-syntax-highlighter/dist/esm/styles/prism';
 import './App.css';
@@ -20,6 +20,22 @@ function App() {
   });
   const [distanceFilter, setDistanceFilter] = useState(0.5); // New state variable for distance filter
   const [showDropdown, setShowDropdown] = useState(false);
+  const socketRef = useRef(null);
+  const latestPrefixRef = useRef('');
+
+  // Typeahead session: the server cancels superseded prefixes and sends provisional re-ranks
+  useEffect(() => {
+    const socket = new WebSocket('ws://localhost:8000/ws/typeahead');
+    socket.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      // Ignore replies for prefixes the user has already typed past
+      if (data.results && data.message === latestPrefixRef.current) {
+        setSuggestions(data.results);
+      }
+    };
+    socketRef.current = socket;
+    return () => socket.close();
+  }, []);
 
   useEffect(() => {
     if (input.length >= 5 && input.length % 5 === 0) {
@@ -33,12 +49,20 @@ function App() {
     setLastApiCallLength(input.trim().length);
     setApiCallCount(apiCallCount + 1);
 
+    const request = { message: input, top_n: topK, weights, distance_filter: distanceFilter };
+    const socket = socketRef.current;
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      latestPrefixRef.current = input;
+      socket.send(JSON.stringify(request));
+      return;
+    }
+
     const response = await fetch('http://localhost:8000/recommender', {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({ message: input, top_n: topK, weights, distance_filter: distanceFilter }), // Include distance filter
+      body: JSON.stringify(request), // Include distance filter
     });
 
     const data = await response.json();
@@ -55,7 +79,7 @@ function App() {
       const botMessage = { sender: 'bot', text: suggestionResponse };
       setMessages((prevMessages) => [...prevMessages, botMessage]);
     } else {
-      const response = await fetch('http://localhost:8000/chat', {
+      const response = await fetch('http://localhost:8000/chat/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -63,12 +87,42 @@ function App() {
         body: JSON.stringify({ message }),
       });
 
-      const data = await response.json();
-      const botMessage = { sender: 'bot', text: data.response };
-      setMessages((prevMessages) => [...prevMessages, botMessage]);
+      if (!response.ok) {
+        // Overloaded (503) or a rejected request: show the reason instead of an empty answer
+        const error = await response.json().catch(() => ({}));
+        const text = `Sorry, the answer could not be generated (${error.detail || response.status}). Please try again.`;
+        setMessages((prevMessages) => [...prevMessages, { sender: 'bot', text }]);
+        return;
+      }
+
+      // Add an empty bot message and grow it as tokens arrive over Server-Sent Events
+      setMessages((prevMessages) => [...prevMessages, { sender: 'bot', text: '' }]);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let text = '';
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const event of events) {
+          if (!event.startsWith('data: ')) continue;
+          const data = JSON.parse(event.slice(6));
+          if (data.token) {
+            text += data.token;
+            const botMessage = { sender: 'bot', text };
+            setMessages((prevMessages) => [...prevMessages.slice(0, -1), botMessage]);
+          }
+        }
+      }
     }
 
     setInput('');
+    latestPrefixRef.current = '';
     setSuggestions([]);
   };
 